@@ -0,0 +1,153 @@
+#!/bin/env python3
+
+"""
+Times the 'spreadsheet' workflow of create.py end-to-end, without touching any real service: Google Sheets
+and Gmail are replaced by the in-process fakes in dpp.google.fake, and LDAP and AWS by the stand-ins
+below. Latency and quota errors can be injected into the Google fakes to see how the workflow copes.
+
+    ./benchmark.py --rows 2000 --approved 50 --latency 0.2 --error-rate 0.05
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import create_user
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'libs', 'python'))
+import dpp.aws
+import dpp.google
+from dpp.ldap.UserRecord import UserRecord
+
+SPREADSHEET_ID = 'benchmark'
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Benchmarks the spreadsheet user-creation workflow against fake services')
+    parser.add_argument('--rows', type=int, default=1000,
+        help="Number of users in the spreadsheet (default: 1000)")
+    parser.add_argument('--approved', type=int, default=50,
+        help="How many of those are approved and waiting to be created (default: 50)")
+    parser.add_argument('--new', type=int, default=50,
+        help="How many of those have no status yet, i.e. were just submitted (default: 50)")
+    parser.add_argument('--latency', type=float, default=0.0,
+        help="Seconds added to every Google API request (default: 0)")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+        help="Probability of a Sheets API request failing with HTTP 429 (default: 0)")
+    parser.add_argument('--gmail-error-rate', type=float, default=0.0,
+        help="Probability of a Gmail API request failing with HTTP 429 (default: 0)")
+    parser.add_argument('--runs', type=int, default=2,
+        help="Number of consecutive runs against the same spreadsheet (default: 2)")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser
+
+
+class BenchLdapUserSearcher(object):
+    """
+    Stands in for dpp.ldap.UserSearcher: every @redhat.com address exists.
+    """
+    def find_by_email(self, email, search_deleted_users=False):
+        record = UserRecord()
+        record.uid = email.split('@')[0]
+        record.primary_email = email
+        record.emails = [email]
+        record.is_employed = True
+        return record
+
+    def find_by_uid(self, uid, search_deleted_users=False):
+        return self.find_by_email('{}@redhat.com'.format(uid))
+
+
+class BenchIamOperations(object):
+    """
+    Stands in for dpp.aws.IamOperations: the account has no users.
+    """
+    def get_IAM_accounts(self):
+        return []
+
+
+def make_sheet(num_rows : int, num_approved : int, num_new : int) -> list:
+    """
+    @return rows of the 'Form Responses 1' sheet: the oldest users have accounts, followed by the approved
+            ones, followed by the new ones.
+    """
+    rows = [['Timestamp', 'Email', '', '', '', '', '', 'GPG key', 'Status', 'Notes']]
+    for idx in range(0, num_rows):
+        if idx >= num_rows - num_new:
+            status = ''
+        elif idx >= num_rows - num_new - num_approved:
+            status = create_user.spreadsheet.STATUS_APPROVED
+        else:
+            status = create_user.spreadsheet.STATUS_CREATED
+        rows.append(['2019-01-01 00:00:00', 'user{}@redhat.com'.format(idx), '', '', '', '', '', '', status])
+    return rows
+
+
+def main():
+    args = get_parser().parse_args()
+    sheets_service = dpp.google.FakeSheetsService(
+        sheets={create_user.spreadsheet.SHEET_NAME: make_sheet(args.rows, args.approved, args.new)},
+        latency=args.latency,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    gmail_service = dpp.google.FakeGmailService(
+        latency=args.latency,
+        error_rate=args.gmail_error_rate,
+        seed=args.seed + 1,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for run in range(1, args.runs + 1):
+            requests_before = dict(sheets_service.request_counts)
+            requests_before.update(gmail_service.request_counts)
+            bridge = create_user.GoogleSheetsDataBridge(
+                spreadsheet_id=SPREADSHEET_ID,
+                service_account_file=None,
+                state_file=os.path.join(tmp_dir, 'state.json'),
+                journal_file=os.path.join(tmp_dir, 'status.journal'),
+                sheet_service=dpp.google.SheetService(service=sheets_service, spreadsheet_id=SPREADSHEET_ID),
+            )
+            workflow = create_user.CreateUserWorkflow(
+                ldap_user_searcher=BenchLdapUserSearcher(),
+                aws_user_factory=dpp.aws.FakeUserFactory(),
+                iam_operations=BenchIamOperations(),
+                aws_account_id='123456789012',
+                aws_account_alias='benchmark',
+                assume_yes=True,
+            )
+            email_sender = dpp.google.EmailSender(service=gmail_service)
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                users = create_user.provision_from_spreadsheet(
+                    spreadsheet_data_bridge=bridge,
+                    workflow=workflow,
+                    email_sender=email_sender,
+                    outbox=dpp.google.Outbox(os.path.join(tmp_dir, 'outbox')),
+                )
+            elapsed = time.perf_counter() - start
+
+            print("Run {}: {} users created in {:.2f}s".format(
+                run,
+                len([user for user in users if user.status == create_user.UserCreateStatus.ACCOUNT_CREATED]),
+                elapsed,
+            ))
+            counts = dict(sheets_service.request_counts)
+            counts.update(gmail_service.request_counts)
+            for method in sorted(counts):
+                num_requests = counts[method] - requests_before.get(method, 0)
+                if num_requests:
+                    print("  {:<32} {:>6} requests".format(method, num_requests))
+
+    errors = dict(sheets_service.error_counts)
+    errors.update(gmail_service.error_counts)
+    if errors:
+        print("Injected errors: {}".format(', '.join('{}: {}'.format(k, v) for k, v in sorted(errors.items()))))
+    print("Emails sent: {}".format(len(gmail_service.sent)))
+
+
+if __name__ == '__main__':
+    main()
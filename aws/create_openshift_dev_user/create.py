@@ -8,6 +8,9 @@ It has 2 modes of operation:
 1) 'user' - specify the username or user email, and optionally their GPG key on the command line
 2) 'spreadsheet' - Retrieve the username/keys from a specific Google Sheets spreadsheet
 
+If sending the credential emails fails in 'spreadsheet' mode, they're kept in an outbox on disk, and the
+'resume-emails' command sends them.
+
 Various pre-flight checks are made to ensure success:
 - the user will be verified against LDAP.
 - a trial GPG encryption (if a key is supplied)
@@ -31,6 +34,15 @@ AWS_ACCOUNT_PROFILE_NAME = "openshift-dev"
 SPREADSHEET_ID = '1TxlsWyV970ct9EYaPrnSU5Ag7eTKw3Yfi2zfLsfqgxM'
 # The following spreadsheet is a copy of the original, used for testing.
 # SPREADSHEET_ID = '1SQtqxKN6GU-zjXOYlPbrDUUrnQmRKBmVu-7vuDvS2g8'
+# Remembers how far down the spreadsheet previous runs have fully processed.
+SPREADSHEET_STATE_FILE = os.path.expanduser('~/.cache/dpp/create_openshift_dev_user/{}.json'.format(SPREADSHEET_ID))
+# Status updates that haven't been written to the spreadsheet yet. They're retried by the next run.
+SPREADSHEET_JOURNAL_FILE = os.path.expanduser('~/.cache/dpp/create_openshift_dev_user/{}.journal'.format(SPREADSHEET_ID))
+# Which credential emails have been sent, so that they're never sent twice.
+SENT_EMAILS_LOG_FILE = os.path.expanduser('~/.cache/dpp/create_openshift_dev_user/sent_emails.log')
+# Credential emails are saved here before they're sent, so they aren't lost if sending fails.
+# Run the 'resume-emails' command to send any that are left over.
+OUTBOX_DIR = os.path.expanduser('~/.cache/dpp/create_openshift_dev_user/outbox')
 
 REFRESH_TOKEN_FILE = os.path.expanduser('~/.secrets/gcp_service_accounts/refresh_token.txt')
 
@@ -83,6 +95,12 @@ def get_parser():
     from_userid.add_argument('-o', '--outfile', nargs='?', type=str, default=None,
         help='Output filename (default: stdout)')
 
+    # The "resume-emails" sub-command
+    resume_emails = subparsers.add_parser('resume-emails',
+        help="Send the credential emails left unsent by earlier runs")
+    resume_emails.add_argument('--max-workers', type=int, default=8,
+        help="Maximum number of emails to send at once (default: 8)")
+
     return parser
 
 
@@ -118,25 +136,47 @@ def spreadsheet_workflow(args, workflow):
     spreadsheet_data_bridge = create_user.GoogleSheetsDataBridge(
         spreadsheet_id=SPREADSHEET_ID,
         service_account_file=args.gcp_credentials_file,
+        state_file=SPREADSHEET_STATE_FILE,
+        journal_file=SPREADSHEET_JOURNAL_FILE,
     )
     # Note: we instantiate the email service *before* we call workflow.run(), so that if the
     # script user needs to authenticate with the Gmail API, they are prompted here and not *after*
     # accounts have been created. This avoids a situation where the user messes up their
     # Gmail authentication, leaving the script in a state where accounts have been provisioned
     # but there's no way to send the credentials.
+    email_sender = get_email_sender(args)
+
+    create_user.provision_from_spreadsheet(
+        spreadsheet_data_bridge=spreadsheet_data_bridge,
+        workflow=workflow,
+        email_sender=email_sender,
+        update_spreadsheet=not args.dry_run,
+        outbox=None if args.dry_run else dpp.google.Outbox(OUTBOX_DIR),
+    )
+
+
+def resume_emails_workflow(args):
+    outbox = dpp.google.Outbox(OUTBOX_DIR)
+    pending = outbox.pending()
+    if not pending:
+        print("No emails to send.")
+        return
+    if args.dry_run:
+        for key, mime_message in pending:
+            print("Would send \"{}\" to {}".format(mime_message['subject'], mime_message['to']))
+        return
+
+    print("Sending {} emails...".format(len(pending)))
+    results = outbox.deliver(get_email_sender(args), max_workers=args.max_workers)
+    create_user.report_send_results(results)
+
+
+def get_email_sender(args):
     gmail_service = dpp.google.get_gmail_service(
         client_config=json.loads(GMAIL_CLIENT_SECRET),
         refresh_token_file=REFRESH_TOKEN_FILE,
     )
 
-    if not args.dry_run:
-        spreadsheet_data_bridge.fix_up_user_status()
-    users_to_create = spreadsheet_data_bridge.get_users_to_create()
-
-    if not len(users_to_create):
-        print("No users to create.")
-        sys.exit(0)
-
     if args.dry_run:
         # This causes emails to be send to the script runner user, not the user_to_create.
         email_sender = dpp.google.FakeEmailSender(service=gmail_service)
@@ -144,17 +184,8 @@ def spreadsheet_workflow(args, workflow):
             email_sender.send_to_self(enabled=True)
             email_sender.output_body(enabled=True)
     else:
-        email_sender = dpp.google.EmailSender(service=gmail_service)
-
-    workflow.run(users_to_create)
-
-    print("Emailing users with credentials...")
-    for user in users_to_create:
-        if user.status == create_user.UserCreateStatus.ACCOUNT_CREATED:
-            email_sender.send(user.output_message)
-
-    if not args.dry_run:
-        spreadsheet_data_bridge.update_user_status(users_to_create)
+        email_sender = dpp.google.EmailSender(service=gmail_service, sent_log_file=SENT_EMAILS_LOG_FILE)
+    return email_sender
 
 
 def setup_logging(enable_debug=False):
@@ -179,6 +210,7 @@ def setup_logging(enable_debug=False):
         'create_user',
         'dpp.ldap.LdapSession',
         'dpp.google.gmail.send',
+        'dpp.google.gmail.outbox',
     ]
     for module in modules_to_debug:
         mod_logger = logging.getLogger(module)
@@ -218,12 +250,13 @@ def main():
     args = parser.parse_args()
 
     setup_logging(args.debug)
-    workflow = get_workflow(args)
 
     if args.command == 'spreadsheet':
-        spreadsheet_workflow(args, workflow)
+        spreadsheet_workflow(args, get_workflow(args))
     elif args.command == 'user':
-        cli_workflow(args, workflow)
+        cli_workflow(args, get_workflow(args))
+    elif args.command == 'resume-emails':
+        resume_emails_workflow(args)
     else:
         parser.print_usage()
         sys.exit(1)
@@ -17,7 +17,7 @@ import dpp.gpg
 import dpp.mail
 
 from .message import (
-    gen_main_message,
+    get_main_message_part,
     gen_credentials_message,
 )
 from .UserToCreate import (
@@ -33,6 +33,7 @@ class CreateUserWorkflow(object):
             iam_operations : dpp.aws.IamOperations,
             aws_account_id : str,
             aws_account_alias : str,
+            assume_yes : bool = False,
         ):
         """
         @param ldap_user_searcher:      dpp.ldap.UserSearcher
@@ -40,25 +41,30 @@ class CreateUserWorkflow(object):
         @param iam_operations:          dpp.aws.IamOperations
         @param aws_account_id:          12-digit account ID
         @param aws_account_alias:       alias for the 12-digit account ID (if there is one)
+        @param assume_yes:              create the users without asking for confirmation first
         """
         self.ldap_user_searcher = ldap_user_searcher
         self.aws_user_factory = aws_user_factory
         self.iam_operations = iam_operations
         self.aws_account_id = aws_account_id
         self.aws_account_alias = aws_account_alias
+        self.assume_yes = assume_yes
 
 
-    def run(self, users_to_create : list):
+    def run(self, users_to_create : list, on_user_done=None):
         """
 
         Runs the workflow. Note that although users are created and each user's email
         message is generated, this object does NOT send the email.
 
         @param users_to_create [UsersToCreate]
+        @param on_user_done:    optional callable(UserToCreate), called as soon as each user has been
+                                processed (i.e. created, or skipped because of errors), e.g. to record
+                                its status before moving on to the next user.
         """
         self._preflight_checks(users_to_create)
         self._decide_go_nogo(users_to_create)
-        self._create_users(users_to_create)
+        self._create_users(users_to_create, on_user_done)
 
 
     def _preflight_checks(self, users_to_create : list) -> None:
@@ -117,16 +123,20 @@ class CreateUserWorkflow(object):
         for user in go_users:
             display_user(user)
 
+        if self.assume_yes:
+            return
         answer = input("Proceed? y/n ")
         if len(answer) == 0 or answer.lower() != 'y':
             sys.exit(0)
 
 
-    def _create_users(self, users_to_create : list) -> None:
+    def _create_users(self, users_to_create : list, on_user_done=None) -> None:
         for user in users_to_create:
             if user.status == UserCreateStatus.READY_TO_CREATE:
                 aws_user_info = self._create_user(user)
                 user.output_message = self._gen_email(user, aws_user_info)
+            if on_user_done is not None:
+                on_user_done(user)
 
 
     def _create_user(self, user : UserToCreate) -> None:
@@ -152,7 +162,6 @@ class CreateUserWorkflow(object):
 
         @return email.mime.MIMEMultipart
         """
-        main_msg = gen_main_message(aws_account_alias=self.aws_account_alias)
         credentials_msg = gen_credentials_message(
             aws_account_alias=self.aws_account_alias,
             aws_account_id=self.aws_account_id,
@@ -166,7 +175,7 @@ class CreateUserWorkflow(object):
             to=user.email,
             subject="{} AWS IAM account provisioned".format(self.aws_account_alias),
         )
-        email_builder.add_html_message(body=main_msg)
+        email_builder.add_part(get_main_message_part(aws_account_alias=self.aws_account_alias))
         email_builder.add_attachment_from_var(
             contents=credentials_msg,
             filename="{}.{}.credentials.txt.gpg".format(user.email, self.aws_account_alias),
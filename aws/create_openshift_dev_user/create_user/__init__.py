@@ -7,9 +7,15 @@ from .UserToCreate import (
     UserCreateStatus,
 )
 from .spreadsheet import GoogleSheetsDataBridge
+from .provision import (
+    provision_from_spreadsheet,
+    report_send_results,
+)
 __all__ = [
     'CreateUserWorkflow',
     'UserToCreate',
     'UserCreateStatus',
     'GoogleSheetsDataBridge',
+    'provision_from_spreadsheet',
+    'report_send_results',
 ]
@@ -1,5 +1,9 @@
 #!/bin/env python3
 
+import functools
+from email.mime.text import MIMEText
+import dpp.mail
+
 MAIN_MESSAGE = """
 <p>
   You have been provisioned an IAM account in the {alias} AWS account. This account is
@@ -70,24 +74,38 @@ aws_secret_access_key = {secret_access_key}
 EOF
 """
 
+# Parsed once, rather than for every user
+_MAIN_MESSAGE_TEMPLATE = dpp.mail.Template(MAIN_MESSAGE.lstrip())
+_CREDENTIALS_TEMPLATE = dpp.mail.Template(CREDENTIALS_TEMPLATE.lstrip())
+
+
 def gen_main_message(aws_account_alias):
     """
     This is the unencrypted "welcome" message.
     """
-    return MAIN_MESSAGE.format(
+    return _MAIN_MESSAGE_TEMPLATE.render(
         alias=aws_account_alias,
-    ).lstrip()
+    )
+
+
+@functools.lru_cache()
+def get_main_message_part(aws_account_alias) -> MIMEText:
+    """
+    The welcome message is the same for every user of an account, so its MIME part is built once and shared
+    by all of their emails (see EmailBuilder.add_part()). It must not be modified.
+    """
+    return MIMEText(gen_main_message(aws_account_alias), _subtype='html')
 
 
 def gen_credentials_message(aws_account_alias, aws_account_id, aws_user_info):
     """
     This is the message that will be encrypted.
     """
-    return CREDENTIALS_TEMPLATE.format(
+    return _CREDENTIALS_TEMPLATE.render(
         alias=aws_account_alias,
         account_id=aws_account_id,
         username=aws_user_info['username'],
         password=aws_user_info['password'],
         access_key_id=aws_user_info['access_key_id'],
         secret_access_key=aws_user_info['secret_access_key'],
-    ).lstrip()
+    )
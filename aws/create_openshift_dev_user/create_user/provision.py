@@ -0,0 +1,73 @@
+#!/bin/env python3
+
+import logging
+logger = logging.getLogger(__name__)
+
+import dpp.google
+
+from .CreateUserWorkflow import CreateUserWorkflow
+from .spreadsheet import GoogleSheetsDataBridge
+from .UserToCreate import UserCreateStatus
+
+
+def provision_from_spreadsheet(
+        spreadsheet_data_bridge : GoogleSheetsDataBridge,
+        workflow : CreateUserWorkflow,
+        email_sender,
+        update_spreadsheet : bool = True,
+        outbox : dpp.google.Outbox = None,
+    ) -> list:
+    """
+    Creates the users that have been approved in the spreadsheet, emails them their credentials,
+    and records their new status in the spreadsheet.
+
+    @param email_sender:        dpp.google.EmailSender (or FakeEmailSender)
+    @param update_spreadsheet:  False to leave the spreadsheet untouched, e.g. for a dry run
+    @param outbox:              if given, each user's credentials email is saved to it as soon as their
+                                account has been created, so that it isn't lost if sending fails or the
+                                process dies. Emails left in it by earlier runs are sent too.
+    @return [UserToCreate] - the users that were processed
+    """
+    if update_spreadsheet:
+        spreadsheet_data_bridge.start_status_updates()
+    try:
+        if update_spreadsheet:
+            spreadsheet_data_bridge.fix_up_user_status()
+        users_to_create = spreadsheet_data_bridge.get_users_to_create()
+
+        if not len(users_to_create):
+            print("No users to create.")
+            return users_to_create
+
+        # Each user's status is recorded as soon as they've been processed, so that a failure part-way
+        # through doesn't lose the status of the users that were already created.
+        def on_user_done(user):
+            if outbox is not None and user.status == UserCreateStatus.ACCOUNT_CREATED:
+                outbox.add(user.output_message)
+            if update_spreadsheet:
+                spreadsheet_data_bridge.update_user_status([user])
+        workflow.run(users_to_create, on_user_done=on_user_done)
+
+        print("Emailing users with credentials...")
+        if outbox is not None:
+            results = outbox.deliver(email_sender)
+        else:
+            created_users = [user for user in users_to_create if user.status == UserCreateStatus.ACCOUNT_CREATED]
+            results = email_sender.send_many([user.output_message for user in created_users])
+        report_send_results(results)
+        return users_to_create
+    finally:
+        if update_spreadsheet:
+            spreadsheet_data_bridge.finish_status_updates()
+
+
+def report_send_results(results : list) -> None:
+    """
+    @param results:     [dpp.google.SendResult]
+    @raise Exception if any of the emails couldn't be sent
+    """
+    failed = [result for result in results if not result.ok()]
+    for result in failed:
+        print("Could not email {}: {}".format(result.mime_message['to'], result.error))
+    if failed:
+        raise Exception("{} of {} credential emails could not be sent".format(len(failed), len(results)))
@@ -1,6 +1,8 @@
 #!/bin/env python3
 
 from pprint import pprint
+import json
+import os
 import tempfile
 import subprocess
 import logging
@@ -13,31 +15,176 @@ from .UserToCreate import (
 )
 
 SHEET_NAME = 'Form Responses 1'
-MIN_ROW = 2
-MAX_ROW = 100       # The largest row # to process
+MIN_ROW = 2         # The first row # that contains a user (row 1 is the header)
+EMAIL_COLUMN = 'B'
+GPG_KEY_COLUMN = 'H'
 STATUS_COLUMN = 'I'
 ERROR_NOTES_COLUMN = 'J'
 
-def get_cell_range(left_col, right_col):
-   return '{sheet_name}!{left_col}{min_row}:{right_col}{max_row}'.format(
-        sheet_name=SHEET_NAME,
-        left_col=left_col,
-        min_row=MIN_ROW,
-        right_col=right_col,
-        max_row=MAX_ROW,
-    )
+STATUS_IN_REVIEW = 'In Review'
+STATUS_APPROVED = 'Approved-but-not-created'
+STATUS_DENIED = 'Denied'
+STATUS_CREATED = 'Account created'
+# Rows with one of these statuses (or a blank one) may still need something done. Any other status, i.e.
+# "Account created", "Denied" or anything else an administrator typed in (e.g. "Duplicate"), is final: the
+# row never needs to be looked at again.
+OPEN_STATUSES = (None, '', STATUS_IN_REVIEW, STATUS_APPROVED)
+# An open row more than this many rows above the newest one stops holding the read window open (with a
+# warning), so that requests nobody ever reviewed don't make every run read the sheet from there down.
+MAX_OPEN_ROW_AGE = 1000
+
+def normalize_email(email) -> str:
+    return (email or '').lower().strip()
+
+def get_cell_range(left_col, right_col, start_row=MIN_ROW):
+    """
+    @return str - an open-ended range, i.e. from start_row down to the last row with data
+    """
+    return str(dpp.google.CellRange(
+        sheet=SHEET_NAME,
+        top_left_col=left_col,
+        top_left_row=start_row,
+        bottom_right_col=right_col,
+        bottom_right_row=None,
+    ))
 
 class GoogleSheetsDataBridge(object):
     def __init__(self,
             spreadsheet_id : str,
             service_account_file : str,
+            state_file : str = None,
+            journal_file : str = None,
+            sheet_service : dpp.google.SheetService = None,
         ):
+        """
+        @param service_account_file - credentials for the Sheets API. Not used if sheet_service is given.
+        @param state_file - if set, the last user above the first row that may still need processing is
+                            remembered in this file, and later runs only read the sheet from below that row.
+                            In practice, that means that each run only reads the rows that were appended since
+                            the previous one, plus any that are still waiting for approval (see OPEN_STATUSES).
+        @param journal_file - see start_status_updates()
+        @param sheet_service - SheetService to use, e.g. one backed by dpp.google.FakeSheetsService. By
+                            default, one is created for spreadsheet_id.
+        """
         self.spreadsheet_id = spreadsheet_id
-        logger.debug('Connecting to Google Sheets API')
-        self.service = dpp.google.SheetService.new_instance(
-            spreadsheet_id=spreadsheet_id,
-            service_account_file=service_account_file,
-        )
+        self.state_file = state_file
+        self.journal_file = journal_file
+        self._status_writer = None          # SheetWriteBehind, between start/finish_status_updates()
+        if sheet_service is not None:
+            self.service = sheet_service
+        else:
+            logger.debug('Connecting to Google Sheets API')
+            self.service = dpp.google.SheetService.new_instance(
+                spreadsheet_id=spreadsheet_id,
+                service_account_file=service_account_file,
+            )
+        self._email_cells = None            # CellRangeData of the email column
+        self._key_status_cells = None       # CellRangeData of the GPG key & status columns
+
+
+    def _read_state(self) -> tuple:
+        """
+        @return (anchor row #, anchor email) - the last row with a user above the first one that may still need
+                processing, or (None, None) if the sheet must be read from the top
+        """
+        if self.state_file is None:
+            return None, None
+        try:
+            with open(self.state_file) as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            return None, None
+        if state.get('spreadsheet_id') != self.spreadsheet_id or not state.get('anchor_email'):
+            return None, None
+        return state['anchor_row'], state['anchor_email']
+
+
+    def _write_state(self, anchor_row : int, anchor_email : str) -> None:
+        if self.state_file is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.state_file))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump({
+                'spreadsheet_id': self.spreadsheet_id,
+                'anchor_row': anchor_row,
+                'anchor_email': anchor_email,
+            }, fh)
+        os.replace(tmp_path, self.state_file)
+
+
+    def _read_window(self, anchor_row : int = None, anchor_email : str = None) -> bool:
+        """
+        Loads the rows below anchor_row, or from MIN_ROW if it's None.
+        @return bool - False (and nothing is loaded) if anchor_row doesn't contain anchor_email any more
+        """
+        top_row = MIN_ROW if anchor_row is None else anchor_row
+        email_cells, key_status_cells = self.service.read_many([
+            get_cell_range(EMAIL_COLUMN, EMAIL_COLUMN, top_row),
+            get_cell_range(GPG_KEY_COLUMN, STATUS_COLUMN, top_row),
+        ])
+        if anchor_row is not None:
+            email = email_cells.get_cell(0, 0) if email_cells.height() else None
+            if normalize_email(email) != anchor_email:
+                return False
+        # Each open-ended range stops at its own last non-empty row (e.g. the newest rows have no status
+        # yet), so extend both to the same height. The anchor row itself is dropped.
+        skip = 0 if anchor_row is None else 1
+        height = max(email_cells.height(), key_status_cells.height(), skip)
+        self._email_cells, self._key_status_cells = [
+            dpp.google.CellRangeData(
+                cell_range=cells.cell_range.with_height(height).window(top_row + skip),
+                cells=(cells.cells + [[None] * cells.width() for _ in range(cells.height(), height)])[skip:],
+            )
+            for cells in (email_cells, key_status_cells)
+        ]
+        return True
+
+
+    def _load_cells(self) -> None:
+        """
+        Reads every column this class uses in a single request, from below the remembered anchor row down to
+        the last row with data. The columns between the email and the GPG key aren't used, so they're skipped.
+
+        The anchor row is read too, to check that it still has the same user in it. If it doesn't, rows
+        above it were deleted (or moved), so the rows that were skipped may have shifted into the window's
+        place, and the sheet is read again from the top.
+        """
+        if self._email_cells is not None:
+            return
+        anchor_row, anchor_email = self._read_state()
+        logger.debug('Retrieving values from Google spreadsheet, id: {}, from row {}'.format(self.service.spreadsheet_id, anchor_row or MIN_ROW))
+        if not self._read_window(anchor_row, anchor_email):
+            logger.warning('Row {} of the spreadsheet no longer contains {}, re-reading it from row {}'.format(anchor_row, anchor_email, MIN_ROW))
+            anchor_row, anchor_email = None, None
+            self._read_window()
+        self._write_state(*self._next_anchor(anchor_row, anchor_email))
+
+
+    def _row_number(self, row_idx : int) -> int:
+        return self._email_cells.cell_range.top_left_row + row_idx
+
+
+    def _next_anchor(self, anchor_row : int, anchor_email : str) -> tuple:
+        """
+        @return (row #, email) of the last user in the loaded window above the first one whose status isn't
+                final yet, or the given anchor if there's no such user
+        """
+        newest_row = self._row_number(self._email_cells.height() - 1)
+        for row_idx in range(0, self._email_cells.height()):
+            email = normalize_email(self._email_cells.get_cell(row_idx, 0))
+            if email == '':
+                continue
+            row = self._row_number(row_idx)
+            status = self._key_status_cells.get_cell(row_idx, 1)
+            if status in OPEN_STATUSES:
+                if newest_row - row <= MAX_OPEN_ROW_AGE:
+                    break
+                logger.warning('Row {} ({}) is still "{}" after {} newer requests, later runs will no longer read it'.format(
+                    row, email, status or STATUS_IN_REVIEW, newest_row - row))
+            anchor_row, anchor_email = row, email
+        return anchor_row, anchor_email
 
 
     def fix_up_user_status(self) -> None:
@@ -46,15 +193,21 @@ class GoogleSheetsDataBridge(object):
         This method reads in the Status column and populates any missing ones.
         """
         logger.debug('Fixing up the status values , id: {}'.format(self.service.spreadsheet_id))
-        cells = self.service.read_cells(cell_range=get_cell_range(STATUS_COLUMN, STATUS_COLUMN))
+        self._load_cells()
+        email_cells = self._email_cells
+        cells = self._key_status_cells
 
         write_buffer = dpp.google.SheetWriteBuffer()
         for row_idx in range(0, cells.height()):
-            status = cells.get_cell(row_idx, 0)
+            email = email_cells.get_cell(row_idx, 0)
+            if email is None or email == '':
+                # Not a user, e.g. a row whose contents were deleted.
+                continue
+            status = cells.get_cell(row_idx, 1)
             if status is None or status == '':
                 write_buffer.set(
-                    cell=cells.get_relative_cell(row_idx=row_idx,  col_idx=0),
-                    value='In Review',
+                    cell=cells.get_relative_cell(row_idx=row_idx,  col_idx=1),
+                    value=STATUS_IN_REVIEW,
                 )
         if write_buffer.num_pending_writes():
             logger.debug('Updating {} user status cells.'.format(write_buffer.num_pending_writes()))
@@ -62,36 +215,64 @@ class GoogleSheetsDataBridge(object):
 
 
     def get_users_to_create(self) -> list:
-        logger.debug('Retrieving values from Google spreadsheet, id: {}'.format(self.service.spreadsheet_id))
-        cells = self.service.read_cells(cell_range=get_cell_range('B', STATUS_COLUMN))
+        self._load_cells()
+        email_cells = self._email_cells
+        key_status_cells = self._key_status_cells
 
         users_to_create = []
-        for row_idx in range(0, cells.height()):
-            email = cells.get_cell(row_idx, 0)
+        for row_idx in range(0, email_cells.height()):
+            email = email_cells.get_cell(row_idx, 0)
             if email is None or email == '':
                 # No email address, so ignore this row.
                 continue
-            email = email.lower().strip()
+            email = normalize_email(email)
 
-            status = cells.get_cell(row_idx, 7)
-            if status != 'Approved-but-not-created':
+            status = key_status_cells.get_cell(row_idx, 1)
+            if status != STATUS_APPROVED:
                 continue
 
-            gpg_key = cells.get_cell(row_idx, 6)
-            if "-----BEGIN PGP PUBLIC KEY BLOCK-----" not in gpg_key:
+            gpg_key = key_status_cells.get_cell(row_idx, 0)
+            if gpg_key is None or "-----BEGIN PGP PUBLIC KEY BLOCK-----" not in gpg_key:
                 gpg_key = None
 
             users_to_create.append(UserToCreate(
                 user_id=email,
                 gpg_key=gpg_key,
-                spreadsheet_row=row_idx + 2,
+                spreadsheet_row=self._row_number(row_idx),
             ))
         return users_to_create
 
 
+    def start_status_updates(self) -> None:
+        """
+        From now until finish_status_updates(), update_user_status() queues its writes and returns immediately;
+        they're sent in the background. If a journal_file was given, queued writes are also saved there until
+        they've been sent, so that if this process dies, they're sent by the next run instead of being lost.
+        Writes left over from a previous run are sent before this returns, so that they're reflected
+        in what this run reads.
+        """
+        self._status_writer = dpp.google.SheetWriteBehind(
+            sheet_service=self.service,
+            journal_file=self.journal_file,
+        )
+        self._status_writer.start()
+        if not self._status_writer.flush():
+            logger.warning('Could not send the status updates left over from a previous run: {}'.format(self._status_writer.last_error))
+
+
+    def finish_status_updates(self) -> None:
+        """
+        Waits for the queued status updates to be sent.
+        """
+        writer = self._status_writer
+        self._status_writer = None
+        writer.close()
+
+
     def update_user_status(self, users : list) -> None:
         """
         After an account is successfully created, update the 'Status' column in the spreadsheet.
+        This can be called once for each user as soon as they're processed (see start_status_updates()).
         """
 
         def update_status(user, new_value):
@@ -107,15 +288,18 @@ class GoogleSheetsDataBridge(object):
             )
 
         logger.debug('Updating the spreadsheet to reflect the new User status.')
-        write_buffer = dpp.google.SheetWriteBuffer()
+        write_buffer = self._status_writer if self._status_writer is not None else dpp.google.SheetWriteBuffer()
         for user in users:
             assert(user.spreadsheet_row is not None)
             if user.status == UserCreateStatus.ACCOUNT_CREATED:
-                update_status(user, 'Account created')
+                update_status(user, STATUS_CREATED)
                 update_error_notes(user, None)
             elif user.status == UserCreateStatus.FAILED_PREFLIGHT_CHECK:
                 update_error_notes(user, ', '.join(user.errors))
 
+        if write_buffer is self._status_writer:
+            # Sent in the background
+            return
         if write_buffer.num_pending_writes():
             logger.debug('Updating {} user status cells.'.format(write_buffer.num_pending_writes()))
             self.service.update_cells(write_buffer)
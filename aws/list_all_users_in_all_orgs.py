@@ -4,11 +4,18 @@
 This script uses the AWS APIs to list all AWS accounts in the organization, and all IAM accounts (users) in each account.
 It generates a CSV to stdout.
 
+With --stale, it instead reports the IAM users, passwords and access keys that haven't been used for
+--max-idle-days, from each account's credential report (a couple of API calls per account, whatever the
+number of users). Accounts are queried concurrently.
+
 It relies on a "coreosinc" profile being available in ~/.aws/credentials, which should map to the Master Account (aka Root Account).
 """
 
+import argparse
+import concurrent.futures
 import sys
 import csv
+import botocore
 from pprint import pprint
 import os.path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'libs', 'python'))
@@ -23,63 +30,167 @@ import dpp.aws
 # AWS Root Account ID - This is the master account. Sub-accounts are organized in a hierarchy using AWS Organizations.
 ROOT_ACCOUNT_ID = '595879546273'
 
-aws_session = dpp.aws.AwsSession.for_profile(profile_name="coreosinc")
-accounts = aws_session.get_accounts()
-active_accounts = [ acct for acct in accounts if acct['Status'] == 'ACTIVE' ]
-
-csvout = csv.writer(
-    sys.stdout,
-    delimiter=',',
-    quotechar='|',
-    quoting=csv.QUOTE_MINIMAL,
-)
-csvout.writerow([
-    'Account Name',
-    'Account Alias',
-    'Account Id',
-    'Account Arn',
-    'User Name',
-    'User Id',
-    'User Arn',
-    'Password Last Used',
-])
-
-for account in active_accounts:
+def get_parser():
+    parser = argparse.ArgumentParser(description='List the IAM users of every account in the organization, as CSV')
+    parser.add_argument('--stale', action='store_true',
+        help='Only report unused users, passwords and access keys, from each account\'s credential report')
+    parser.add_argument('--max-idle-days', type=int, default=90,
+        help='With --stale: how long a credential can go unused before it is reported')
+    parser.add_argument('--max-workers', type=int, default=8,
+        help='With --stale: how many accounts to query at once')
+    return parser
+
+
+def get_iam_operations(aws_session, account):
     if account['Id'] == ROOT_ACCOUNT_ID:
-        iam_ops = dpp.aws.IamOperations.for_session(aws_session=aws_session)
-    else:
-        sts_token = aws_session.get_sts_token_for_account(ROOT_ACCOUNT_ID, account['Id'])
-        if sts_token is None:
-            raise Exception("Could not get STS token for {}".format(account['Name']))
-        iam_ops = dpp.aws.IamOperations.for_account(aws_session=aws_session, credentials=sts_token['Credentials'])
-
-    iam_account_alias = iam_ops.get_account_alias()
-    if iam_account_alias is None:
-        iam_account_alias = '[None]'
-    iam_accounts = iam_ops.get_IAM_accounts()
-
-    if len(iam_accounts) == 0:
-        iam_accounts = [
-            {
-                'Arn': '[No users]',
-                'UserId': '[No users]',
-                'UserName': '[No users]',
-                'PasswordLastUsed': None,
-            }
-        ]
-
-    for iam_account in iam_accounts:
+        return dpp.aws.IamOperations.for_session(aws_session=aws_session)
+    sts_token = aws_session.get_sts_token_for_account(ROOT_ACCOUNT_ID, account['Id'])
+    if sts_token is None:
+        raise Exception("Could not get STS token for {}".format(account['Name']))
+    return dpp.aws.IamOperations.for_account(aws_session=aws_session, credentials=sts_token['Credentials'])
+
+
+def get_csv_writer():
+    return csv.writer(
+        sys.stdout,
+        delimiter=',',
+        quotechar='|',
+        quoting=csv.QUOTE_MINIMAL,
+    )
+
+
+def list_users(aws_session, active_accounts):
+    csvout = get_csv_writer()
+    csvout.writerow([
+        'Account Name',
+        'Account Alias',
+        'Account Id',
+        'Account Arn',
+        'User Name',
+        'User Id',
+        'User Arn',
+        'Password Last Used',
+    ])
+
+    for account in active_accounts:
+        iam_ops = get_iam_operations(aws_session, account)
+
+        iam_account_alias = iam_ops.get_account_alias()
+        if iam_account_alias is None:
+            iam_account_alias = '[None]'
+        iam_accounts = iam_ops.get_IAM_accounts()
+
+        if len(iam_accounts) == 0:
+            iam_accounts = [
+                {
+                    'Arn': '[No users]',
+                    'UserId': '[No users]',
+                    'UserName': '[No users]',
+                    'PasswordLastUsed': None,
+                }
+            ]
+
+        for iam_account in iam_accounts:
+            try:
+                password_last_used = iam_account['PasswordLastUsed'].strftime('%Y-%m-%d')
+            except (KeyError, AttributeError):
+                password_last_used = None
+            csvout.writerow([
+                account['Name'],
+                iam_account_alias,
+                account['Id'],
+                account['Arn'],
+                iam_account['UserName'],
+                iam_account['UserId'],
+                iam_account['Arn'],
+                password_last_used,
+            ])
+
+
+def get_placeholder_findings(placeholder):
+    return [
+        {
+            'user': placeholder,
+            'arn': placeholder,
+            'credential': None,
+            'last_used': None,
+            'reason': None,
+        }
+    ]
+
+
+def get_stale_credentials(iam_ops, max_idle_days):
+    """
+    @param iam_ops: IamOperations for the account, or None if it couldn't be accessed
+    @return (account alias, [finding dicts from dpp.aws.find_stale_credentials()])
+    """
+    # Problems with an account are reported as a row, so that they don't stop the report for the others
+    iam_account_alias = dpp.aws.PERMISSION_DENIED
+    if iam_ops is None:
+        return iam_account_alias, get_placeholder_findings(dpp.aws.PERMISSION_DENIED)
+    try:
+        iam_account_alias = iam_ops.get_account_alias() or '[None]'
+        report = iam_ops.get_credential_report()
+    except botocore.exceptions.ClientError:
+        return iam_account_alias, get_placeholder_findings(dpp.aws.PERMISSION_DENIED)
+    except dpp.aws.CredentialReportTimeoutException:
+        return iam_account_alias, get_placeholder_findings('[Credential report timed out]')
+    return iam_account_alias, dpp.aws.find_stale_credentials(report, max_idle_days=max_idle_days)
+
+
+def report_stale(aws_session, active_accounts, max_idle_days, max_workers):
+    csvout = get_csv_writer()
+    csvout.writerow([
+        'Account Name',
+        'Account Alias',
+        'Account Id',
+        'User Name',
+        'User Arn',
+        'Credential',
+        'Last Used',
+        'Reason',
+    ])
+
+    # boto3 sessions aren't thread-safe, so the clients are all created up front; the clients themselves are.
+    iam_ops_by_account = []
+    for account in active_accounts:
         try:
-            password_last_used = iam_account['PasswordLastUsed'].strftime('%Y-%m-%d')
-        except (KeyError, AttributeError):
-            password_last_used = None
-        csvout.writerow([
-            account['Name'],
-            iam_account_alias,
-            account['Id'],
-            account['Arn'],
-            iam_account['UserName'],
-            iam_account['UserId'],
-            iam_account['Arn'],
-            password_last_used,
-        ])
+            iam_ops = get_iam_operations(aws_session, account)
+        except botocore.exceptions.ClientError:
+            # Can't assume a role in the account
+            iam_ops = None
+        iam_ops_by_account.append((account, iam_ops))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            lambda args: get_stale_credentials(args[1], max_idle_days),
+            iam_ops_by_account,
+        )
+        for (account, _), (iam_account_alias, findings) in zip(iam_ops_by_account, results):
+            for finding in findings:
+                last_used = finding['last_used']
+                csvout.writerow([
+                    account['Name'],
+                    iam_account_alias,
+                    account['Id'],
+                    finding['user'],
+                    finding['arn'],
+                    finding['credential'],
+                    last_used.strftime('%Y-%m-%d') if last_used is not None else None,
+                    finding['reason'],
+                ])
+
+
+def main():
+    args = get_parser().parse_args()
+    aws_session = dpp.aws.AwsSession.for_profile(profile_name="coreosinc")
+    accounts = aws_session.get_accounts()
+    active_accounts = [ acct for acct in accounts if acct['Status'] == 'ACTIVE' ]
+
+    if args.stale:
+        report_stale(aws_session, active_accounts, args.max_idle_days, args.max_workers)
+    else:
+        list_users(aws_session, active_accounts)
+
+
+if __name__ == '__main__':
+    main()
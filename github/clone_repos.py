@@ -1,53 +1,96 @@
 #!/bin/env python3
 """
-Clones all the repos from various (hard-coded) orgs into a sub-directory
+Clones all the repos from various (hard-coded) orgs into a sub-directory. Repos that were already
+cloned by a previous run are updated instead.
 """
 
+import argparse
 import functools
-import json
-import git
 import os
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'libs', 'python'))
+import dpp.git
 import dpp.github
 
-def clone_repo(repo_dir, repo_url):
-    if os.path.exists(repo_dir):
-        if os.path.exists(os.path.join(repo_dir, '.git')):
-            print("Skipping, already cloned")
-            return
-    else:
-        os.makedirs(repo_dir)
-
-    progress = git.remote.RemoteProgress()
-    repo = git.Repo.clone_from(
-        url=repo_url + '.git',
-        to_path=repo_dir,
-    )
+ORGS = [
+    "coreos",
+    "coreos-inc",
+    "operator-framework",
+]
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Clones/updates all repos in the {} orgs'.format(', '.join(ORGS)))
+    parser.add_argument('command', nargs='?', choices=['sync', 'gc'], default='sync',
+        help="'sync' (default) clones/updates the repos. 'gc' garbage-collects the shared object store.")
+    parser.add_argument('--dest', type=str,
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'repos'),
+        help="Directory to clone the repos into (default: ./repos)")
+    parser.add_argument('-j', '--workers', type=int, default=8,
+        help="Number of repos to clone/update concurrently (default: 8)")
+    parser.add_argument('--depth', type=int, default=None,
+        help="Make shallow clones with this many commits of history")
+    parser.add_argument('--partial', action='store_true',
+        help="Make blobless partial clones (--filter=blob:none)")
+    parser.add_argument('--timeout', type=int, default=600,
+        help="Seconds allowed per repo (default: 600)")
+    parser.add_argument('--shared-store', type=str, default=None,
+        help="Path to a bare repo that holds the objects of all the repos. Checkouts borrow from it"
+            " (git clone --reference) instead of storing their own copy of shared history."
+            " Can't be combined with --depth or --partial.")
+    return parser
+
+
+def print_progress(num_done, num_total, result):
+    print("{idx:>{width}}/{num_total}: {result}".format(
+        idx=num_done,
+        num_total=num_total,
+        width=len(str(num_total)),
+        result=result,
+    ))
+
+
+def gc(args):
+    if args.shared_store is None:
+        print("Fatal error: gc requires --shared-store", file=sys.stderr)
+        sys.exit(1)
+    checkout_paths = [
+        os.path.join(args.dest, name)
+        for name in sorted(os.listdir(args.dest))
+    ] if os.path.isdir(args.dest) else []
+    dpp.git.SharedObjectStore(args.shared_store).gc(checkout_paths)
 
 
 def main():
-    orgs = [
-        "coreos",
-        "coreos-inc",
-        "operator-framework",
-    ]
-    repos = functools.reduce(lambda x,y: x+y, [dpp.github.api.get_repos(org) for org in orgs])
+    args = get_parser().parse_args()
+    if args.command == 'gc':
+        gc(args)
+        return
+
+    # The org repo lists rarely change, so don't re-query them on every run.
+    cache = dpp.github.ResponseCache(ttl=6 * 3600)
+    repos = functools.reduce(lambda x,y: x+y, [dpp.github.api.get_repos(org, cache=cache, fields=['name', 'url']) for org in ORGS])
     repos = sorted(repos, key=lambda x: x['name'])
 
-    cwd = os.path.dirname(os.path.abspath(__file__))
-    num_repos = len(repos)
-    for idx, repo in enumerate(repos):
-        repo_dir = os.path.join(cwd, 'repos', repo['name'])
-        repo_url = repo['url']
-        print("{idx:>{width}}/{num_repos}: Cloning {repo_url} into {repo_dir}".format(
-            idx=idx + 1,
-            num_repos=len(repos),
-            width=len(str(len(repos))),
-            repo_url=repo_url,
-            repo_dir=repo_dir,
-        ))
-        clone_repo(repo_dir, repo_url)
+    jobs = [
+        (repo['url'] + '.git', os.path.join(args.dest, repo['name']))
+        for repo in repos
+    ]
+
+    engine = dpp.git.CloneEngine(
+        max_workers=args.workers,
+        depth=args.depth,
+        partial=args.partial,
+        timeout=args.timeout,
+        shared_store=dpp.git.SharedObjectStore(args.shared_store) if args.shared_store else None,
+    )
+    summary = engine.sync_all(jobs, progress=print_progress)
+
+    print(summary)
+    for result in summary.failures():
+        print("  {}".format(result), file=sys.stderr)
+    if summary.failures():
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -1,139 +1,469 @@
 #!/bin/env python3
+"""
+Builds a graph of the dependencies between the repos cloned by clone_repos.py.
+
+A repo depends on another (cloned) repo if it:
+- vendors it, i.e. has a vendor/github.com/<org>/<repo> directory
+- lists it in glide.lock
+- lists it in Godeps/Godeps.json
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+
+ORGS = [
+    "coreos",
+    "coreos-inc",
+    "operator-framework",
+]
+DEP_TYPES = ["vendor", "godep", "glide"]
+
+DEFAULT_REPOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'repos')
+MANIFEST_FILES = ['glide.lock', os.path.join('Godeps', 'Godeps.json')]
+
+
+def normalize_repo_id(url_or_import_path : str):
+    """
+    Maps a git remote URL or a Go import path onto the ID of the repo that contains it, e.g.
+        'https://github.com/coreos/etcd.git', 'git@github.com:coreos/etcd', 'github.com/coreos/etcd/clientv3'
+    all map to 'https://github.com/coreos/etcd'.
+
+    @return str | None - None if it isn't a github.com repo
+    """
+    matches = re.search(r'github\.com[/:]([^/\s]+)/([^/\s]+)', url_or_import_path, re.IGNORECASE)
+    if matches is None:
+        return None
+    name = re.sub(r'\.git$', '', matches.group(2))
+    return 'https://github.com/{}/{}'.format(matches.group(1), name).lower()
+
+
+def _is_tracked_org(repo_id : str) -> bool:
+    return repo_id.split('/')[3] in ORGS
+
+
+def _read_origin_url(repo_path : str):
+    """
+    @return str | None - the URL of the 'origin' remote, read directly from .git/config
+    """
+    try:
+        with open(os.path.join(repo_path, '.git', 'config'), 'r') as fh:
+            config = fh.read()
+    except OSError:
+        return None
+    matches = re.search(r'\[remote "origin"\][^\[]*?^\s*url\s*=\s*(\S+)', config, re.MULTILINE)
+    return matches.group(1) if matches else None
+
+
+def read_head_sha(repo_path : str):
+    """
+    Reads the commit SHA of HEAD straight out of .git, which is much cheaper than running
+    "git rev-parse HEAD" for hundreds of repos.
+
+    @return str | None - None if it couldn't be determined
+    """
+    git_dir = os.path.join(repo_path, '.git')
+    try:
+        with open(os.path.join(git_dir, 'HEAD'), 'r') as fh:
+            head = fh.read().strip()
+    except OSError:
+        return None
+    if not head.startswith('ref:'):
+        return head         # Detached HEAD
+    ref = head[len('ref:'):].strip()
+
+    try:
+        with open(os.path.join(git_dir, ref), 'r') as fh:
+            return fh.read().strip()
+    except OSError:
+        pass
+    # The ref may have been packed
+    try:
+        with open(os.path.join(git_dir, 'packed-refs'), 'r') as fh:
+            for line in fh:
+                parts = line.strip().split(' ')
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    except OSError:
+        pass
+    return None
+
+
+def get_fingerprint(repo_path : str):
+    """
+    @return dict | None - identifies the state of the repo as far as scan_repo() is concerned: if it's
+            unchanged, then so are the scan results. None if HEAD can't be read.
+    """
+    head = read_head_sha(repo_path)
+    if head is None:
+        return None
+    manifests = {}
+    for manifest in MANIFEST_FILES:
+        try:
+            with open(os.path.join(repo_path, manifest), 'rb') as fh:
+                manifests[manifest] = hashlib.sha1(fh.read()).hexdigest()
+        except OSError:
+            pass
+    return {'head': head, 'manifests': manifests}
+
+
+def scan_repo(repo_path : str) -> list:
+    """
+    Finds the dependencies declared by the checkout at repo_path. This is a module-level function so
+    that it can be run in worker processes.
+
+    @return [(dep_type, target_repo_id)] - targets are restricted to the ORGS, but not yet resolved
+            against the set of cloned repos.
+    """
+    found = []
+
+    for org in ORGS:
+        vendor_dir = os.path.join(repo_path, 'vendor', 'github.com', org)
+        try:
+            entries = list(os.scandir(vendor_dir))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir():
+                found.append(('vendor', 'https://github.com/{}/{}'.format(org, entry.name).lower()))
+
+    glide_lock = os.path.join(repo_path, 'glide.lock')
+    if os.path.isfile(glide_lock):
+        with open(glide_lock, 'r', errors='replace') as fh:
+            # glide.lock is YAML, but all we need is the "- name: <import path>" lines
+            for line in fh:
+                matches = re.search(r'^\s*-\s*name:\s*(\S+)', line)
+                if matches:
+                    found.append(('glide', normalize_repo_id(matches.group(1))))
+
+    godeps_json = os.path.join(repo_path, 'Godeps', 'Godeps.json')
+    if os.path.isfile(godeps_json):
+        try:
+            with open(godeps_json, 'r') as fh:
+                godeps = json.load(fh)
+        except ValueError:
+            godeps = {}
+        for dep in godeps.get('Deps') or []:
+            found.append(('godep', normalize_repo_id(dep.get('ImportPath', ''))))
+
+    return [
+        (dep_type, target)
+        for dep_type, target in found
+        if target is not None and _is_tracked_org(target)
+    ]
+
 
 class DiscRepo(object):
+    """
+    A repo that has been cloned to disc
+    """
     def __init__(self, url, name, path):
         self.url = url
         self.name = name
         self.path = path
 
-    @classmethod
-    def find(name) -> DiscRepo:
+    @staticmethod
+    def find_all(repos_dir : str) -> dict:
+        """
+        @return {repo_id: DiscRepo} - every checkout directly under repos_dir
+        """
+        ret = {}
+        for name in sorted(os.listdir(repos_dir)):
+            path = os.path.join(repos_dir, name)
+            url = _read_origin_url(path)
+            if url is None:
+                continue
+            repo_id = normalize_repo_id(url)
+            if repo_id is None:
+                continue
+            ret[repo_id] = DiscRepo(url=url, name=name, path=path)
+        return ret
+
+
+class ScanCache(object):
+    """
+    Persists each repo's scan_repo() result alongside the fingerprint of the checkout it came from.
+    """
+    VERSION = 1
+
+    def __init__(self, path : str):
+        self.path = path
+        self.repos = {}     # repo_id => {'url', 'name', 'path', 'fingerprint', 'found'}
+        try:
+            with open(path, 'r') as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == ScanCache.VERSION:
+            self.repos = data['repos']
+
+    def get(self, repo_id : str, fingerprint : dict):
+        """
+        @return [(dep_type, target_repo_id)] | None - None if there's no result for this fingerprint
+        """
+        entry = self.repos.get(repo_id)
+        if fingerprint is None or entry is None or entry['fingerprint'] != fingerprint:
+            return None
+        return [tuple(dep) for dep in entry['found']]
+
+    def put(self, disc_repo : DiscRepo, repo_id : str, fingerprint : dict, found : list) -> None:
+        if fingerprint is None:
+            self.repos.pop(repo_id, None)
+            return
+        self.repos[repo_id] = {
+            'url': disc_repo.url,
+            'name': disc_repo.name,
+            'path': disc_repo.path,
+            'fingerprint': fingerprint,
+            'found': [list(dep) for dep in found],
+        }
+
+    def retain(self, repo_ids) -> None:
+        """
+        Forgets any repo not in repo_ids
+        """
+        repo_ids = set(repo_ids)
+        self.repos = {repo_id: entry for repo_id, entry in self.repos.items() if repo_id in repo_ids}
+
+    def disc_repos(self) -> dict:
         """
-        TODO
+        @return {repo_id: DiscRepo} - the repos as they were when last scanned
         """
-        raise NotImplemented()
-        return DiscRepo or error
+        return {
+            repo_id: DiscRepo(url=entry['url'], name=entry['name'], path=entry['path'])
+            for repo_id, entry in self.repos.items()
+        }
+
+    def save(self) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump({'version': ScanCache.VERSION, 'repos': self.repos}, fh)
+        os.replace(tmp_path, self.path)
 
 
 class Dependency(object):
     def __init__(self, dep_type: str, target_repo_id: str):
-        assert(dep_type in ["vendor", "godep", "glide"])
+        assert(dep_type in DEP_TYPES)
         self.dep_type = dep_type
         self.target_repo_id = target_repo_id
 
+    def key(self):
+        return (self.dep_type, self.target_repo_id)
+
 
 class Repository(object):
     def __init__(self, repo_id: str, name: str, disc_repo: DiscRepo):
-        self.repo_id = repo_id   # unique identifier (github URL)
+        self.repo_id = repo_id   # unique identifier (normalized github URL)
         self.name = name        # Short name of this repo (i.e. last part of the URL)
-        self.disc_repo = disc_repo        # Short name of this repo (i.e. last part of the URL)
+        self.disc_repo = disc_repo
         self.depends_on = []     # List of Dependency objects
-        self.used_by = []       # List of repository names
+        self.used_by = set()     # Set of repo_ids
+        self._dependency_keys = set()
 
-    def add_dependency(dep: Dependency) -> None:
+    def add_dependency(self, dep: Dependency) -> bool:
         """
-        TODO
+        @return bool - False if the dependency was already present
         """
-        if dependency already exists, return
-        raise NotImplemented()
+        if dep.key() in self._dependency_keys:
+            return False
+        self._dependency_keys.add(dep.key())
+        self.depends_on.append(dep)
+        return True
+
+    def clear_dependencies(self) -> None:
+        self.depends_on = []
+        self._dependency_keys = set()
+
+    def dependency_ids(self) -> set:
+        return set(dep.target_repo_id for dep in self.depends_on)
 
 
 class RepoGraph(object):
     def __init__(self):
-        self.graph = {}     # Repository
+        self.graph = {}         # repo_id => Repository
+        self.unresolved = {}    # repo_id => set of dependency repo_ids that aren't cloned
+        self.scan_results = {}  # repo_id => [(dep_type, target_repo_id)] the edges were built from
 
-    def add_repo(disc_repo: DiscRepo) -> Repository:
-        repo_id = disc_repo.url
+    def add_repo(self, disc_repo: DiscRepo) -> Repository:
+        repo_id = normalize_repo_id(disc_repo.url)
         if repo_id in self.graph:
             return self.graph[repo_id]
         repo = Repository(
-            repo_id=disc_repo.url,
+            repo_id=repo_id,
             name=disc_repo.name,
             disc_repo=disc_repo,
         )
         self.graph[repo.repo_id] = repo
         return repo
 
-    def find_deps(repo: Repository):
-        for each vendor/github.com/[coreos|coreos-inc|operator-framework]/*
-            disc_repo = DiscRepo.find(name)
-            dep_repo = self.add_repo(disc_repo)
-            repo.add_dependency(dep_type="vendored", dep_repo)
-        if glide.lock exists:
-            parse
-            for each dep that matches coreos/coreos-inc/operator-framework:
-                disc_repo = DiscRepo.find(name)
-                repo.add_dependency(dep_type="glide", dep_repo=disc_repo)
-                add
-#   look for glide.lock
-#   if found, extract
-
-def add_repo(repos, repo_name):
-  find_repo
-  make empty Repo
-  find_dependencies(repos, repo_id)
-  
-
-def make_graph(repo_names):
-    repos = {}
-    for repo_name in repo_names:
-        name, url = find_repo
-        add_repo(repos, repo_name)
-
-# for each repo
-#   find the repo
-#     if not found, error
-# 
-#   look for vendor/github.com/[coreos|coreos-inc]/*
-#   look for glide.lock
-#   if found, extract
-# look for Godep.lock
-
-import functools
-import json
-import git
-import os
-import sys
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'libs', 'python'))
-import dpp.github
+    def remove_repo(self, repo_id : str) -> None:
+        repo = self.graph.pop(repo_id)
+        for target_id in repo.dependency_ids():
+            if target_id in self.graph:
+                self.graph[target_id].used_by.discard(repo_id)
+        self.unresolved.pop(repo_id, None)
+        self.scan_results.pop(repo_id, None)
+        # Repos that depended on it now have an unresolved dependency
+        for user_id in repo.used_by:
+            if user_id in self.graph:
+                self.set_dependencies(self.graph[user_id], self.scan_results.get(user_id, []))
 
-def clone_repo(repo_dir, repo_url):
-    if os.path.exists(repo_dir):
-        if os.path.exists(os.path.join(repo_dir, '.git')):
-            print("Skipping, already cloned")
-            return
-    else:
-        os.makedirs(repo_dir)
+    def build(self, disc_repos : dict, max_workers : int = None, scan_cache : ScanCache = None) -> int:
+        """
+        Brings the graph in line with disc_repos. Repos that are new, or whose fingerprint doesn't match
+        scan_cache, are scanned (in parallel, across processes); the edges of everything else are reused.
+        Calling this again on an existing graph only touches the edges of repos that changed.
+
+        @param disc_repos:  {repo_id: DiscRepo}, see DiscRepo.find_all()
+        @param max_workers: number of scanning processes (default: number of CPUs)
+        @param scan_cache:  ScanCache | None - updated with the new scan results (but not saved)
+        @return int - the number of repos that were scanned
+        """
+        for repo_id in [repo_id for repo_id in self.graph if repo_id not in disc_repos]:
+            self.remove_repo(repo_id)
+        new_ids = set(repo_id for repo_id in disc_repos if repo_id not in self.graph)
 
-    progress = git.remote.RemoteProgress()
-    repo = git.Repo.clone_from(
-        url=repo_url + '.git',
-        to_path=repo_dir,
-    )
+        changed = {}        # repo_id => found
+        to_scan = []        # [(Repository, fingerprint)]
+        for repo_id, disc_repo in disc_repos.items():
+            repo = self.add_repo(disc_repo)
+            fingerprint = get_fingerprint(disc_repo.path)
+            found = scan_cache.get(repo_id, fingerprint) if scan_cache is not None else None
+            if found is None:
+                to_scan.append((repo, fingerprint))
+            elif found != self.scan_results.get(repo_id):
+                changed[repo_id] = found
+
+        if len(to_scan):
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+                paths = [repo.disc_repo.path for repo, _ in to_scan]
+                for (repo, fingerprint), found in zip(to_scan, executor.map(scan_repo, paths, chunksize=8)):
+                    changed[repo.repo_id] = found
+                    if scan_cache is not None:
+                        scan_cache.put(repo.disc_repo, repo.repo_id, fingerprint, found)
+
+        # Newly cloned repos may resolve dependencies that other (unchanged) repos couldn't before.
+        for repo_id, targets in list(self.unresolved.items()):
+            if repo_id not in changed and not targets.isdisjoint(new_ids):
+                changed[repo_id] = self.scan_results[repo_id]
+
+        for repo_id, found in changed.items():
+            self.set_dependencies(self.graph[repo_id], found)
+        if scan_cache is not None:
+            scan_cache.retain(disc_repos.keys())
+        return len(to_scan)
+
+    def set_dependencies(self, repo : Repository, found : list) -> None:
+        """
+        Replaces repo's outgoing edges (and the matching used_by back-edges) with the scan result in found.
+
+        @param found:   [(dep_type, target_repo_id)], see scan_repo()
+        """
+        for target_id in repo.dependency_ids():
+            if target_id in self.graph:
+                self.graph[target_id].used_by.discard(repo.repo_id)
+        repo.clear_dependencies()
+        self.unresolved.pop(repo.repo_id, None)
+        self.scan_results[repo.repo_id] = found
+
+        for dep_type, target_id in found:
+            if target_id == repo.repo_id:
+                continue
+            if target_id not in self.graph:
+                self.unresolved.setdefault(repo.repo_id, set()).add(target_id)
+                continue
+            repo.add_dependency(Dependency(dep_type=dep_type, target_repo_id=target_id))
+            self.graph[target_id].used_by.add(repo.repo_id)
+
+    def used_by_transitive(self, repo_id : str) -> set:
+        """
+        @return set of repo_ids that depend on repo_id, directly or indirectly
+        """
+        seen = set()
+        queue = collections.deque([repo_id])
+        while queue:
+            for user_id in self.graph[queue.popleft()].used_by:
+                if user_id not in seen and user_id != repo_id:
+                    seen.add(user_id)
+                    queue.append(user_id)
+        return seen
+
+    def find(self, name_or_id : str) -> Repository:
+        """
+        @param name_or_id:  a repo ID/URL, 'org/repo', or just the repo's short name
+        @return Repository | None
+        """
+        repo_id = normalize_repo_id(name_or_id) or normalize_repo_id('github.com/' + name_or_id)
+        if repo_id in self.graph:
+            return self.graph[repo_id]
+        matches = [repo for repo in self.graph.values() if repo.name.lower() == name_or_id.lower()]
+        return matches[0] if len(matches) == 1 else None
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Finds dependencies between the repos cloned by clone_repos.py')
+    parser.add_argument('--repos-dir', type=str, default=DEFAULT_REPOS_DIR,
+        help="Directory containing the cloned repos (default: ./repos)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+        help="Number of scanning processes (default: number of CPUs)")
+    parser.add_argument('--cache-file', type=str, default=None,
+        help="Where to keep scan results between runs (default: <repos-dir>/../find_deps.cache.json)")
+    parser.add_argument('--no-rescan', action='store_true',
+        help="Answer from the cached scan results without checking the repos for changes")
+    parser.add_argument('--transitive', action='store_true',
+        help="With REPO, list everything that depends on it directly or indirectly")
+    parser.add_argument('repo', nargs='?', default=None,
+        help="Only show the dependencies of, and dependents on, this repo")
+    return parser
+
+
+def print_repo(repo : Repository) -> None:
+    print(repo.repo_id)
+    for dep in sorted(repo.depends_on, key=lambda dep: dep.key()):
+        print("  depends on {} ({})".format(dep.target_repo_id, dep.dep_type))
+    for repo_id in sorted(repo.used_by):
+        print("  used by    {}".format(repo_id))
 
 
 def main():
-    orgs = [
-        "coreos",
-        "coreos-inc",
-        "operator-framework",
-    ]
-    repos = functools.reduce(lambda x,y: x+y, [dpp.github.api.get_repos(org) for org in orgs])
-    repos = sorted(repos, key=lambda x: x['name'])
-
-    cwd = os.path.dirname(os.path.abspath(__file__))
-    num_repos = len(repos)
-    for idx, repo in enumerate(repos):
-        repo_dir = os.path.join(cwd, 'repos', repo['name'])
-        repo_url = repo['url']
-        print("{idx:>{width}}/{num_repos}: Cloning {repo_url} into {repo_dir}".format(
-            idx=idx + 1,
-            num_repos=len(repos),
-            width=len(str(len(repos))),
-            repo_url=repo_url,
-            repo_dir=repo_dir,
-        ))
-        clone_repo(repo_dir, repo_url)
+    args = get_parser().parse_args()
+    cache_file = args.cache_file
+    if cache_file is None:
+        cache_file = os.path.join(os.path.dirname(os.path.abspath(args.repos_dir)), 'find_deps.cache.json')
+    scan_cache = ScanCache(cache_file)
+
+    repo_graph = RepoGraph()
+    if args.no_rescan:
+        for repo_id, disc_repo in scan_cache.disc_repos().items():
+            repo_graph.add_repo(disc_repo)
+        for repo_id, entry in scan_cache.repos.items():
+            repo_graph.set_dependencies(repo_graph.graph[repo_id], [tuple(dep) for dep in entry['found']])
+    else:
+        num_scanned = repo_graph.build(DiscRepo.find_all(args.repos_dir), max_workers=args.workers, scan_cache=scan_cache)
+        if num_scanned:
+            print("Scanned {} changed repos".format(num_scanned), file=sys.stderr)
+        scan_cache.save()
+
+    if args.repo is None:
+        for repo_id in sorted(repo_graph.graph):
+            print_repo(repo_graph.graph[repo_id])
+        return
+
+    repo = repo_graph.find(args.repo)
+    if repo is None:
+        print("'{}' is not a cloned repo.".format(args.repo), file=sys.stderr)
+        sys.exit(1)
+    if args.transitive:
+        for repo_id in sorted(repo_graph.used_by_transitive(repo.repo_id)):
+            print(repo_id)
+        return
+    print_repo(repo)
 
 
 if __name__ == '__main__':
@@ -3,7 +3,10 @@
 # This is useful in determining how often tests may need to be run.
 
 import csv
+import os
 import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'libs', 'python'))
+import dpp.github
 
 REPOS = """
 https://github.com/coreos/awscli
@@ -26,14 +29,43 @@ https://github.com/coreos-inc/tectonic-operators/tree/master/operator/network
 https://github.com/coreos/kubecsr/
 """
 
-def get_repo_names():
-    return [
-        repo_url[len('https://github.com/'):].split('/')[:2]
-        for repo_url in REPOS.strip().split("\n")
-    ]
+# Only the fields that are written to the CSV
+PR_FIELDS = ['number', 'title', 'merged', 'createdAt', 'closedAt']
+
+
+def iter_repo_names():
+    """
+    Generator of unique (orgname, reponame) pairs in REPOS. Several entries are subdirectories of the
+    same repo (or plain duplicates), and each repo should only be fetched once.
+    """
+    seen = set()
+    for repo_url in REPOS.strip().split("\n"):
+        orgname, reponame = repo_url.strip()[len('https://github.com/'):].split('/')[:2]
+        key = (orgname.lower(), reponame.lower())
+        if key in seen:
+            continue
+        seen.add(key)
+        yield (orgname, reponame)
+
+
+def iter_pr_rows(repos):
+    """
+    Generator of CSV rows, one per PR. PRs are pulled from Github a page at a time as the rows are
+    consumed, so memory use doesn't depend on the number of PRs in a repo.
+    """
+    for (orgname, reponame) in repos:
+        for pr in dpp.github.api.iter_prs(orgname=orgname, reponame=reponame, fields=PR_FIELDS):
+            yield [
+                '{orgname}/{reponame}'.format(orgname=orgname, reponame=reponame),
+                pr['number'],
+                pr['title'],
+                'Merged' if pr['merged'] else 'Not Merged',
+                pr['createdAt'],
+                pr['closedAt'],
+            ]
+
 
 def main():
-    repos = get_repo_names()
     csvout = csv.writer(
         sys.stdout,
         delimiter=',',
@@ -48,16 +80,7 @@ def main():
         'Created datetime',
         'Closed datetime',
     ])
-    for (orgname, reponame) in repos:
-        for pr in githubapi.api.get_prs(orgname=orgname, reponame=reponame):
-            csvout.writerow([
-                '{orgname}/{reponame}'.format(orgname=orgname, reponame=reponame),
-                pr['number'],
-                pr['title'],
-                'Merged' if pr['merged'] else 'Not Merged',
-                pr['createdAt'],
-                pr['closedAt'],
-            ])
+    csvout.writerows(iter_pr_rows(iter_repo_names()))
 
 
 if __name__ == '__main__':
@@ -1,30 +1,53 @@
 #!/bin/env python3
+"""
+Fetches the list of repos in the coreos & coreos-inc orgs, and saves it as a local snapshot
+(see dpp.snapshot) so that other scripts can load it without querying Github.
+"""
 
 from pprint import pprint
-import pickle
 import sys
 import os.path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'libs', 'python'))
 
 import dpp.github
+import dpp.snapshot
+
+# Bump this if the fields stored for each repo change, so that older snapshots are re-fetched.
+SCHEMA_VERSION = 1
+MAX_AGE = 24 * 3600     # Seconds
+
 
 def main():
-    repos = dpp.github.api.get_repos("coreos") + dpp.github.api.get_repos("coreos-inc")
-    repos = sorted(repos, key=lambda x: x['name'])
+    repos = fetch()
     print(len(repos))
     pprint(repos)
     save(repos)
 
 
-def _get_pickle_file():
+def fetch():
+    repos = dpp.github.api.get_repos("coreos") + dpp.github.api.get_repos("coreos-inc")
+    return sorted(repos, key=lambda x: x['name'])
+
+
+def _get_snapshot_file():
     cwd = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(cwd, 'repos.pickle')
+    return os.path.join(cwd, 'repos.snapshot')
 
 def save(repos):
-    pickle.dump(repos, open(_get_pickle_file(), 'wb'))
-
-def load():
-    return pickle.load(open(_get_pickle_file(), 'rb'))
+    dpp.snapshot.Snapshot.write(_get_snapshot_file(), repos, schema_version=SCHEMA_VERSION)
+
+def load(columns=None):
+    """
+    @param columns: list of repo fields to load, e.g. ['name', 'url'] (default: all)
+    @return list of repo dicts, re-fetched from Github if the snapshot is missing or stale
+    """
+    return dpp.snapshot.load_or_refresh(
+        _get_snapshot_file(),
+        fetch=fetch,
+        max_age=MAX_AGE,
+        schema_version=SCHEMA_VERSION,
+        columns=columns,
+    )
 
 
 if __name__ == '__main__':
@@ -5,7 +5,15 @@ from .AwsSession import AwsSession
 from .Operations import (
     Operations,
 )
-from .iam.IamOperations import IamOperations
+from .iam.IamOperations import (
+    CredentialReportTimeoutException,
+    IamOperations,
+    PERMISSION_DENIED,
+)
+from .iam.credential_report import (
+    find_stale_credentials,
+    parse_report_time,
+)
 from .iam.UserFactory import (
     RecordExistsException,
     UserFactory,
@@ -20,7 +28,11 @@ from .Route53Operations import (
 __all__ = [
     'AwsSession',
 
+    'CredentialReportTimeoutException',
     'IamOperations',
+    'PERMISSION_DENIED',
+    'find_stale_credentials',
+    'parse_report_time',
     'RecordExistsException',
     'UserFactory',
     'FakeUserFactory',
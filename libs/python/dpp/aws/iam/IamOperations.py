@@ -8,11 +8,21 @@ $ sudo dnf install python3-boto3 python3-botocore
 
 import boto3
 import botocore
+import csv
 import functools
+import io
+import time
 from pprint import pprint
 from ..AwsSession import AwsSession
 from ..Operations import Operations
 
+# Placeholder returned in place of values that the credentials aren't allowed to read
+PERMISSION_DENIED = '[Permission Denied]'
+
+
+class CredentialReportTimeoutException(Exception):
+    pass
+
 
 class IamOperations(Operations):
     @classmethod
@@ -25,7 +35,7 @@ class IamOperations(Operations):
         try:
             response = self.aws_client.list_account_aliases()
         except botocore.exceptions.ClientError:
-            return '[Permission denied]'
+            return PERMISSION_DENIED
         if len(response['AccountAliases']) == 0:
             return None
         return response['AccountAliases'][0]
@@ -56,9 +66,9 @@ class IamOperations(Operations):
         except botocore.exceptions.ClientError:
             return [
                 {
-                    'Arn': '[Permission Denied]',
-                    'UserId': '[Permission Denied]',
-                    'UserName': '[Permission Denied]',
+                    'Arn': PERMISSION_DENIED,
+                    'UserId': PERMISSION_DENIED,
+                    'UserName': PERMISSION_DENIED,
                     'PasswordLastUsed': None,
                 }
             ]
@@ -67,6 +77,35 @@ class IamOperations(Operations):
         return ret
 
 
+    def get_credential_report(self, poll_interval : float = 2, timeout : float = 300):
+        """
+        Return the account's credential report: a row per IAM user (plus one for the root user, see
+        credential_report.ROOT_ACCOUNT_USER) saying when its password and access keys were last used.
+        AWS generates the report in bulk, so this costs a few calls however many users the account has,
+        and reuses a report for up to 4 hours.
+
+        Each row is a dict keyed by the report's CSV columns: 'user', 'arn', 'user_creation_time',
+        'password_enabled', 'password_last_used', 'password_last_changed', 'access_key_1_active',
+        'access_key_1_last_rotated', 'access_key_1_last_used_date', ... (see credential_report.py)
+
+        @param poll_interval:   seconds between checks on the report's generation
+        @param timeout:         seconds to wait for the report before giving up
+        @return list of dicts
+        @raise CredentialReportTimeoutException if the report isn't ready within timeout seconds
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            response = self.aws_client.generate_credential_report()
+            if response['State'] == 'COMPLETE':
+                break
+            if time.monotonic() > deadline:
+                raise CredentialReportTimeoutException("Credential report still not generated after {} seconds".format(timeout))
+            time.sleep(poll_interval)
+
+        response = self.aws_client.get_credential_report()
+        return list(csv.DictReader(io.StringIO(response['Content'].decode('utf-8'))))
+
+
     @functools.lru_cache()
     def get_all_policies(self):
         policy_paginator = self.aws_client.get_paginator('list_policies')
@@ -2,7 +2,13 @@ import logging
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 from .IamOperations import (
+    CredentialReportTimeoutException,
     IamOperations,
+    PERMISSION_DENIED,
+)
+from .credential_report import (
+    find_stale_credentials,
+    parse_report_time,
 )
 from .UserFactory import (
     RecordExistsException,
@@ -10,7 +16,13 @@ from .UserFactory import (
     FakeUserFactory,
 )
 __all__ = [
+    'CredentialReportTimeoutException',
     'IamOperations',
+    'PERMISSION_DENIED',
+
+    'find_stale_credentials',
+    'parse_report_time',
+
     'RecordExistsException',
     'UserFactory',
     'FakeUserFactory',
@@ -0,0 +1,87 @@
+#!/bin/env python3
+
+"""
+Helpers for IAM credential reports (see IamOperations.get_credential_report()), which list when every
+user's password and access keys were last used.
+https://docs.aws.amazon.com/IAM/latest/UserGuide/id_credentials_getting-report.html
+"""
+
+import datetime
+
+# The report's row for the account's root user
+ROOT_ACCOUNT_USER = '<root_account>'
+
+# Values the report uses instead of a date
+_NO_DATE = ('', 'N/A', 'no_information', 'not_supported')
+
+ACCESS_KEYS = ('access_key_1', 'access_key_2')
+
+
+def parse_report_time(value : str) -> datetime.datetime:
+    """
+    @param value:   a credential report date, e.g. '2019-02-11T20:07:35+00:00'
+    @return datetime (timezone-aware) | None if the value means "never" or "unknown"
+    """
+    if value is None or value in _NO_DATE:
+        return None
+    return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z')
+
+
+def find_stale_credentials(report : list, max_idle_days : int = 90, now : datetime.datetime = None) -> list:
+    """
+    Flags, from a credential report:
+      - 'user':             users none of whose credentials were used within max_idle_days
+      - 'password':         enabled console passwords not used within max_idle_days
+      - 'access_key_1'/'_2': active access keys not used within max_idle_days
+    Credentials that were never used are flagged once they're older than max_idle_days (going by when
+    the user was created, or the password changed or key rotated).
+
+    @param report:  rows returned by IamOperations.get_credential_report()
+    @return list of dicts - {'user', 'arn', 'credential', 'last_used' (datetime | None), 'reason'}
+    """
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+    cutoff = now - datetime.timedelta(days=max_idle_days)
+
+    ret = []
+    def flag(row, credential, last_used, created):
+        if last_used is not None:
+            if last_used >= cutoff:
+                return
+            reason = 'unused for {} days'.format((now - last_used).days)
+        else:
+            if created is not None and created >= cutoff:
+                return
+            reason = 'never used'
+        ret.append({
+            'user': row['user'],
+            'arn': row['arn'],
+            'credential': credential,
+            'last_used': last_used,
+            'reason': reason,
+        })
+
+    for row in report:
+        if row['user'] == ROOT_ACCOUNT_USER:
+            continue
+        user_created = parse_report_time(row['user_creation_time'])
+        credentials = []        # [(credential, last used, created)]
+        if row['password_enabled'] == 'true':
+            credentials.append((
+                'password',
+                parse_report_time(row['password_last_used']),
+                parse_report_time(row['password_last_changed']) or user_created,
+            ))
+        for key in ACCESS_KEYS:
+            if row[key + '_active'] == 'true':
+                credentials.append((
+                    key,
+                    parse_report_time(row[key + '_last_used_date']),
+                    parse_report_time(row[key + '_last_rotated']) or user_created,
+                ))
+
+        last_used = max((c[1] for c in credentials if c[1] is not None), default=None)
+        flag(row, 'user', last_used, user_created)
+        for credential, credential_last_used, created in credentials:
+            flag(row, credential, credential_last_used, created)
+    return ret
@@ -0,0 +1,243 @@
+#!/bin/env python3
+
+"""
+Clones (or updates) many git repositories concurrently.
+
+This shells out to the git binary rather than using GitPython, so that each operation can be
+bounded by a timeout and the child process killed if it overruns.
+"""
+
+import concurrent.futures
+import logging
+logger = logging.getLogger(__name__)
+import os
+import shutil
+import subprocess
+import time
+
+
+class CloneResult(object):
+    CLONED = 'cloned'
+    UPDATED = 'updated'
+    FAILED = 'failed'
+    TIMED_OUT = 'timed out'
+
+    def __init__(self, url : str, path : str, action : str, elapsed : float, error : str = None):
+        self.url = url
+        self.path = path
+        self.action = action            # One of the constants above
+        self.elapsed = elapsed          # Seconds
+        self.error = error
+
+    def ok(self) -> bool:
+        return self.action in (CloneResult.CLONED, CloneResult.UPDATED)
+
+    def __str__(self):
+        ret = '{action} {path} ({elapsed:.1f}s)'.format(action=self.action, path=self.path, elapsed=self.elapsed)
+        if self.error:
+            ret += ': ' + self.error
+        return ret
+
+
+class CloneSummary(object):
+    def __init__(self, results : list, elapsed : float):
+        self.results = results
+        self.elapsed = elapsed
+
+    def count(self, action : str) -> int:
+        return len([result for result in self.results if result.action == action])
+
+    def failures(self) -> list:
+        return [result for result in self.results if not result.ok()]
+
+    def __str__(self):
+        return '{total} repos in {elapsed:.1f}s: {cloned} cloned, {updated} updated, {failed} failed, {timed_out} timed out'.format(
+            total=len(self.results),
+            elapsed=self.elapsed,
+            cloned=self.count(CloneResult.CLONED),
+            updated=self.count(CloneResult.UPDATED),
+            failed=self.count(CloneResult.FAILED),
+            timed_out=self.count(CloneResult.TIMED_OUT),
+        )
+
+
+class GitCommandError(Exception):
+    pass
+
+
+class CloneEngine(object):
+    """
+    Example:
+
+        engine = CloneEngine(max_workers=16, partial=True)
+        summary = engine.sync_all([(url, path), ...], progress=lambda done, total, result: print(result))
+        print(summary)
+
+    A repo whose path doesn't contain a checkout yet is cloned; an existing checkout gets a
+    "fetch --prune" followed by a fast-forward of the current branch.
+    """
+    def __init__(self,
+            max_workers : int = 8,
+            depth : int = None,
+            partial : bool = False,
+            timeout : float = 600,
+            git_binary : str = 'git',
+            shared_store = None,
+        ):
+        """
+        @param max_workers: number of repos to clone/fetch at once
+        @param depth:       if set, make shallow clones with this much history
+        @param partial:     if True, make blobless partial clones (--filter=blob:none). File contents are
+                            then fetched on demand, at checkout time.
+        @param timeout:     seconds allowed for each repo, across all the git commands run for it
+        @param git_binary:  path to git
+        @param shared_store: dpp.git.SharedObjectStore | None - if given, each repo is first fetched into the
+                            store, and checkouts borrow their objects from it rather than storing their own.
+                            Can't be combined with depth or partial.
+        """
+        if depth is not None and depth < 1:
+            raise Exception('depth must be a positive integer, got {}'.format(depth))
+        if partial and shared_store is not None:
+            # Objects missing from a partial clone are fetched lazily from its origin, which defeats
+            # (and confuses) the borrowing from the shared store.
+            raise Exception('Partial clones cannot be combined with a shared object store')
+        if depth is not None and shared_store is not None:
+            # The store holds full history (shallow fetches into it would serialize on its "shallow" file),
+            # so a shallow checkout would save nothing, yet still download everything into the store.
+            raise Exception('Shallow clones cannot be combined with a shared object store')
+        self.max_workers = max_workers
+        self.depth = depth
+        self.partial = partial
+        self.timeout = timeout
+        self.git_binary = git_binary
+        self.shared_store = shared_store
+        if shared_store is not None:
+            shared_store.init()
+
+    def sync_all(self, jobs : list, progress=None) -> CloneSummary:
+        """
+        @param jobs:        list of (url, path) tuples
+        @param progress:    optional callable(num_done : int, num_total : int, result : CloneResult), called as
+                            each repo completes (from the calling thread)
+        @return CloneSummary
+        """
+        start = time.time()
+        results = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.sync, url, path) for url, path in jobs]
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if progress is not None:
+                    progress(len(results), len(jobs), result)
+        return CloneSummary(results=results, elapsed=time.time() - start)
+
+    def sync(self, url : str, path : str) -> CloneResult:
+        """
+        Clones url into path, or updates the existing checkout at path.
+        @return CloneResult
+        """
+        start = time.time()
+        deadline = start + self.timeout
+        is_update = os.path.isdir(os.path.join(path, '.git'))
+        # If the clone fails, only what it wrote may be removed: the directory if this call creates it, or the
+        # contents of a directory that was empty. (git refuses to clone into an existing non-empty
+        # directory, and that directory isn't ours to delete.)
+        created_path = not os.path.exists(path)
+        was_empty = not created_path and os.path.isdir(path) and not os.listdir(path)
+        try:
+            if self.shared_store is not None:
+                # The checkout's own clone/fetch below then only transfers what the store doesn't already have.
+                self.shared_store.fetch(url, deadline=deadline)
+            if is_update:
+                self._update(path, deadline)
+                action = CloneResult.UPDATED
+            else:
+                self._clone(url, path, deadline)
+                action = CloneResult.CLONED
+            error = None
+        except subprocess.TimeoutExpired:
+            action = CloneResult.TIMED_OUT
+            error = 'exceeded {}s'.format(self.timeout)
+        except (GitCommandError, OSError) as e:
+            # OSError: e.g. git_binary is missing, or the checkout's parent directory can't be created
+            action = CloneResult.FAILED
+            error = str(e)
+
+        if action in (CloneResult.FAILED, CloneResult.TIMED_OUT):
+            # Don't leave a half-cloned directory behind, or the next run will think it's a checkout.
+            if created_path:
+                shutil.rmtree(path, ignore_errors=True)
+            elif was_empty:
+                for name in os.listdir(path):
+                    child = os.path.join(path, name)
+                    if os.path.isdir(child) and not os.path.islink(child):
+                        shutil.rmtree(child, ignore_errors=True)
+                    else:
+                        os.remove(child)
+
+        result = CloneResult(url=url, path=path, action=action, elapsed=time.time() - start, error=error)
+        logger.debug(str(result))
+        return result
+
+    def _clone_args(self) -> list:
+        args = []
+        if self.depth is not None:
+            args += ['--depth', str(self.depth)]
+        if self.partial:
+            args += ['--filter=blob:none']
+        if self.shared_store is not None:
+            args += ['--reference', self.shared_store.path]
+        return args
+
+    def _clone(self, url : str, path : str, deadline : float) -> None:
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._git(['clone', '--quiet'] + self._clone_args() + [url, path], deadline=deadline)
+
+    def _update(self, path : str, deadline : float) -> None:
+        if self.shared_store is not None:
+            # Checkouts made before the shared store was in use
+            self.shared_store.attach(path, deadline=deadline)
+
+        fetch_args = ['fetch', '--quiet', '--prune', 'origin']
+        if self.depth is not None:
+            fetch_args.insert(1, '--depth={}'.format(self.depth))
+        self._git(fetch_args, cwd=path, deadline=deadline)
+
+        # Fast-forward the checked-out branch, if it tracks a remote branch. (A detached HEAD or
+        # a branch without an upstream is left alone.)
+        try:
+            self._git(['rev-parse', '--abbrev-ref', '--symbolic-full-name', '@{upstream}'], cwd=path, deadline=deadline)
+        except GitCommandError:
+            return
+        if self.depth is not None:
+            # A depth-limited fetch truncates history, so git can't prove the new tip descends from
+            # the old one and refuses to fast-forward. Shallow checkouts are mirrors, so just move to the tip.
+            self._git(['reset', '--quiet', '--hard', '@{upstream}'], cwd=path, deadline=deadline)
+        else:
+            self._git(['merge', '--quiet', '--ff-only', '@{upstream}'], cwd=path, deadline=deadline)
+
+    def _git(self, args : list, deadline : float, cwd : str = None) -> str:
+        """
+        Runs a git command, raising GitCommandError if it fails, or subprocess.TimeoutExpired if the
+        deadline passes first.
+        """
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(cmd=args, timeout=self.timeout)
+
+        env = dict(os.environ)
+        env['GIT_TERMINAL_PROMPT'] = '0'        # Fail rather than hang on a credentials prompt
+        proc = subprocess.run(
+            [self.git_binary] + args,
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=remaining,
+        )
+        if proc.returncode != 0:
+            raise GitCommandError('git {} failed: {}'.format(args[0], proc.stderr.decode('utf-8', 'replace').strip()))
+        return proc.stdout.decode('utf-8', 'replace').strip()
@@ -0,0 +1,225 @@
+#!/bin/env python3
+
+"""
+A single bare repository that holds the objects for many mirrored repos.
+
+Forks and vendored copies of the same project share most of their history. Instead of every checkout
+storing (and downloading) its own copy of it, each upstream repo is fetched into the shared store under
+its own ref namespace, and checkouts are created with "git clone --reference", which makes them borrow
+objects from the store via .git/objects/info/alternates. Disk use and transfer then scale with the
+amount of unique history rather than the number of repos.
+
+Caveat: a borrowing checkout breaks if the store prunes objects that the checkout still needs. So
+never run a plain "git gc" in the store; use SharedObjectStore.gc(), which first records the refs of every
+borrowing checkout in the store so that their objects stay reachable.
+"""
+
+import contextlib
+import logging
+logger = logging.getLogger(__name__)
+import os
+import re
+import subprocess
+import threading
+import time
+
+from .CloneEngine import GitCommandError
+
+
+class SharedObjectStore(object):
+    def __init__(self, path : str, timeout : float = 3600, git_binary : str = 'git'):
+        """
+        @param path:        directory of the bare repository (created if missing, see init())
+        @param timeout:     seconds allowed for gc()
+        @param git_binary:  path to git
+        """
+        self.path = os.path.abspath(path)
+        self.timeout = timeout
+        self.git_binary = git_binary
+        # Serializes gc()s, which rewrite packed-refs
+        self._lock = threading.Lock()
+
+    def init(self) -> None:
+        if os.path.isfile(os.path.join(self.path, 'HEAD')):
+            return
+        os.makedirs(self.path, exist_ok=True)
+        self._git(['init', '--quiet', '--bare'])
+        # Automatic gc could prune objects that borrowers depend on, and would race with concurrent
+        # fetches. Housekeeping only happens through gc().
+        self._git(['config', 'gc.auto', '0'])
+        self._git(['config', 'gc.autoPackLimit', '0'])
+
+    @staticmethod
+    def namespace(url : str) -> str:
+        """
+        @return str - the ref namespace that url's refs are stored under, e.g.
+                      'https://github.com/coreos/etcd.git' => 'github.com/coreos/etcd'
+        """
+        name = re.sub(r'^[a-z+]+://', '', url.strip())
+        name = re.sub(r'^[^@/]+@', '', name)        # user@host
+        name = re.sub(r'\.git/?$', '', name).strip('/')
+        name = name.replace(':', '/')
+        name = re.sub(r'[^A-Za-z0-9._/-]', '_', name)
+        name = re.sub(r'\.+/|/\.+|^\.+|/{2,}', '_', name)     # Components that git won't accept in a ref name
+        return name
+
+    def fetch(self, url : str, deadline : float = None) -> None:
+        """
+        Fetches all branches and tags of url into the store.
+
+        Several fetches (of different urls) can run concurrently: each one only creates and updates refs
+        in its own namespace. In particular they don't --prune, which rewrites packed-refs and would fail
+        on its lock when run concurrently; refs of deleted branches and tags are pruned by gc() instead.
+        """
+        ns = self._mirror_refs_prefix(url)
+        self._git([
+                'fetch', '--quiet', '--no-tags', '--no-write-fetch-head', url,
+                '+refs/heads/*:{}heads/*'.format(ns),
+                '+refs/tags/*:{}tags/*'.format(ns),
+            ],
+            deadline=deadline,
+        )
+
+    def is_borrower(self, checkout_path : str) -> bool:
+        alternates_file = self._alternates_file(checkout_path)
+        if not os.path.isfile(alternates_file):
+            return False
+        with open(alternates_file, 'r') as fh:
+            return self._objects_dir() in [line.strip() for line in fh]
+
+    def attach(self, checkout_path : str, deadline : float = None) -> None:
+        """
+        Makes an existing checkout (cloned without --reference) borrow from the store, and drops its
+        local copies of any objects the store already has.
+        """
+        if self.is_borrower(checkout_path):
+            return
+        alternates_file = self._alternates_file(checkout_path)
+        os.makedirs(os.path.dirname(alternates_file), exist_ok=True)
+        with open(alternates_file, 'a') as fh:
+            fh.write(self._objects_dir() + '\n')
+        # -l excludes objects that are available from an alternate
+        self._git(['repack', '-a', '-d', '-l', '-q'], cwd=checkout_path, deadline=deadline)
+
+    def gc(self, checkout_paths : list, prune : str = '2.weeks.ago') -> None:
+        """
+        Prunes the mirrored refs of deleted branches and tags, and of repos that no longer have a checkout,
+        then repacks the store and prunes objects that nothing refers to any more. Must not be run while
+        fetch() is (e.g. during CloneEngine.sync_all()).
+
+        @param checkout_paths:  every checkout that borrows from the store. Their refs are copied into the store
+                                (under refs/borrowers/) before pruning, so that any objects they reference survive.
+                                A borrower missing from this list may be corrupted!
+        @param prune:           passed to "git gc --prune"
+        """
+        deadline = time.time() + self.timeout
+        with self._locked(deadline):
+            self._gc(checkout_paths, prune, deadline)
+
+    def _gc(self, checkout_paths : list, prune : str, deadline : float) -> None:
+        self._prune_mirrors(checkout_paths, deadline)
+
+        # Forget the refs from any previous gc(), so that deleted checkouts stop pinning objects.
+        refs = self._git(['for-each-ref', '--format=%(refname)', 'refs/borrowers/'], deadline=deadline)
+        if refs:
+            self._git(['update-ref', '--stdin'], deadline=deadline,
+                input=''.join('delete {}\n'.format(ref) for ref in refs.split('\n')))
+
+        for idx, checkout_path in enumerate(checkout_paths):
+            if not self.is_borrower(checkout_path):
+                continue
+            logger.debug('Recording refs of {}'.format(checkout_path))
+            self._git([
+                    'fetch', '--quiet', '--no-tags', os.path.abspath(checkout_path),
+                    '+refs/*:refs/borrowers/{}/*'.format(idx),
+                    '+HEAD:refs/borrowers/{}/HEAD'.format(idx),
+                ],
+                deadline=deadline,
+            )
+
+        logger.debug('Running gc in {}'.format(self.path))
+        self._git(['gc', '--quiet', '--prune={}'.format(prune)], deadline=deadline)
+
+    def _prune_mirrors(self, checkout_paths : list, deadline : float) -> None:
+        urls = []
+        for checkout_path in checkout_paths:
+            try:
+                urls.append(self._git(['config', '--get', 'remote.origin.url'], cwd=checkout_path, deadline=deadline))
+            except (GitCommandError, OSError):
+                # Not a checkout
+                continue
+
+        prefixes = tuple(self._mirror_refs_prefix(url) for url in urls)
+        refs = self._git(['for-each-ref', '--format=%(refname)', 'refs/mirrors/'], deadline=deadline)
+        stale = [ref for ref in refs.split('\n') if ref and not ref.startswith(prefixes)]
+        if stale:
+            logger.debug('Deleting the {} mirrored refs of repos without a checkout'.format(len(stale)))
+            self._git(['update-ref', '--stdin'], deadline=deadline,
+                input=''.join('delete {}\n'.format(ref) for ref in stale))
+
+        for url in urls:
+            ns = self._mirror_refs_prefix(url)
+            try:
+                self._git([
+                        'fetch', '--quiet', '--no-tags', '--no-write-fetch-head', '--prune', url,
+                        '+refs/heads/*:{}heads/*'.format(ns),
+                        '+refs/tags/*:{}tags/*'.format(ns),
+                    ],
+                    deadline=deadline,
+                )
+            except GitCommandError as e:
+                # Keep the refs of a repo that can't be reached right now
+                logger.warning('Could not prune the mirrored refs of {}: {}'.format(url, e))
+
+    def _mirror_refs_prefix(self, url : str) -> str:
+        return 'refs/mirrors/{}/'.format(self.namespace(url))
+
+    @contextlib.contextmanager
+    def _locked(self, deadline : float = None):
+        """
+        Holds the store's lock, waiting for it no later than deadline.
+
+        @raise subprocess.TimeoutExpired
+        """
+        timeout = -1
+        if deadline is not None:
+            timeout = max(0, deadline - time.time())
+        if not self._lock.acquire(timeout=timeout):
+            raise subprocess.TimeoutExpired(cmd='lock {}'.format(self.path), timeout=timeout)
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+    def _objects_dir(self) -> str:
+        return os.path.join(self.path, 'objects')
+
+    @staticmethod
+    def _alternates_file(checkout_path : str) -> str:
+        return os.path.join(checkout_path, '.git', 'objects', 'info', 'alternates')
+
+    def _git(self, args : list, deadline : float = None, cwd : str = None, input : str = None) -> str:
+        """
+        @raise GitCommandError, subprocess.TimeoutExpired
+        """
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                raise subprocess.TimeoutExpired(cmd=args, timeout=0)
+
+        env = dict(os.environ)
+        env['GIT_TERMINAL_PROMPT'] = '0'
+        proc = subprocess.run(
+            [self.git_binary] + args,
+            cwd=cwd if cwd is not None else self.path,
+            env=env,
+            input=input.encode('utf-8') if input is not None else None,
+            stdin=None if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=timeout,
+        )
+        if proc.returncode != 0:
+            raise GitCommandError('git {} failed: {}'.format(args[0], proc.stderr.decode('utf-8', 'replace').strip()))
+        return proc.stdout.decode('utf-8', 'replace').strip()
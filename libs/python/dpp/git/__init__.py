@@ -0,0 +1,20 @@
+import logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+from .CloneEngine import (
+    CloneEngine,
+    CloneResult,
+    CloneSummary,
+    GitCommandError,
+)
+from .SharedObjectStore import (
+    SharedObjectStore,
+)
+__all__ = [
+    'CloneEngine',
+    'CloneResult',
+    'CloneSummary',
+    'GitCommandError',
+
+    'SharedObjectStore',
+]
@@ -0,0 +1,26 @@
+import logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+from . import api
+from .cache import (
+    ResponseCache,
+)
+from .graphql import (
+    run_query,
+    run_rest,
+)
+from .query import (
+    ConnectionQuery,
+    Fragment,
+)
+__all__ = [
+    'api',
+
+    'ResponseCache',
+
+    'run_query',
+    'run_rest',
+
+    'ConnectionQuery',
+    'Fragment',
+]
@@ -4,114 +4,73 @@ from pprint import pprint
 import sys
 import os
 
-from .graphql import run_query
+from .query import (
+    ConnectionQuery,
+    Fragment,
+)
 
+PR_FIELDS = Fragment('PRFields', 'PullRequest', [
+    'number',
+    'createdAt',
+    'merged',
+    'closed',
+    'closedAt',
+    'title',
+])
 
-def get_prs(orgname, reponame):
-    query = """
-    query GetPRs ($orgname: String!, $reponame: String!, $first: Int, $after: String) {
-      repository(name: $reponame, owner: $orgname) {
-        pullRequests(
-            first: $first,
-            after: $after,
-            states: [CLOSED, MERGED],
-            orderBy: {field: UPDATED_AT, direction: DESC}
-        ) {
-          pageInfo {
-            endCursor
-            hasNextPage
-            hasPreviousPage
-            startCursor
-          }
-          nodes {
-            number
-            createdAt
-            merged
-            closed
-            closedAt
-            title
-          }
-        }
-      }
-    }
-    """
-    query_vars = """
-    {
-      "orgname": "%s",
-      "reponame": "%s",
-      "first": %s,
-      "after": %s
-    }
-    """
-    results = []
-    first = 100
-    after = "null"
+REPO_FIELDS = Fragment('RepoFields', 'Repository', [
+    'name',
+    'description',
+    {'owner': ['login']},
+    'isFork',
+    'isPrivate',
+    'url',
+])
 
-    while True:
-        result = run_query(query, query_vars % (orgname, reponame, first, after))
-        data = result['repository']['pullRequests']
-        results += [
-            repo
-            for repo in data['nodes']
-        ]
-        if not data['pageInfo']['hasNextPage']:
-            break
-        first = "null"
-        after = '"{cursor}"'.format(cursor=data['pageInfo']['endCursor'])
 
-    return results
+def get_prs(orgname, reponame, cache=None, fields=None):
+    return list(iter_prs(orgname, reponame, cache=cache, fields=fields))
 
 
-def get_repos(orgname):
-    query = """
-    query GetRepos ($orgname: String!, $first: Int, $after: String) {
-      organization(login: $orgname) {
-        repositories(first: $first, after: $after, orderBy: {field: NAME, direction: ASC}) {
-          pageInfo {
-            endCursor
-            hasNextPage
-            hasPreviousPage
-            startCursor
-          }
-          nodes {
-            name
-            description
-            owner {
-              login
-            }
-            isFork
-            isPrivate
-            url
-          }
-        }
-      }
-    }
+def iter_prs(orgname, reponame, cache=None, fields=None):
     """
-    query_vars = """
-    {
-      "orgname": "%s",
-      "first": %s,
-      "after": %s
-    }
+    Generator that yields the closed/merged PRs of a repo one at a time, fetching a page of results
+    from Github only when the previous page has been consumed.
+
+    @param fields:  list of PR fields to fetch (see dpp.github.query), default: PR_FIELDS
     """
-    results = []
-    first = 100
-    after = "null"
+    query = ConnectionQuery(
+        name='GetPRs',
+        variables={'orgname': 'String!', 'reponame': 'String!'},
+        path=[('repository', {'name': '$reponame', 'owner': '$orgname'})],
+        connection='pullRequests',
+        connection_args={
+            'states': '[CLOSED, MERGED]',
+            'orderBy': '{field: UPDATED_AT, direction: DESC}',
+        },
+        node_fields=fields if fields is not None else [PR_FIELDS],
+    )
+    yield from query.paginate({'orgname': orgname, 'reponame': reponame}, cache=cache)
 
-    while True:
-        result = run_query(query, query_vars % (orgname, first, after))
-        data = result['organization']['repositories']
-        results += [
-            repo
-            for repo in data['nodes']
-        ]
-        if not data['pageInfo']['hasNextPage']:
-            break
-        first = "null"
-        after = '"{cursor}"'.format(cursor=data['pageInfo']['endCursor'])
 
-    for i in range(0, len(results)):
-        results[i]['organization'] = results[i]['owner']['login']
-        del results[i]['owner']
+def get_repos(orgname, cache=None, fields=None):
+    """
+    @param fields:  list of repo fields to fetch (see dpp.github.query), default: REPO_FIELDS.
+                    If {'owner': ['login']} is fetched, it is flattened into an 'organization' key.
+    """
+    query = ConnectionQuery(
+        name='GetRepos',
+        variables={'orgname': 'String!'},
+        path=[('organization', {'login': '$orgname'})],
+        connection='repositories',
+        connection_args={'orderBy': '{field: NAME, direction: ASC}'},
+        node_fields=fields if fields is not None else [REPO_FIELDS],
+    )
+    results = list(query.paginate({'orgname': orgname}, cache=cache))
+
+    for result in results:
+        if 'owner' in result:
+            result['organization'] = result['owner']['login']
+            del result['owner']
 
     return results
@@ -0,0 +1,163 @@
+#!/bin/env python3
+
+"""
+On-disk cache for Github API responses.
+
+GraphQL responses are cached for a fixed TTL, keyed on the query text, its variables, and the identity of
+the API token that ran it (so two tokens with different access never see each other's results).
+
+REST responses additionally store the ETag returned by Github. Once an entry's TTL has expired it is not
+thrown away; instead the ETag is sent back as "If-None-Match", and a "304 Not Modified" reply (which costs
+no rate-limit points and no payload) simply renews the cached entry.
+"""
+
+import hashlib
+import json
+import logging
+logger = logging.getLogger(__name__)
+import os
+import tempfile
+import time
+
+
+def get_default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'dpp', 'github')
+
+
+def token_identity(token : str) -> str:
+    """
+    @return str - a stable identifier for an API token that doesn't reveal the token itself.
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:16]
+
+
+class CacheEntry(object):
+    def __init__(self, data, created : float, etag : str = None):
+        self.data = data
+        self.created = created      # Epoch time the entry was fetched (or last revalidated)
+        self.etag = etag            # REST responses only
+
+    def age(self) -> float:
+        return time.time() - self.created
+
+
+class ResponseCache(object):
+    """
+    Stores each response as a JSON file in cache_dir. The total size of the directory is kept under
+    max_bytes by evicting the least-recently-used entries (by file mtime, which is bumped on every hit).
+    """
+    def __init__(self,
+            cache_dir : str = None,
+            ttl : int = 3600,
+            max_bytes : int = 100 * 1024 * 1024,
+            bypass : bool = False,
+        ):
+        """
+        @param cache_dir:   directory to store entries in (default: ~/.cache/dpp/github)
+        @param ttl:         seconds that an entry is served without asking Github
+        @param max_bytes:   upper bound on the total size of the cache directory
+        @param bypass:      if True, never serve from the cache (fresh results are still stored)
+        """
+        self.cache_dir = cache_dir if cache_dir is not None else get_default_cache_dir()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(kind : str, text : str, variables, token_id : str) -> str:
+        """
+        @param kind:        'graphql' or 'rest'
+        @param text:        the GraphQL query text, or the REST URL
+        @param variables:   GraphQL variables / REST query params (dict or JSON string)
+        @param token_id:    see token_identity()
+        """
+        if isinstance(variables, str):
+            # Normalize hand-written JSON so that whitespace differences don't cause a miss.
+            variables = json.loads(variables) if variables.strip() else None
+        blob = json.dumps([kind, text, variables, token_id], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def _path(self, key : str) -> str:
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def get(self, key : str):
+        """
+        @return CacheEntry | None - the entry regardless of its age (callers decide if it's fresh)
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r') as fh:
+                record = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)          # Mark as recently used for eviction purposes
+        except OSError:
+            pass
+        return CacheEntry(data=record['data'], created=record['created'], etag=record.get('etag'))
+
+    def get_fresh(self, key : str):
+        """
+        @return the cached data if it exists, is younger than the TTL, and the cache isn't bypassed. Else None.
+        """
+        if self.bypass:
+            return None
+        entry = self.get(key)
+        if entry is None or entry.age() >= self.ttl:
+            return None
+        return entry.data
+
+    def put(self, key : str, data, etag : str = None) -> None:
+        record = {
+            'created': time.time(),
+            'etag': etag,
+            'data': data,
+        }
+        # Write to a temp file and rename, so a concurrent reader never sees a half-written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(record, fh)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def touch(self, key : str) -> None:
+        """
+        Marks an entry as freshly fetched, e.g. after Github replied "304 Not Modified".
+        """
+        entry = self.get(key)
+        if entry is not None:
+            self.put(key, data=entry.data, etag=entry.etag)
+
+    def clear(self) -> None:
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+            total += st.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        # Oldest first
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logger.debug('Evicting cache entry {}'.format(name))
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            total -= size
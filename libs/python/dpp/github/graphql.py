@@ -5,6 +5,10 @@ import requests
 from pprint import pprint
 import os
 
+from .cache import token_identity
+
+GITHUB_API_URL = 'https://api.github.com'
+
 
 @functools.lru_cache()
 def get_api_key():
@@ -19,9 +23,21 @@ def get_api_key():
     raise Exception('Could not find Github API key in envvar GITHUB_API_KEY or file ~/.secrets/github_api_key')
 
 
-def run_query(query, variables):
+def run_query(query, variables, cache=None):
+    """
+    @param query:       GraphQL query text
+    @param variables:   dict (or JSON string) of the query's variables
+    @param cache:       dpp.github.ResponseCache | None - if given, a fresh cached result is returned
+                        without contacting Github, and new results are stored in it.
+    """
+    if cache is not None:
+        cache_key = cache.make_key('graphql', query, variables, token_identity(get_api_key()))
+        cached = cache.get_fresh(cache_key)
+        if cached is not None:
+            return cached
+
     request = requests.post(
-        'https://api.github.com/graphql',
+        GITHUB_API_URL + '/graphql',
         json={'query': query, 'variables': variables},
         headers={"Authorization": "bearer {0}".format(get_api_key())},
     )
@@ -38,4 +54,44 @@ def run_query(query, variables):
             )
         ))
 
+    if cache is not None:
+        cache.put(cache_key, ret['data'])
     return ret['data']
+
+
+def run_rest(path, params=None, cache=None):
+    """
+    Performs a GET against the Github REST API.
+
+    @param path:        e.g. '/orgs/coreos/repos'
+    @param params:      dict of query string parameters
+    @param cache:       dpp.github.ResponseCache | None - if given, responses are cached. Once an entry is older
+                        than the cache's TTL, it is revalidated with "If-None-Match"; a 304 reply doesn't count
+                        against the rate limit and doesn't re-transfer the data.
+    @return the decoded JSON response
+    """
+    url = GITHUB_API_URL + path
+    headers = {"Authorization": "token {0}".format(get_api_key())}
+
+    entry = None
+    if cache is not None:
+        cache_key = cache.make_key('rest', url, params, token_identity(get_api_key()))
+        cached = cache.get_fresh(cache_key)
+        if cached is not None:
+            return cached
+        entry = cache.get(cache_key)
+        if entry is not None and entry.etag and not cache.bypass:
+            headers['If-None-Match'] = entry.etag
+
+    request = requests.get(url, params=params, headers=headers)
+    if request.status_code == 304 and entry is not None:
+        cache.touch(cache_key)
+        return entry.data
+    if request.status_code != 200:
+        pprint(vars(request))
+        raise Exception("REST request failed with code {}. {}".format(request.status_code, url))
+
+    ret = request.json()
+    if cache is not None:
+        cache.put(cache_key, ret, etag=request.headers.get('ETag'))
+    return ret
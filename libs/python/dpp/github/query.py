@@ -0,0 +1,175 @@
+#!/bin/env python3
+
+"""
+A small builder for Github GraphQL queries over paginated connections.
+
+Github charges for a query according to the nodes it may return, and the response size grows with
+every field requested, so callers should project just the fields they need:
+
+    query = ConnectionQuery(
+        name='GetRepos',
+        variables={'orgname': 'String!'},
+        path=[('organization', {'login': '$orgname'})],
+        connection='repositories',
+        connection_args={'orderBy': '{field: NAME, direction: ASC}'},
+        node_fields=['name', 'url', {'owner': ['login']}],
+    )
+    for repo in query.paginate({'orgname': 'coreos'}):
+        ...
+
+Field lists are made of:
+    'name'                      a scalar field
+    {'owner': [...]}            a field with sub-fields
+    Fragment(...)               a spread ("...FragmentName") of a reusable fragment; the fragment
+                                definition is added to the document automatically.
+"""
+
+import re
+
+from .graphql import run_query
+
+_NAME_RE = re.compile(r'^[_A-Za-z][_0-9A-Za-z]*$')
+
+
+def _check_name(name : str) -> str:
+    if not _NAME_RE.match(name):
+        raise Exception("Invalid GraphQL name: '{}'".format(name))
+    return name
+
+
+class Fragment(object):
+    def __init__(self, name : str, on_type : str, fields : list):
+        """
+        @param name:    fragment name
+        @param on_type: the GraphQL type it applies to, e.g. 'Repository'
+        @param fields:  field list (see module docs)
+        """
+        self.name = _check_name(name)
+        self.on_type = _check_name(on_type)
+        self.fields = fields
+
+    def render(self) -> str:
+        return 'fragment {} on {} {}'.format(self.name, self.on_type, render_selection(self.fields))
+
+
+def render_args(args : dict) -> str:
+    """
+    @param args:    {arg name: GraphQL value text}, e.g. {'login': '$orgname', 'states': '[CLOSED, MERGED]'}.
+                    Values are inserted verbatim, so anything that comes from user input must be passed as
+                    a variable ('$name') rather than as a literal.
+    """
+    if not args:
+        return ''
+    return '(' + ', '.join('{}: {}'.format(_check_name(name), value) for name, value in args.items()) + ')'
+
+
+def render_selection(fields : list) -> str:
+    parts = []
+    for field in fields:
+        if isinstance(field, Fragment):
+            parts.append('...' + field.name)
+        elif isinstance(field, dict):
+            for name, sub_fields in field.items():
+                parts.append('{} {}'.format(_check_name(name), render_selection(sub_fields)))
+        else:
+            parts.append(_check_name(field))
+    return '{ ' + ' '.join(parts) + ' }'
+
+
+def collect_fragments(fields : list, found : dict = None) -> dict:
+    """
+    @return {name: Fragment} - every fragment referenced by fields, including from within other fragments
+    """
+    if found is None:
+        found = {}
+    for field in fields:
+        if isinstance(field, Fragment):
+            if field.name not in found:
+                found[field.name] = field
+                collect_fragments(field.fields, found)
+        elif isinstance(field, dict):
+            for sub_fields in field.values():
+                collect_fragments(sub_fields, found)
+    return found
+
+
+class ConnectionQuery(object):
+    """
+    A query that walks down path to a single connection, and pages through its nodes.
+    """
+    def __init__(self,
+            name : str,
+            variables : dict,
+            path : list,
+            connection : str,
+            node_fields : list,
+            connection_args : dict = None,
+            page_size : int = 100,
+        ):
+        """
+        @param name:            operation name
+        @param variables:       {variable name: GraphQL type} of the caller's variables, e.g. {'orgname': 'String!'}
+        @param path:            [(field name, args dict)] leading from the query root to the object that owns
+                                the connection, e.g. [('repository', {'owner': '$orgname', 'name': '$reponame'})]
+        @param connection:      name of the connection field, e.g. 'pullRequests'
+        @param node_fields:     field list to fetch for each node
+        @param connection_args: extra (non-paging) args for the connection, e.g. {'states': '[CLOSED, MERGED]'}
+        @param page_size:       nodes per request (Github's maximum is 100)
+        """
+        self.name = _check_name(name)
+        self.variables = variables
+        self.path = path
+        self.connection = _check_name(connection)
+        self.node_fields = node_fields
+        self.connection_args = connection_args or {}
+        self.page_size = page_size
+        self._text = None
+
+    def render(self) -> str:
+        if self._text is not None:
+            return self._text
+
+        var_defs = dict(self.variables)
+        var_defs['first'] = 'Int!'
+        var_defs['after'] = 'String'
+        connection_args = {'first': '$first', 'after': '$after'}
+        connection_args.update(self.connection_args)
+
+        selection = '{} {}'.format(
+            self.connection + render_args(connection_args),
+            render_selection([{'pageInfo': ['endCursor', 'hasNextPage']}, {'nodes': self.node_fields}]),
+        )
+        for field_name, args in reversed(self.path):
+            selection = '{}{} {{ {} }}'.format(_check_name(field_name), render_args(args), selection)
+
+        text = 'query {}({}) {{ {} }}'.format(
+            self.name,
+            ', '.join('${}: {}'.format(_check_name(name), var_type) for name, var_type in var_defs.items()),
+            selection,
+        )
+        for fragment in collect_fragments(self.node_fields).values():
+            text += '\n' + fragment.render()
+        self._text = text
+        return text
+
+    def paginate(self, variables : dict, cache=None):
+        """
+        Generator of nodes, fetching one page at a time.
+
+        @param variables:   {variable name: value} for the variables declared in the constructor
+        @param cache:       see run_query()
+        """
+        query_vars = dict(variables)
+        query_vars['first'] = self.page_size
+        query_vars['after'] = None
+        while True:
+            data = run_query(self.render(), query_vars, cache=cache)
+            for field_name, _ in self.path:
+                data = data[field_name]
+                if data is None:
+                    raise Exception("Query {} returned no '{}' for {}".format(self.name, field_name, variables))
+            data = data[self.connection]
+            yield from data['nodes']
+            if not data['pageInfo']['hasNextPage']:
+                break
+            query_vars['after'] = data['pageInfo']['endCursor']
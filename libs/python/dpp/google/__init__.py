@@ -5,11 +5,18 @@ from .sheets import (
     CellRange,
     CellRangeData,
     SheetService,
+    SheetWriteBehind,
     SheetWriteBuffer,
+    SparseCellRangeData,
 )
 from .apiutils import (
     get_sheets_service,
     get_gmail_service,
+    execute_with_retry,
+)
+from .discovery import (
+    get_discovery_document,
+    clear_service_cache,
 )
 from .auth import (
     OAuth2TokenWorkflow,
@@ -17,18 +24,35 @@ from .auth import (
 from .gmail import (
     EmailSender,
     FakeEmailSender,
+    SendResult,
+    Outbox,
+)
+from .fake import (
+    FakeSheetsService,
+    FakeGmailService,
 )
 __all__ = [
     'CellRange',
     'CellRangeData',
     'SheetService',
+    'SheetWriteBehind',
     'SheetWriteBuffer',
+    'SparseCellRangeData',
 
     'get_sheets_service',
     'get_gmail_service',
+    'execute_with_retry',
+
+    'get_discovery_document',
+    'clear_service_cache',
 
     'OAuth2TokenWorkflow',
 
     'EmailSender',
     'FakeEmailSender',
+    'SendResult',
+    'Outbox',
+
+    'FakeSheetsService',
+    'FakeGmailService',
 ]
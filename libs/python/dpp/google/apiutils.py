@@ -5,38 +5,148 @@ This file is for functions that hide the complexity of the Google API from highe
 """
 
 import google.oauth2.service_account
-import apiclient.discovery
+import google_auth_httplib2
+from googleapiclient.errors import HttpError
+import httplib2
+import json
+import os
+import random
 import re
+import time
+import logging
+logger = logging.getLogger(__name__)
 from .auth import OAuth2TokenWorkflow
+from .discovery import (
+    DEFAULT_MAX_AGE,
+    build_service,
+    credentials_identity,
+)
+
+# HTTP statuses that mean "try again later": quota exceeded, and transient server errors
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+def is_retryable(e : Exception) -> bool:
+    return isinstance(e, HttpError) and int(e.resp.status) in RETRYABLE_STATUSES
+
+
+def execute_with_retry(
+        request,
+        max_attempts : int = 6,
+        initial_delay : float = 1.0,
+        max_delay : float = 64.0,
+        http = None,
+    ):
+    """
+    Executes a Google API request, retrying quota (429) and server (5xx) errors with exponential backoff
+    and jitter, as recommended by Google. A Retry-After header in the error response is honoured.
+
+    @param request:         e.g. service.spreadsheets().values().get(...), i.e. *without* .execute()
+    @param max_attempts:    total number of attempts before the last error is raised
+    @param initial_delay:   seconds to wait after the first failure; doubled after each subsequent one
+    @param max_delay:       upper limit on the wait between attempts
+    @param http:            http object to execute the request with, instead of the service's own
+                            (see new_thread_http())
+    @return the response
+    """
+    delay = initial_delay
+    for attempt in range(1, max_attempts + 1):
+        try:
+            if http is not None:
+                return request.execute(http=http)
+            return request.execute()
+        except HttpError as e:
+            if not is_retryable(e) or attempt == max_attempts:
+                raise
+            wait = min(delay, max_delay) * (0.5 + random.random() / 2)
+            retry_after = e.resp.get('retry-after') if hasattr(e.resp, 'get') else None
+            if retry_after is not None and retry_after.isdigit():
+                wait = max(wait, int(retry_after))
+            logger.debug('Request failed with HTTP {}, retrying in {:.1f}s (attempt {} of {})'.format(
+                e.resp.status, wait, attempt, max_attempts))
+            time.sleep(wait)
+            delay *= 2
+
+
+def new_thread_http(service):
+    """
+    A googleapiclient client sends all of its requests through a single httplib2.Http, which isn't
+    thread-safe. This returns a new http object with the same credentials, which a worker thread can
+    pass to request.execute(http=...).
+
+    @return AuthorizedHttp, or None if the service doesn't have its own credentials (e.g. it's one of
+            the fakes in dpp.google.fake), in which case its requests can be executed as they are.
+    """
+    credentials = getattr(getattr(service, '_http', None), 'credentials', None)
+    if credentials is None:
+        return None
+    return google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
 
 SHEETS_SCOPES_READ_ONLY = ['https://www.googleapis.com/auth/spreadsheets.readonly']
 SHEETS_SCOPES_READ_WRITE = ['https://www.googleapis.com/auth/spreadsheets']
 
-def get_sheets_service(service_account_file, read_only=False):
+def get_sheets_service(service_account_file, read_only=False, cache_dir=None, max_age=DEFAULT_MAX_AGE):
+    """
+    Calling this again with the same arguments returns the same client (see dpp.google.discovery).
+
+    @param cache_dir, max_age:  where to keep the discovery document, and when to re-download it. To use a
+                                vendored document, pass its directory and max_age=None.
+                                See dpp.google.discovery.get_discovery_document().
+    """
     scopes = SHEETS_SCOPES_READ_ONLY if read_only else SHEETS_SCOPES_READ_WRITE
-    credentials = google.oauth2.service_account.Credentials.from_service_account_file(
-        service_account_file,
-        scopes=scopes,
+    return build_service(
+        api='sheets',
+        version='v4',
+        identity=credentials_identity('service_account', os.path.abspath(service_account_file), *scopes),
+        make_credentials=lambda: google.oauth2.service_account.Credentials.from_service_account_file(
+            service_account_file,
+            scopes=scopes,
+        ),
+        cache_dir=cache_dir,
+        max_age=max_age,
     )
-    service = apiclient.discovery.build('sheets', 'v4', credentials=credentials)
-    return service
 
 
-GMAIL_SCOPES = ['https://www.googleapis.com/auth/gmail.send']
+# gmail.send to send, and gmail.metadata for users().getProfile(), which FakeEmailSender uses to find
+# the address to redirect emails to (create.py --dry-run --debug). Requesting a subset of the scopes a
+# Refresh Token was granted for is allowed, so tokens granted for https://mail.google.com/ keep working.
+GMAIL_SCOPES = [
+    'https://www.googleapis.com/auth/gmail.send',
+    'https://www.googleapis.com/auth/gmail.metadata',
+]
 def get_gmail_service(
         client_config: dict,
         refresh_token_file : str,
+        cache_dir : str = None,
+        max_age : float = DEFAULT_MAX_AGE,
     ):
     """
     For more info on these params, see the auth/README.md
+    Calling this again with the same arguments returns the same client (see dpp.google.discovery).
+
     @param client_secret:       json.loads() of the Oauth2 client secret file (downloadable
                                 from [GCP Project] -> APIs & Services -> Credentials)
     @param refresh_token_file:  path to a file to store the Refresh Token.
+    @param cache_dir, max_age:  see get_sheets_service()
     """
-    oauth2_token_workflow = OAuth2TokenWorkflow(
-        client_config=client_config,
-        refresh_token_file=refresh_token_file,
-        scopes=GMAIL_SCOPES,
+    def make_credentials():
+        oauth2_token_workflow = OAuth2TokenWorkflow(
+            client_config=client_config,
+            refresh_token_file=refresh_token_file,
+            scopes=GMAIL_SCOPES,
+        )
+        return oauth2_token_workflow.get_credentials()
+
+    return build_service(
+        api='gmail',
+        version='v1',
+        identity=credentials_identity(
+            'oauth2',
+            json.dumps(client_config, sort_keys=True),
+            os.path.abspath(refresh_token_file),
+            *GMAIL_SCOPES
+        ),
+        make_credentials=make_credentials,
+        cache_dir=cache_dir,
+        max_age=max_age,
     )
-    credentials = oauth2_token_workflow.get_credentials()
-    return apiclient.discovery.build('gmail', 'v1', credentials=credentials)
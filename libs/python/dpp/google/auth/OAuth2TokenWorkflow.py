@@ -1,16 +1,32 @@
 #!/usr/bin/python3
 
-import urllib
+import datetime
+import os
+import os.path
+import tempfile
+import threading
 import time
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import google.oauth2.credentials
 from google_auth_oauthlib.flow import Flow
-from pprint import pprint
-import sys
-import os.path
+import logging
+logger = logging.getLogger(__name__)
+
+# An access token is refreshed in the background once it has less than this many seconds left.
+# (google-auth's own threshold is a little under 4 minutes; refreshing earlier means it never needs to.)
+REFRESH_AHEAD_SECONDS = 300
+# If a background refresh fails, it's tried again after this many seconds.
+REFRESH_RETRY_SECONDS = 30
 
 
 class OAuth2TokenWorkflow(object):
+    """
+    Obtains and keeps refreshing an OAuth2 access token for a specific user (see README.md).
+
+    The credentials returned by get_credentials() are shared: the access token in them is replaced, in the
+    background, shortly before it expires, so threads using them never have to wait for a refresh. If a
+    refresh is needed anyway (e.g. the background refresh failed), only one thread performs it, and the
+    others use its result.
+    """
     def __init__(self,
             client_config : dict,
             refresh_token_file : str,
@@ -24,7 +40,7 @@ class OAuth2TokenWorkflow(object):
                                     be specific to the API type(s) you want this client to access)
         """
         self.refresh_token_file = refresh_token_file
-        # self._credentials = None            # google.oauth2.credentials.Credentials
+        self.scopes = list(scopes)
 
         if os.path.isfile(self.refresh_token_file):
             with open(self.refresh_token_file, 'r') as fh:
@@ -34,10 +50,16 @@ class OAuth2TokenWorkflow(object):
 
         self._access_token = None
         self._access_token_expire_time = None   # Epoch time that the access token will expire
+        self._credentials = None                # _ManagedCredentials, created with the first access token
+
+        # Held while refreshing, so that only one thread refreshes at a time
+        self._lock = threading.RLock()
+        self._refresher = None
+        self._stop_refresher = threading.Event()
 
         self._flow = Flow.from_client_config(
             client_config=client_config,
-            scopes=['https://mail.google.com/'],
+            scopes=self.scopes,
         )
         # Hardcoded dummy redirect URI for non-web apps.
         self._flow.redirect_uri = 'urn:ietf:wg:oauth:2.0:oob'
@@ -45,11 +67,62 @@ class OAuth2TokenWorkflow(object):
 
     def get_credentials(self):
         """
+        On first use, this may prompt the user to authorize the application (see README.md).
+
         @return google.oauth2.credentials.Credentials
         """
         if not self._is_valid_access_token():
+            with self._lock:
+                if not self._is_valid_access_token():
+                    self._generate_new_access_token()
+        self._start_refresher()
+        return self._credentials
+
+
+    def stop(self):
+        """
+        Stops refreshing the access token in the background. (It's still refreshed when needed.)
+        """
+        self._stop_refresher.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+
+
+    def refresh(self, stale_token : str = None):
+        """
+        Gets a new access token, unless another thread has already replaced stale_token.
+
+        @param stale_token:     the access token that the caller found to be expired or rejected, or None
+                                to refresh unconditionally
+        """
+        with self._lock:
+            if stale_token is not None and stale_token != self._access_token and self._is_valid_access_token():
+                return
             self._generate_new_access_token()
-        return self._flow.credentials
+
+
+    def _start_refresher(self):
+        with self._lock:
+            if self._refresher is not None or self._stop_refresher.is_set():
+                return
+            self._refresher = threading.Thread(target=self._run_refresher, name='OAuth2TokenRefresher', daemon=True)
+            self._refresher.start()
+
+
+    def _run_refresher(self):
+        while True:
+            wait = self._access_token_expire_time - REFRESH_AHEAD_SECONDS - time.time()
+            if self._stop_refresher.wait(max(0, wait)):
+                return
+            try:
+                with self._lock:
+                    if self._access_token_expire_time - time.time() <= REFRESH_AHEAD_SECONDS:
+                        self._generate_new_access_token()
+            except Exception as e:
+                logger.warning('Failed to refresh the OAuth2 access token, will retry in {}s: {}'.format(REFRESH_RETRY_SECONDS, e))
+                if self._stop_refresher.wait(REFRESH_RETRY_SECONDS):
+                    return
 
 
     def _generate_new_access_token(self):
@@ -70,11 +143,11 @@ class OAuth2TokenWorkflow(object):
             client_secret=self._flow.client_config['client_secret'],
             refresh_token=self._refresh_token,
         )
-        self._refresh_token = response['refresh_token']
         self._set_new_token(
             access_token=response['access_token'],
             expires_in=int(response['expires_in']),
-            refresh_token=response['refresh_token'],
+            # Google doesn't usually issue a new refresh token when refreshing
+            refresh_token=response.get('refresh_token') or self._refresh_token,
         )
 
 
@@ -85,11 +158,44 @@ class OAuth2TokenWorkflow(object):
         ):
         # Note: we use "$current_time + $expires_in" and not 'expires_at' returned by the response,
         # because the client's local clock may be out of sync.
+        expire_time = time.time() + int(expires_in)
+        if refresh_token != self._refresh_token or not os.path.isfile(self.refresh_token_file):
+            self._refresh_token = refresh_token
+            self._write_refresh_token_file()
+
+        if self._credentials is None:
+            self._credentials = _ManagedCredentials(
+                token_workflow=self,
+                token=access_token,
+                refresh_token=self._refresh_token,
+                token_uri=self._flow.client_config['token_uri'],
+                client_id=self._flow.client_config['client_id'],
+                client_secret=self._flow.client_config['client_secret'],
+                scopes=self.scopes,
+            )
+        else:
+            self._credentials.token = access_token
+        # google-auth compares expiry against a naive UTC datetime
+        self._credentials.expiry = datetime.datetime.fromtimestamp(expire_time, datetime.timezone.utc).replace(tzinfo=None)
+
         self._access_token = access_token
-        self._access_token_expire_time = time.time() + int(expires_in)
-        self._refresh_token = refresh_token
-        with open(self.refresh_token_file, 'w') as fh:
+        self._access_token_expire_time = expire_time
+        logger.debug('Obtained a new OAuth2 access token, valid for {}s'.format(expires_in))
+
+
+    def _write_refresh_token_file(self):
+        """
+        Replaces the refresh token file atomically, readable only by the owner.
+        """
+        directory = os.path.dirname(os.path.abspath(self.refresh_token_file))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # mkstemp() creates the file with mode 0600
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
             fh.write(self._refresh_token)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.refresh_token_file)
 
 
     def _is_valid_access_token(self):
@@ -122,3 +228,17 @@ class OAuth2TokenWorkflow(object):
             expires_in=int(response['expires_in']),
             refresh_token=response['refresh_token'],
         )
+
+
+class _ManagedCredentials(google.oauth2.credentials.Credentials):
+    """
+    Credentials whose token is kept up to date by an OAuth2TokenWorkflow. When google-auth decides the
+    token needs refreshing (it has expired, or a request was rejected with HTTP 401), the refresh is left
+    to the OAuth2TokenWorkflow, so that concurrent callers don't each refresh it.
+    """
+    def __init__(self, token_workflow : OAuth2TokenWorkflow, **kwargs):
+        super().__init__(**kwargs)
+        self._token_workflow = token_workflow
+
+    def refresh(self, request):
+        self._token_workflow.refresh(stale_token=self.token)
@@ -0,0 +1,152 @@
+#!/bin/env python3
+
+"""
+Builds Google API clients from locally cached discovery documents.
+
+apiclient.discovery.build() downloads and parses the API's discovery document (a large JSON description
+of every method) each time it's called, which adds seconds to every script run. Instead, the document is
+kept on disk and only re-downloaded once it's older than max_age, and the clients themselves are kept for
+the life of the process, keyed on (api, version, credentials identity), so asking for the same client
+twice is free.
+
+To use vendored (checked-in) documents instead of downloading them, pass the directory that holds them as
+cache_dir, and max_age=None, to get_sheets_service() or get_gmail_service(). Files are named
+"<api>.<version>.json", e.g. "sheets.v4.json".
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import logging
+logger = logging.getLogger(__name__)
+
+import googleapiclient.discovery
+import httplib2
+
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest'
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+
+class DiscoveryDocumentError(Exception):
+    pass
+
+
+def get_default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'dpp', 'google', 'discovery')
+
+
+def credentials_identity(*parts) -> str:
+    """
+    @param parts:   strings that identify a set of credentials, e.g. ('service_account', path, *scopes)
+    @return str - a stable identifier that doesn't reveal the parts themselves
+    """
+    return hashlib.sha256('\0'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:16]
+
+
+def check_document(content : str, api : str, version : str) -> dict:
+    """
+    @return dict - the parsed document
+    @raise DiscoveryDocumentError if it isn't the discovery document for api/version
+    """
+    try:
+        doc = json.loads(content)
+    except ValueError as e:
+        raise DiscoveryDocumentError("Discovery document for {} {} is not valid JSON".format(api, version)) from e
+    if doc.get('name') != api or doc.get('version') != version:
+        raise DiscoveryDocumentError("Expected the discovery document for {} {}, but got {} {}".format(
+            api, version, doc.get('name'), doc.get('version')))
+    if 'rootUrl' not in doc or 'resources' not in doc:
+        raise DiscoveryDocumentError("Discovery document for {} {} is incomplete".format(api, version))
+    return doc
+
+
+def _fetch_document(api : str, version : str) -> str:
+    url = DISCOVERY_URL.format(api=api, version=version)
+    logger.debug('Downloading discovery document: {}'.format(url))
+    resp, content = httplib2.Http(timeout=60).request(url)
+    if int(resp.status) != 200:
+        raise DiscoveryDocumentError("Error downloading {}: HTTP {}".format(url, resp.status))
+    return content.decode('utf-8')
+
+
+def get_discovery_document(api : str, version : str, cache_dir : str = None, max_age : float = DEFAULT_MAX_AGE) -> str:
+    """
+    @param cache_dir:   directory that holds the documents (default: ~/.cache/dpp/google/discovery)
+    @param max_age:     seconds after which a cached document is re-downloaded, or None to never re-download.
+                        If re-downloading fails, the old document is used.
+    @return str - the discovery document (JSON)
+    """
+    if cache_dir is None:
+        cache_dir = get_default_cache_dir()
+    path = os.path.join(cache_dir, '{}.{}.json'.format(api, version))
+
+    cached = None
+    try:
+        with open(path, 'r') as fh:
+            cached = fh.read()
+        check_document(cached, api, version)
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        cached = None
+    except DiscoveryDocumentError as e:
+        logger.warning('Ignoring cached {}: {}'.format(path, e))
+        cached = None
+
+    if cached is not None and (max_age is None or age < max_age):
+        return cached
+
+    try:
+        content = _fetch_document(api, version)
+        check_document(content, api, version)
+    except Exception as e:
+        if cached is None:
+            raise
+        logger.warning('Could not refresh the discovery document for {} {}, using the cached one: {}'.format(api, version, e))
+        return cached
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as fh:
+        fh.write(content)
+    os.replace(tmp_path, path)
+    return content
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def build_service(
+        api : str,
+        version : str,
+        identity : str,
+        make_credentials,
+        cache_dir : str = None,
+        max_age : float = DEFAULT_MAX_AGE,
+    ):
+    """
+    Returns the client for api/version, building it only if one hasn't already been built in this process
+    for the same credentials. Note that clients aren't thread-safe, so threads that make requests
+    concurrently should each use their own http object (see googleapiclient's documentation).
+
+    @param identity:            identifies the credentials, see credentials_identity()
+    @param make_credentials:    callable returning the credentials; only called if a client has to be built
+    @param cache_dir, max_age:  see get_discovery_document()
+    """
+    key = (api, version, identity)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            document = get_discovery_document(api, version, cache_dir=cache_dir, max_age=max_age)
+            service = googleapiclient.discovery.build_from_document(document, credentials=make_credentials())
+            _services[key] = service
+        return service
+
+
+def clear_service_cache() -> None:
+    with _services_lock:
+        _services.clear()
@@ -0,0 +1,65 @@
+#!/bin/env python3
+
+import base64
+import email
+
+from .FakeService import (
+    FakeRequest,
+    FakeService,
+)
+
+class FakeGmailService(FakeService):
+    """
+    In-process stand-in for the Gmail API client returned by dpp.google.get_gmail_service(), covering the
+    calls that EmailSender makes. Sent messages are kept in self.sent, rather than being sent.
+
+        fake = FakeGmailService(latency=0.3)
+        sender = dpp.google.EmailSender(service=fake)
+    """
+    def __init__(self, email_address : str = 'me@example.com', **kwargs):
+        """
+        @param email_address:   the address of the (pretend) authenticated user
+        @param kwargs:          see FakeService
+        """
+        super().__init__(**kwargs)
+        self.email_address = email_address
+        self.sent = []          # [email.message.Message], in the order they were sent
+
+    def users(self):
+        return _Users(self)
+
+    def _send(self, raw : bytes) -> dict:
+        with self._lock:
+            self.sent.append(email.message_from_bytes(raw))
+            message_id = 'fake-{}'.format(len(self.sent))
+        return {'id': message_id, 'threadId': message_id, 'labelIds': ['SENT']}
+
+
+class _Users(object):
+    def __init__(self, fake : FakeGmailService):
+        self.fake = fake
+
+    def messages(self):
+        return _Messages(self.fake)
+
+    def getProfile(self, userId : str):
+        return FakeRequest(self.fake, 'users.getProfile', lambda: {'emailAddress': self.fake.email_address})
+
+
+class _Messages(object):
+    def __init__(self, fake : FakeGmailService):
+        self.fake = fake
+
+    def send(self, userId : str, body : dict = None, media_body=None, **kwargs):
+        if media_body is not None:
+            # A MediaUpload, e.g. MediaIoBaseUpload(..., mimetype='message/rfc822')
+            return FakeRequest(
+                self.fake,
+                'users.messages.send (media)',
+                lambda: self.fake._send(media_body.getbytes(0, media_body.size())),
+            )
+        return FakeRequest(
+            self.fake,
+            'users.messages.send',
+            lambda: self.fake._send(base64.urlsafe_b64decode(body['raw'])),
+        )
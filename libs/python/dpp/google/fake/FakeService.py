@@ -0,0 +1,81 @@
+#!/bin/env python3
+
+import random
+import threading
+import time
+import httplib2
+from googleapiclient.errors import HttpError
+
+class FakeRequest(object):
+    """
+    Stands in for a googleapiclient HttpRequest: nothing happens until execute() is called.
+    """
+    def __init__(self, fake_service, method_name : str, func):
+        self.fake_service = fake_service
+        self.method_name = method_name
+        self.func = func
+
+    def execute(self, http=None, num_retries : int = 0):
+        self.fake_service._before_request(self.method_name)
+        return self.func()
+
+
+class FakeService(object):
+    """
+    Base class for in-process stand-ins of Google API discovery clients. Every request is counted, and can
+    be given a latency and a chance of failing with a quota error (HTTP 429), so that code that calls the
+    API can be exercised and timed without credentials or network access.
+    """
+    def __init__(self,
+            latency : float = 0.0,
+            error_rate : float = 0.0,
+            error_status : int = 429,
+            seed : int = None,
+        ):
+        """
+        @param latency:         seconds that each request takes
+        @param error_rate:      probability (0-1) that a request fails with error_status
+        @param error_status:    HTTP status of the random failures (default: 429, quota exceeded)
+        @param seed:            seed for the random failures, for repeatable runs
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.request_counts = {}            # {method name: number of requests, including failed ones}
+        self.error_counts = {}              # {method name: number of failed requests}
+        self._random = random.Random(seed)
+        self._forced_errors = []
+        self._lock = threading.Lock()
+
+    def fail_next(self, count : int = 1, status : int = 429) -> None:
+        """
+        Makes the next `count` requests fail with the given HTTP status.
+        """
+        with self._lock:
+            self._forced_errors.extend([status] * count)
+
+    def num_requests(self) -> int:
+        with self._lock:
+            return sum(self.request_counts.values())
+
+    def _before_request(self, method_name : str) -> None:
+        with self._lock:
+            self.request_counts[method_name] = self.request_counts.get(method_name, 0) + 1
+            if self._forced_errors:
+                status = self._forced_errors.pop(0)
+            elif self.error_rate and self._random.random() < self.error_rate:
+                status = self.error_status
+            else:
+                status = None
+            if status is not None:
+                self.error_counts[method_name] = self.error_counts.get(method_name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        if status is not None:
+            raise make_http_error(status)
+
+
+def make_http_error(status : int, reason : str = None) -> HttpError:
+    resp = httplib2.Response({'status': status})
+    resp.reason = reason or 'Fake error'
+    return HttpError(resp, '{{"error": {{"code": {}, "message": "{}"}}}}'.format(status, resp.reason).encode())
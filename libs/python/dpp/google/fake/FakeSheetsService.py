@@ -0,0 +1,160 @@
+#!/bin/env python3
+
+import json
+
+from .FakeService import (
+    FakeRequest,
+    FakeService,
+    make_http_error,
+)
+from ..sheets.CellRange import CellRange
+
+class FakeSheetsService(FakeService):
+    """
+    In-process stand-in for the Sheets API client returned by dpp.google.get_sheets_service(), covering the
+    calls that SheetService makes. Cell values are stored as strings, as a RAW write followed by a read
+    would return them.
+
+        fake = FakeSheetsService({'Sheet 1': [['Name', 'Email'], ['Bob', 'bob@example.com']]}, latency=0.2)
+        service = dpp.google.SheetService(service=fake, spreadsheet_id='fake')
+    """
+    def __init__(self,
+            sheets : dict,
+            grid_rows : int = 1000,
+            grid_cols : int = 26,
+            max_request_bytes : int = None,
+            **kwargs
+        ):
+        """
+        @param sheets:              {sheet name: rows}, where each row is a list of values. The first sheet is
+                                    the default for ranges that don't name one.
+        @param grid_rows:           minimum size of each sheet's grid (it grows to fit the data)
+        @param grid_cols:           as above, for columns
+        @param max_request_bytes:   if set, larger batchUpdate requests fail with HTTP 413
+        @param kwargs:              see FakeService
+        """
+        super().__init__(**kwargs)
+        self.sheets = {
+            name: [['' if value is None else str(value) for value in row] for row in rows]
+            for name, rows in sheets.items()
+        }
+        self.grid_rows = grid_rows
+        self.grid_cols = grid_cols
+        self.max_request_bytes = max_request_bytes
+
+    def spreadsheets(self):
+        return _Spreadsheets(self)
+
+    def _resolve(self, cell_range : str):
+        cell_range = CellRange.from_string(cell_range)
+        sheet = cell_range.sheet if cell_range.sheet is not None else next(iter(self.sheets))
+        if sheet not in self.sheets:
+            raise make_http_error(400, 'Unable to parse range: {}'.format(cell_range))
+        return sheet, cell_range
+
+    def _grid_size(self, sheet : str) -> tuple:
+        rows = self.sheets[sheet]
+        return (
+            max(self.grid_rows, len(rows)),
+            max([self.grid_cols] + [len(row) for row in rows]),
+        )
+
+    def _read(self, cell_range : str) -> dict:
+        sheet, cell_range = self._resolve(cell_range)
+        first_col_idx = cell_range.top_left_col_idx()
+        last_col_idx = cell_range.bottom_right_col_idx()
+        last_row = len(self.sheets[sheet]) if cell_range.is_open_ended() else cell_range.bottom_right_row
+
+        values = []
+        for row in self.sheets[sheet][cell_range.top_left_row - 1:last_row]:
+            row = list(row[first_col_idx:last_col_idx + 1])
+            # Like the real API, empty cells at the end of a row, and empty rows at the end, are omitted.
+            while row and row[-1] == '':
+                row.pop()
+            values.append(row)
+        while values and not values[-1]:
+            values.pop()
+
+        result = {
+            'range': "'{}'!{}".format(sheet.replace("'", "''"), str(cell_range).split('!')[-1]),
+            'majorDimension': 'ROWS',
+        }
+        if values:
+            result['values'] = values
+        return result
+
+    def _write(self, cell_range : str, values : list) -> dict:
+        sheet, cell_range = self._resolve(cell_range)
+        rows = self.sheets[sheet]
+        first_col_idx = cell_range.top_left_col_idx()
+        num_cells = 0
+        for row_offset, row_values in enumerate(values):
+            row_idx = cell_range.top_left_row - 1 + row_offset
+            while len(rows) <= row_idx:
+                rows.append([])
+            row = rows[row_idx]
+            for col_offset, value in enumerate(row_values):
+                col_idx = first_col_idx + col_offset
+                while len(row) <= col_idx:
+                    row.append('')
+                row[col_idx] = '' if value is None else str(value)
+                num_cells += 1
+        return {'updatedRange': str(cell_range), 'updatedCells': num_cells}
+
+
+class _Spreadsheets(object):
+    def __init__(self, fake : FakeSheetsService):
+        self.fake = fake
+
+    def values(self):
+        return _Values(self.fake)
+
+    def get(self, spreadsheetId : str, ranges : list = None, fields : str = None, **kwargs):
+        def func():
+            sheet_names = list(self.fake.sheets)
+            if ranges:
+                # A range may be just a (possibly quoted) sheet name, which CellRange doesn't parse
+                sheet_names = [
+                    self.fake._resolve(cell_range if '!' in cell_range else cell_range + '!A1')[0]
+                    for cell_range in ranges
+                ]
+            sheets = []
+            for name in sheet_names:
+                row_count, column_count = self.fake._grid_size(name)
+                sheets.append({'properties': {
+                    'title': name,
+                    'gridProperties': {'rowCount': row_count, 'columnCount': column_count},
+                }})
+            return {'sheets': sheets}
+        return FakeRequest(self.fake, 'spreadsheets.get', func)
+
+
+class _Values(object):
+    def __init__(self, fake : FakeSheetsService):
+        self.fake = fake
+
+    def get(self, spreadsheetId : str, range : str, **kwargs):
+        return FakeRequest(self.fake, 'spreadsheets.values.get', lambda: self.fake._read(range))
+
+    def batchGet(self, spreadsheetId : str, ranges : list, fields : str = None, **kwargs):
+        def func():
+            return {
+                'spreadsheetId': spreadsheetId,
+                'valueRanges': [self.fake._read(cell_range) for cell_range in ranges],
+            }
+        return FakeRequest(self.fake, 'spreadsheets.values.batchGet', func)
+
+    def batchUpdate(self, spreadsheetId : str, body : dict):
+        def func():
+            max_bytes = self.fake.max_request_bytes
+            if max_bytes is not None and len(json.dumps(body).encode('utf-8')) > max_bytes:
+                raise make_http_error(413, 'Request payload size exceeds the limit')
+            if body.get('valueInputOption') != 'RAW':
+                raise make_http_error(400, 'FakeSheetsService only supports valueInputOption=RAW')
+            responses = [self.fake._write(entry['range'], entry['values']) for entry in body.get('data', [])]
+            return {
+                'spreadsheetId': spreadsheetId,
+                'totalUpdatedCells': sum(response['updatedCells'] for response in responses),
+                'responses': responses,
+            }
+        return FakeRequest(self.fake, 'spreadsheets.values.batchUpdate', func)
@@ -0,0 +1,15 @@
+import logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+from .FakeService import (
+    FakeService,
+    make_http_error,
+)
+from .FakeSheetsService import FakeSheetsService
+from .FakeGmailService import FakeGmailService
+__all__ = [
+    'FakeService',
+    'make_http_error',
+    'FakeSheetsService',
+    'FakeGmailService',
+]
@@ -4,8 +4,12 @@ logging.getLogger(__name__).addHandler(logging.NullHandler())
 from .send import (
     EmailSender,
     FakeEmailSender,
+    SendResult,
 )
+from .outbox import Outbox
 __all__ = [
     'EmailSender',
     'FakeEmailSender',
+    'SendResult',
+    'Outbox',
 ]
@@ -0,0 +1,139 @@
+#!/bin/env python3
+import logging
+logger = logging.getLogger(__name__)
+
+import email
+import email.parser
+import json
+import os
+import tempfile
+import time
+
+from .send import (
+    get_idempotency_key,
+    write_message,
+)
+
+
+class Outbox(object):
+    """
+    A queue of emails on local disk, so that messages that can't be regenerated (e.g. ones containing
+    newly-created credentials) survive the process dying before they've been sent.
+
+        outbox = Outbox('~/.cache/my_script/outbox')
+        outbox.add(mime_message)                # Before doing anything that might fail
+        ...
+        results = outbox.deliver(email_sender)  # Sends everything pending, including from previous runs
+
+    Each message is written to <directory>/pending/<idempotency key>.eml (readable only by the owner, as
+    it may contain secrets). Once it has been sent, the file is deleted, and a record of the delivery
+    (without the message body) is written to <directory>/sent/<idempotency key>.json.
+    """
+    def __init__(self, directory : str):
+        self.directory = os.path.expanduser(directory)
+        self.pending_dir = os.path.join(self.directory, 'pending')
+        self.sent_dir = os.path.join(self.directory, 'sent')
+
+    def add(self, mime_message) -> str:
+        """
+        Writes the message to the outbox. Once this returns, the message is on disk.
+
+        @return str - the message's idempotency key, which identifies it in the outbox
+        """
+        key = get_idempotency_key(mime_message)
+        _makedirs_private(self.pending_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=self.pending_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            write_message(mime_message, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self._pending_path(key))
+        _fsync_dir(self.pending_dir)
+        logger.debug('Added "{}" to {} to the outbox ({})'.format(mime_message['subject'], mime_message['to'], key))
+        return key
+
+    def pending(self) -> list:
+        """
+        @return [(key, email.message.Message)] - messages that haven't been sent yet, oldest first
+        """
+        if not os.path.isdir(self.pending_dir):
+            return []
+        entries = []
+        for filename in os.listdir(self.pending_dir):
+            if not filename.endswith('.eml'):
+                continue
+            key = filename[:-len('.eml')]
+            path = os.path.join(self.pending_dir, filename)
+            if os.path.exists(self._sent_path(key)):
+                # The process died after recording the delivery, but before removing the message
+                os.remove(path)
+                continue
+            entries.append((os.path.getmtime(path), key, path))
+
+        messages = []
+        for _, key, path in sorted(entries):
+            with open(path, 'rb') as fh:
+                messages.append((key, email.message_from_binary_file(fh)))
+        return messages
+
+    def num_pending(self) -> int:
+        return len(self.pending())
+
+    def mark_sent(self, key : str, response : dict) -> None:
+        """
+        Records that a message was sent, and removes it from the queue.
+        """
+        with open(self._pending_path(key), 'rb') as fh:
+            mime_message = email.parser.BytesHeaderParser().parse(fh)
+        record = {
+            'to': mime_message['to'],
+            'subject': mime_message['subject'],
+            'sent_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'response': response,
+        }
+        _makedirs_private(self.sent_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=self.sent_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(record, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self._sent_path(key))
+        _fsync_dir(self.sent_dir)
+        os.remove(self._pending_path(key))
+
+    def deliver(self, email_sender, max_workers : int = 8) -> list:
+        """
+        Sends all pending messages concurrently (see EmailSender.send_many()). Messages that are sent are
+        removed from the queue; the others stay in it, to be retried by a later call.
+
+        @return [SendResult] - one per pending message, oldest first
+        """
+        pending = self.pending()
+        if not pending:
+            return []
+        results = email_sender.send_many([mime_message for _, mime_message in pending], max_workers=max_workers)
+        for (key, _), result in zip(pending, results):
+            if result.ok():
+                self.mark_sent(key, result.response)
+        return results
+
+    def _pending_path(self, key : str) -> str:
+        return os.path.join(self.pending_dir, '{}.eml'.format(key))
+
+    def _sent_path(self, key : str) -> str:
+        return os.path.join(self.sent_dir, '{}.json'.format(key))
+
+
+def _makedirs_private(path : str) -> None:
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+
+def _fsync_dir(path : str) -> None:
+    """
+    Makes a rename within the directory durable.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
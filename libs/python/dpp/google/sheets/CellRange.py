@@ -1,33 +1,66 @@
 #!/bin/env python3
 
 import re
-import copy
+import functools
 
+# Sheets allows at most 18,278 columns (A to ZZZ), but like Excel, in practice its grids stop at XFD.
+MAX_COLUMNS = 16384     # 'A'..'XFD'
 
+_COLNAME_RE = re.compile('^[A-Z]{1,3}$')
+_CELL_RANGE_RE = re.compile("""
+    ^
+    (?: ('(?:[^']|'')+'|[^!']+)!)?  # Optional sheet name, possibly quoted
+    (?: ([A-Z]+)([0-9]+))           # Top left cell ref 'AB34'
+    (?: : (?: ([A-Z]+)([0-9]*)))?   # Optional bottom right cell ref, row is optional
+    $
+    """,
+    re.VERBOSE | re.IGNORECASE
+)
+
+# Sheet names that can be written without quotes: not ones with spaces or punctuation, nor ones that could
+# be mistaken for a cell reference, like "A1" or "R1C1"
+_PLAIN_SHEET_NAME_RE = re.compile('^[A-Za-z0-9_]+$')
+_CELL_REF_LIKE_RE = re.compile('^([A-Za-z]{1,3}[0-9]+|[Rr][0-9]*[Cc][0-9]*)$')
+
+
+def quote_sheet_name(sheet : str) -> str:
+    """
+    @return str - the sheet name as it has to appear in a cell range, e.g. "Sheet1" or "'It''s'"
+    """
+    if _PLAIN_SHEET_NAME_RE.match(sheet) and not _CELL_REF_LIKE_RE.match(sheet):
+        return sheet
+    return "'{}'".format(sheet.replace("'", "''"))
+
+
+@functools.lru_cache(maxsize=1024)
 def colname_to_idx(col : str) -> int:
     """
     Converts a column name like "A" or "AA" into an index number, offset 0. A => 0, B => 1, ... AA => 26, AB => 27
     """
-    if not re.search('^[A-Z]{1,2}$', col, re.IGNORECASE):
-        raise Exception("Cannot parse column name: '{}'".format(col))
-
     col = col.upper()
-    if len(col) == 1:
-        return ord(col) - ord('A')
+    if not _COLNAME_RE.match(col):
+        raise Exception("Cannot parse column name: '{}'".format(col))
 
-    return (ord(col[0]) - ord('A') + 1) * 26 + ord(col[1]) - ord('A')
+    idx = 0
+    for char in col:
+        idx = idx * 26 + ord(char) - ord('A') + 1
+    if idx > MAX_COLUMNS:
+        raise Exception("Column name is out of range (the last column is XFD): '{}'".format(col))
+    return idx - 1
 
 
+@functools.lru_cache(maxsize=1024)
 def colidx_to_colname(idx : int) -> str:
     """
     Converts a column index # into a Google Sheets column name, i.e. 0 => 'A', 1 => 'B', 26 => 'AA', 27 => 'AB'
     """
+    if idx < 0 or idx >= MAX_COLUMNS:
+        raise Exception("Column index is out of range: {}".format(idx))
     ret = ''
-    high = idx // 26
-    if high > 0:
-        ret += chr(ord('A') + (high - 1))
-    low = idx % 26
-    ret += chr(ord('A') + low)
+    idx += 1
+    while idx > 0:
+        idx, remainder = divmod(idx - 1, 26)
+        ret = chr(ord('A') + remainder) + ret
     return ret
 
 
@@ -40,7 +73,22 @@ class CellRange(object):
         - Sheet name
         - top left column/row (and numerical index of the column)
         - bottom right column/row (and numerical index of the row)
+
+    A range can be open-ended, e.g. "B2:I", which means "down to the last row that has data". Its
+    height isn't known until it's been read (see with_height()).
+
+    CellRanges are immutable; methods that change the bounds return a new CellRange. Internally the bounds are
+    held as integers, and the column names and string form are only worked out if they're asked for.
     """
+    __slots__ = (
+        '_sheet',
+        '_top_left_col_idx',
+        '_top_left_row',
+        '_bottom_right_col_idx',
+        '_bottom_right_row',
+        '_str',
+    )
+
     def __init__(self,
             sheet : str,
             top_left_col : str,
@@ -48,73 +96,170 @@ class CellRange(object):
             bottom_right_col : str = None,
             bottom_right_row : int = None,
         ):
+        if bottom_right_col is None and bottom_right_row is not None:
+            raise Exception("Bottom_right_row cannot be specified without bottom_right_col.")
 
-        self.sheet = sheet
-        self.top_left_col = top_left_col
-        self.top_left_row = top_left_row
-
-        if (bottom_right_col is None) != (bottom_right_row is None):
-            raise Exception("Bottom_right_{col,idx} must be either both None, or both specified.")
-
+        top_left_col_idx = colname_to_idx(top_left_col)
         if bottom_right_col is None:
-            self.bottom_right_col = top_left_col
-            self.bottom_right_row = top_left_row
+            bottom_right_col_idx = top_left_col_idx
+            bottom_right_row = top_left_row
         else:
-            self.bottom_right_col = bottom_right_col
-            self.bottom_right_row = bottom_right_row
+            # bottom_right_row of None means the range is open-ended
+            bottom_right_col_idx = colname_to_idx(bottom_right_col)
+        self._set(sheet, top_left_col_idx, top_left_row, bottom_right_col_idx, bottom_right_row)
 
-        if self.bottom_right_col < self.top_left_col or self.bottom_right_row < self.top_left_row:
+        # Note: bottom_right_row == top_left_row - 1 is allowed, and describes a range with no rows.
+        if bottom_right_col_idx < top_left_col_idx or \
+                (bottom_right_row is not None and bottom_right_row < top_left_row - 1):
             raise Exception("Error parsing cell reference; top left cell must be <= bottom right cell. '{}'".format(str(self)))
 
+    def _set(self, sheet, top_left_col_idx, top_left_row, bottom_right_col_idx, bottom_right_row):
+        object.__setattr__(self, '_sheet', sheet)
+        object.__setattr__(self, '_top_left_col_idx', top_left_col_idx)
+        object.__setattr__(self, '_top_left_row', top_left_row)
+        object.__setattr__(self, '_bottom_right_col_idx', bottom_right_col_idx)
+        object.__setattr__(self, '_bottom_right_row', bottom_right_row)
+        object.__setattr__(self, '_str', None)
+
+    @staticmethod
+    def from_indexes(
+            sheet : str,
+            top_left_col_idx : int,
+            top_left_row : int,
+            bottom_right_col_idx : int,
+            bottom_right_row : int,
+        ):
+        """
+        Creates a CellRange from column indexes (offset 0) rather than names. The bounds aren't checked, so this
+        is intended for code that derives them from an existing, valid CellRange.
+        """
+        cell_range = CellRange.__new__(CellRange)
+        cell_range._set(sheet, top_left_col_idx, top_left_row, bottom_right_col_idx, bottom_right_row)
+        return cell_range
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CellRange is immutable")
+
+    @property
+    def sheet(self):
+        return self._sheet
+
+    @property
+    def top_left_col(self):
+        return colidx_to_colname(self._top_left_col_idx)
+
+    @property
+    def top_left_row(self):
+        return self._top_left_row
+
+    @property
+    def bottom_right_col(self):
+        return colidx_to_colname(self._bottom_right_col_idx)
+
+    @property
+    def bottom_right_row(self):
+        return self._bottom_right_row
+
     def width(self):
-        return self.bottom_right_col_idx() - self.top_left_col_idx() + 1
+        return self._bottom_right_col_idx - self._top_left_col_idx + 1
 
     def height(self):
-        return self.bottom_right_row - self.top_left_row + 1
+        if self._bottom_right_row is None:
+            raise Exception("The height of open-ended range '{}' is unknown".format(str(self)))
+        return self._bottom_right_row - self._top_left_row + 1
+
+    def is_open_ended(self):
+        return self._bottom_right_row is None
+
+    def with_height(self, height : int):
+        """
+        @return CellRange - a copy of this range with exactly `height` rows (which may be 0)
+        """
+        if height < 0:
+            raise Exception("Invalid height: {}".format(height))
+        return CellRange.from_indexes(
+            self._sheet,
+            self._top_left_col_idx,
+            self._top_left_row,
+            self._bottom_right_col_idx,
+            self._top_left_row + height - 1,
+        )
+
+    def window(self, start_row : int, max_rows : int = None):
+        """
+        @param start_row - first row number (in the sheet) to include. Rows above the range are ignored.
+        @param max_rows - maximum number of rows, or None for "to the bottom of this range"
+        @return CellRange - the part of this range from start_row downwards (it may have no rows)
+        """
+        top_row = max(start_row, self._top_left_row)
+        bottom_row = self._bottom_right_row
+        if max_rows is not None:
+            bottom_row = top_row + max_rows - 1 if bottom_row is None else min(bottom_row, top_row + max_rows - 1)
+        if bottom_row is not None:
+            bottom_row = max(bottom_row, top_row - 1)
+        return CellRange.from_indexes(
+            self._sheet,
+            self._top_left_col_idx,
+            top_row,
+            self._bottom_right_col_idx,
+            bottom_row,
+        )
 
     def top_left_col_idx(self):
-        return colname_to_idx(self.top_left_col)
+        return self._top_left_col_idx
 
     def bottom_right_col_idx(self):
-        return colname_to_idx(self.bottom_right_col)
+        return self._bottom_right_col_idx
 
     def __str__(self):
-        """ Format is "[<Sheet name>!]<Top left cell>[:<bottom right cell>] """
+        """
+        Format is "[<Sheet name>!]<Top left cell>[:<bottom right cell>]". The sheet name is quoted if it
+        needs to be, so that from_string() can parse the result.
+        """
+        if self._str is not None:
+            return self._str
         ret = ''
-        if self.sheet:
-            ret += self.sheet + '!'
-        ret += "{}{}".format(self.top_left_col, self.top_left_row)
-        if not (self.top_left_col == self.bottom_right_col and self.top_left_row == self.bottom_right_row):
-            ret += ":{}{}".format(self.bottom_right_col, self.bottom_right_row)
+        if self._sheet:
+            ret += quote_sheet_name(self._sheet) + '!'
+        ret += "{}{}".format(self.top_left_col, self._top_left_row)
+        if not (self._top_left_col_idx == self._bottom_right_col_idx and self._top_left_row == self._bottom_right_row):
+            ret += ":{}{}".format(self.bottom_right_col, '' if self._bottom_right_row is None else self._bottom_right_row)
+        object.__setattr__(self, '_str', ret)
         return ret
 
+    def __repr__(self):
+        return "CellRange('{}')".format(str(self))
+
+    def _key(self):
+        return (self._sheet, self._top_left_col_idx, self._top_left_row, self._bottom_right_col_idx, self._bottom_right_row)
+
+    def __eq__(self, other):
+        return isinstance(other, CellRange) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __reduce__(self):
+        # The default pickle/copy support would try to set the attributes
+        return (CellRange.from_indexes, self._key())
+
     def clone(self):
-        return copy.copy(self)
+        # CellRanges are immutable, so there's no need to copy
+        return self
 
     @staticmethod
+    @functools.lru_cache(maxsize=4096)
     def from_string(cell_range):
         """
         Parses a Sheets cell range (Canonically "<Sheet name>!<Top left cell>[:bottom right cell]") and returns
-        an object describing the cell.
-
-        @return dict
-            'sheet': str | None - sheet name
-            'top_left_col': str - col name (e.g. 'A', 'B', 'C')
-            'top_left_row': int - row number (e.g. 1, 2, 3)
-            'bottom_right_col': str | None - col name (as above) - only present if it was specified in the range.
-            'bottom_right_row': int | None- row number (as above)
-        }
+        an object describing the cell. The sheet name may be quoted (as it is in API responses), and the bottom
+        right cell may omit the row number to describe an open-ended range, e.g. "'Sheet 1'!B2:I"
+
+        Results are cached, which is safe because CellRanges are immutable.
+
+        @return CellRange
         """
-        matches = re.search("""
-            ^
-            (?: ([^!]+)!)?                  # Optional sheet name
-            (?: ([A-Z]+)([0-9]+))           # Top left cell ref 'AB34'
-            (?: : (?: ([A-Z]+)([0-9]+)))?   # Optional bottom right cell ref
-            $
-            """,
-            cell_range,
-            re.VERBOSE | re.IGNORECASE
-        )
+        matches = _CELL_RANGE_RE.match(cell_range)
         if matches is None:
             raise Exception("Could not parse cell range string: '{}'".format(cell_range))
 
@@ -129,27 +274,26 @@ class CellRange(object):
             bottom_right_row = top_left_row
         else:
             bottom_right_col = bottom_right_col.upper()
-            bottom_right_row = int(matches.group(5))
+            bottom_right_row = int(matches.group(5)) if matches.group(5) else None
+
+        sheet = matches.group(1)
+        if sheet is not None and sheet.startswith("'"):
+            sheet = sheet[1:-1].replace("''", "'")
 
         return CellRange(
-            sheet=matches.group(1),
+            sheet=sheet,
             top_left_col=top_left_col,
             top_left_row=top_left_row,
             bottom_right_col=bottom_right_col,
             bottom_right_row=bottom_right_row,
         )
 
-    def get_relative_cell(self, row_idx : int, col_idx : str) -> str:
+    def get_relative_cell(self, row_idx : int, col_idx : int):
         """
         @param row_idx - integer offset into this cell range (not the row number in the sheet)
         @param col_idx - int offset into this cell range (not the column name in the sheet)
         @return CellRange - a new CellRange describing just this cell
         """
-
-        col_name = colidx_to_colname(self.top_left_col_idx() + col_idx)
-        row = self.top_left_row + row_idx
-        return CellRange(
-            sheet=self.sheet,
-            top_left_col=col_name,
-            top_left_row=row,
-        )
+        col_idx = self._top_left_col_idx + col_idx
+        row = self._top_left_row + row_idx
+        return CellRange.from_indexes(self._sheet, col_idx, row, col_idx, row)
@@ -1,10 +1,41 @@
 #!/bin/env python3
 
-from .CellRange import CellRange
+from .CellRange import (
+    CellRange,
+    colidx_to_colname,
+    colname_to_idx,
+)
 import logging
 logger = logging.getLogger(__name__)
 from pprint import pprint
 
+
+def resolve_col_idx(cell_range : CellRange, col) -> int:
+    """
+    @param col - a column index relative to cell_range (int), or a sheet column name (str), e.g. 'B'
+    @return int - the column index relative to cell_range
+    """
+    if isinstance(col, str):
+        col_idx = colname_to_idx(col) - cell_range.top_left_col_idx()
+    else:
+        col_idx = col
+    if col_idx < 0 or col_idx >= cell_range.width():
+        raise IndexError("Column {} is outside of {}".format(col, cell_range))
+    return col_idx
+
+
+def resolve_column_names(cell_range : CellRange, names : dict) -> list:
+    """
+    @param names - {column: name}, where column is as for resolve_col_idx(), or None for every column
+                   named by its sheet column name ('B', 'C', ...)
+    @return [(col_idx, name)]
+    """
+    if names is None:
+        first_col_idx = cell_range.top_left_col_idx()
+        return [(col_idx, colidx_to_colname(first_col_idx + col_idx)) for col_idx in range(0, cell_range.width())]
+    return [(resolve_col_idx(cell_range, col), name) for col, name in names.items()]
+
+
 class CellRangeData(object):
     """
     Object that contains a block of data returned by read_cells
@@ -29,6 +60,12 @@ class CellRangeData(object):
 
     @staticmethod
     def from_read_result(cell_range : CellRange, result_rows : list):
+        """
+        @param cell_range - the range that was read. If it's open-ended, the result is sized to the rows returned.
+        @param result_rows - the 'values' from the API response
+        """
+        if cell_range.is_open_ended():
+            cell_range = cell_range.with_height(len(result_rows))
         width = cell_range.width()
         # Note: "[ [None] * width] * height" does not work because all the 'rows' refer to the same list instance.
         cells = []
@@ -39,7 +76,7 @@ class CellRangeData(object):
         for row in result_rows:
             row_len = len(row)
             if len(row) > width:
-                raise Exception("Error parsing read result: A row has more values in it ({}) than expected ({})".format(len(row), range_width))
+                raise Exception("Error parsing read result: A row has more values in it ({}) than expected ({})".format(len(row), width))
             col_idx = 0
             for val in row:
                 cells[row_idx][col_idx] = val
@@ -58,3 +95,22 @@ class CellRangeData(object):
 
     def get_cell(self, row_idx : int, col_idx : int):
         return self.cells[row_idx][col_idx]
+
+    def column(self, col) -> list:
+        """
+        @param col - a column index relative to the range (int), or a sheet column name (str), e.g. 'B'
+        @return list - the column's values, one per row of the range (None for empty cells)
+        """
+        col_idx = resolve_col_idx(self.cell_range, col)
+        return [row[col_idx] for row in self.cells]
+
+    def iter_rows(self, names : dict = None):
+        """
+        Generator of one dict per row of the range.
+
+        @param names - {column: name} of the columns to include, where column is as for column(). By default
+                       every column is included, named by its sheet column name ('B', 'C', ...).
+        """
+        columns = resolve_column_names(self.cell_range, names)
+        for row in self.cells:
+            yield {name: row[col_idx] for col_idx, name in columns}
@@ -4,11 +4,24 @@
 This file contains a higher-level API for reading/writing Google Sheets.
 """
 
-from ..apiutils import get_sheets_service
-from .CellRange import CellRange
+from ..apiutils import (
+    execute_with_retry,
+    get_sheets_service,
+)
+from ..discovery import DEFAULT_MAX_AGE
+import logging
+logger = logging.getLogger(__name__)
+from .CellRange import (
+    CellRange,
+    quote_sheet_name,
+)
 from .CellRangeData import CellRangeData
+from .SparseCellRangeData import SparseCellRangeData
 from .SheetWriteBuffer import SheetWriteBuffer
 
+# Google recommends keeping request payloads to 2MB
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+
 class SheetService(object):
     """
     This class offers a friendly interface to the Google Sheets API. It supports easy read/write of blocks of data.
@@ -22,53 +35,125 @@ class SheetService(object):
 
 
     @staticmethod
-    def new_instance(spreadsheet_id : str, service_account_file : str):
+    def new_instance(
+            spreadsheet_id : str,
+            service_account_file : str,
+            cache_dir : str = None,
+            max_age : float = DEFAULT_MAX_AGE,
+        ):
         """
         @param service_account_file - path to the service account credentials file for accessing this spreadsheet
         @param spreadsheet_id - the ID of the spreadsheet (the long hexdigits in the spreadsheet's URL)
+        @param cache_dir, max_age - where to keep the API's discovery document, see get_sheets_service()
         """
         service = get_sheets_service(
             service_account_file=service_account_file,
             read_only=False,
+            cache_dir=cache_dir,
+            max_age=max_age,
         )
         return SheetService(service=service, spreadsheet_id=spreadsheet_id)
 
 
-    def read_cells(self, cell_range : str) -> CellRangeData:
+    def get_grid_properties(self, sheet_name : str) -> dict:
         """
-        @param cell_range - a string describing the block of cells to read, e.g. "Sheet 1!B2:C4"
+        Fetches the size of a sheet's grid. Note that the grid is usually larger than the area that has data;
+        to read just the rows with data, read an open-ended range like "Sheet 1!B2:C".
+
+        @param sheet_name - the name of the sheet (tab) within the spreadsheet
+        @return dict - e.g. {'rowCount': 1000, 'columnCount': 26}
         """
-        result = self.service.spreadsheets().values().get(
+        result = execute_with_retry(self.service.spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id,
+            ranges=[quote_sheet_name(sheet_name)],
+            fields='sheets(properties(title,gridProperties(rowCount,columnCount)))',
+        ))
+
+        for sheet in result.get('sheets', []):
+            if sheet['properties']['title'] == sheet_name:
+                return sheet['properties']['gridProperties']
+        raise Exception("Error: Spreadsheet {} has no sheet '{}'".format(self.spreadsheet_id, sheet_name))
+
+
+    def read_cells(self, cell_range : str, sparse : bool = False) -> CellRangeData:
+        """
+        @param cell_range - a string describing the block of cells to read, e.g. "Sheet 1!B2:C4". If the range
+                            is open-ended (e.g. "Sheet 1!B2:C") the result has one row per row up to the last
+                            one with data.
+        @param sparse - return a SparseCellRangeData, which is much cheaper than a CellRangeData for large ranges
+        """
+        result = execute_with_retry(self.service.spreadsheets().values().get(
             spreadsheetId=self.spreadsheet_id,
             range=cell_range,
-        ).execute()
+        ))
 
-        return CellRangeData.from_read_result(
+        data_class = SparseCellRangeData if sparse else CellRangeData
+        return data_class.from_read_result(
             cell_range=CellRange.from_string(cell_range),
             result_rows=result.get('values', []),
         )
 
 
-    def update_cells(self, buf : SheetWriteBuffer) -> None:
-        data = [
-            {
-                'range': cell_ref,
-                'values': [[str(value)]]
-            }
-            for cell_ref, value in buf.cells.items()
-        ]
-        if len(data) == 0:
-            # Nothing to do
-            return
+    def read_many(self, cell_ranges : list, fields : str = 'valueRanges(values)', sparse : bool = False) -> list:
+        """
+        Reads several blocks of cells in a single request.
 
-        body = {
-            'valueInputOption': 'RAW',
-            'data': data,
+        @param cell_ranges - list of strings describing blocks of cells, e.g. ["Sheet 1!B2:B100", "Sheet 1!H2:I"].
+                             See read_cells() for open-ended ranges.
+        @param fields - partial-response field mask applied to the batchGet response, or None for the full response.
+                        The default drops everything except the cell values.
+        @param sparse - see read_cells()
+        @return [CellRangeData] - one per requested range, in the same order
+        """
+        if len(cell_ranges) == 0:
+            return []
+
+        request_args = {
+            'spreadsheetId': self.spreadsheet_id,
+            'ranges': list(cell_ranges),
         }
+        if fields is not None:
+            request_args['fields'] = fields
+        result = execute_with_retry(self.service.spreadsheets().values().batchGet(**request_args))
 
-        result = self.service.spreadsheets().values().batchUpdate(
-            spreadsheetId=self.spreadsheet_id,
-            body=body,
-        ).execute()
+        value_ranges = result.get('valueRanges', [])
+        if len(value_ranges) != len(cell_ranges):
+            raise Exception("Error: Requested {} ranges, but got {}".format(len(cell_ranges), len(value_ranges)))
+        data_class = SparseCellRangeData if sparse else CellRangeData
+        return [
+            data_class.from_read_result(
+                cell_range=CellRange.from_string(cell_range),
+                result_rows=value_range.get('values', []),
+            )
+            for cell_range, value_range in zip(cell_ranges, value_ranges)
+        ]
+
+
+    def update_cells(self, buf : SheetWriteBuffer, max_request_bytes : int = MAX_REQUEST_BYTES, http=None) -> None:
+        """
+        Writes the pending cells in buf, merged into rectangular blocks, in as few requests as possible.
+        Quota and server errors are retried (see execute_with_retry()).
+
+        @param max_request_bytes - approximate size limit of each request; larger updates are split
+        @param http - http object to send the requests with, for calls from a thread other than the one
+                      that uses this SheetService (see new_thread_http())
+        """
+        for data in buf.get_batches(max_bytes=max_request_bytes):
+            body = {
+                'valueInputOption': 'RAW',
+                'data': [
+                    {
+                        'range': entry['range'],
+                        'majorDimension': 'ROWS',
+                        'values': entry['values'],
+                    }
+                    for entry in data
+                ],
+            }
 
-        # TODO - deal with result
+            result = execute_with_retry(self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body=body,
+            ), http=http)
+            logger.debug('Updated {} cells in {} ranges'.format(
+                result.get('totalUpdatedCells', 0), len(result.get('responses', data))))
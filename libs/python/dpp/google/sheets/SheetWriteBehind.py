@@ -0,0 +1,239 @@
+#!/bin/env python3
+
+import json
+import os
+import tempfile
+import threading
+import time
+import logging
+logger = logging.getLogger(__name__)
+
+from ..apiutils import new_thread_http
+from .CellRange import CellRange
+from .SheetWriteBuffer import SheetWriteBuffer
+
+class SheetWriteBehind(object):
+    """
+    Buffers writes to a spreadsheet and sends them from a background thread, either when enough
+    have accumulated or when the oldest one has waited long enough. Callers never wait for the API, and
+    can keep using the SheetService meanwhile: the background thread sends through its own connection.
+
+    If journal_file is given, each write is appended to it before set() returns, and removed once it
+    has been sent. If the process dies with writes still pending, they are replayed (before any new
+    writes) the next time a SheetWriteBehind is started with the same journal file.
+
+        with SheetWriteBehind(sheet_service, journal_file='updates.journal') as writer:
+            writer.set(CellRange.from_string('Sheet 1!I5'), 'Done')
+            ...
+        # All writes have been sent (or an exception was raised)
+    """
+    def __init__(self,
+            sheet_service,
+            journal_file : str = None,
+            max_pending : int = 100,
+            max_delay : float = 5.0,
+            retry_delay : float = 30.0,
+        ):
+        """
+        @param sheet_service:   SheetService to write with
+        @param journal_file:    path of the file that holds unsent writes, or None for no journal
+        @param max_pending:     send as soon as this many writes are pending
+        @param max_delay:       send once the oldest pending write is this many seconds old
+        @param retry_delay:     seconds to wait before trying again after a failed send. (Quota and server
+                                errors have already been retried by the SheetService by then.)
+        """
+        self.sheet_service = sheet_service
+        self.journal_file = journal_file
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+
+        self.last_error = None          # The exception from the most recent failed send, if any
+        self._entries = []              # Unsent writes, oldest first: {'range': str, 'values': rows}
+        self._oldest_time = None        # When the oldest unsent write was made
+        self._retry_time = None         # Don't retry a failed send before this
+        self._journal_fh = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closing = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self) -> None:
+        """
+        Replays any writes left in the journal by a previous run, and starts the background thread.
+        """
+        if self.journal_file is not None:
+            replayed = self._read_journal()
+            if replayed:
+                logger.info('Replaying {} unsent spreadsheet writes from {}'.format(len(replayed), self.journal_file))
+                self._entries = replayed
+                self._oldest_time = 0
+            os.makedirs(os.path.dirname(os.path.abspath(self.journal_file)), exist_ok=True)
+            self._journal_fh = open(self.journal_file, 'a')
+
+        self._thread = threading.Thread(target=self._run, name='SheetWriteBehind', daemon=True)
+        self._thread.start()
+
+    def set(self, cell : CellRange, value) -> None:
+        """
+        @param cell -  cell reference, must refer to a single cell.
+        @param value - mixed - value to place into the cell. None clears the cell.
+        """
+        if cell.width() != 1 or cell.height() != 1:
+            raise Exception("Invalid cell range. Width must be 1x1, but this cell range is {} wide and {} high.".format(cell.width(), cell.height()))
+        self.set_range(cell, [[value]])
+
+    def set_range(self, cell_range : CellRange, values : list) -> None:
+        """
+        See SheetWriteBuffer.set_range()
+        """
+        if len(values) != cell_range.height() or any(len(row) != cell_range.width() for row in values):
+            raise Exception("Invalid values for cell range {}. Expected {} rows of {} values.".format(cell_range, cell_range.height(), cell_range.width()))
+        entry = {'range': str(cell_range), 'values': values}
+        with self._cond:
+            if self._thread is None or self._closing:
+                raise Exception("SheetWriteBehind is not running")
+            if self._journal_fh is not None:
+                self._journal_fh.write(json.dumps(entry) + '\n')
+                self._journal_fh.flush()
+                os.fsync(self._journal_fh.fileno())
+            if not self._entries:
+                self._oldest_time = time.time()
+                # Wake the background thread, so that it starts the max_delay timer
+                self._cond.notify_all()
+            self._entries.append(entry)
+            if len(self._entries) >= self.max_pending:
+                self._cond.notify_all()
+
+    def num_pending_writes(self) -> int:
+        with self._cond:
+            return len(self._entries)
+
+    def flush(self, timeout : float = None) -> bool:
+        """
+        Sends the pending writes now, and waits until they've been sent.
+
+        @return bool - True if everything was sent, False if a send failed (see last_error) or timed out
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            self._oldest_time = 0
+            self._retry_time = None
+            self.last_error = None
+            self._cond.notify_all()
+            while self._entries and self.last_error is None:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return not self._entries
+
+    def close(self) -> None:
+        """
+        Sends the pending writes and stops the background thread.
+
+        @raise Exception if some writes couldn't be sent. They remain in the journal (if there is one).
+        """
+        if self._thread is None:
+            return
+        sent = self.flush()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._thread = None
+        if self._journal_fh is not None:
+            self._journal_fh.close()
+            self._journal_fh = None
+        if not sent:
+            raise Exception("{} spreadsheet writes could not be sent{}: {}".format(
+                len(self._entries),
+                '' if self.journal_file is None else ' (they will be retried from {})'.format(self.journal_file),
+                self.last_error,
+            ))
+
+    def _is_due(self) -> bool:
+        if not self._entries:
+            return False
+        now = time.time()
+        if self._retry_time is not None and now < self._retry_time:
+            return False
+        return len(self._entries) >= self.max_pending or now - self._oldest_time >= self.max_delay
+
+    def _next_wakeup(self) -> float:
+        if not self._entries:
+            return None
+        if self._retry_time is not None:
+            return max(0, self._retry_time - time.time())
+        return max(0, self._oldest_time + self.max_delay - time.time())
+
+    def _run(self) -> None:
+        http = None
+        connected = False
+        while True:
+            with self._cond:
+                while not self._is_due() and not self._closing:
+                    self._cond.wait(self._next_wakeup())
+                if self._closing:
+                    return
+                entries = list(self._entries)
+
+            buf = SheetWriteBuffer()
+            for entry in entries:
+                buf.set_range(CellRange.from_string(entry['range']), entry['values'])
+            try:
+                if not connected:
+                    # The service's own connection isn't thread-safe, and the caller keeps using it (e.g. for
+                    # reads) while this thread writes, so the writes go through a connection of their own.
+                    http = new_thread_http(self.sheet_service.service)
+                    connected = True
+                self.sheet_service.update_cells(buf, http=http)
+            except Exception as e:
+                logger.warning('Failed to send {} spreadsheet writes: {}'.format(len(entries), e))
+                with self._cond:
+                    self.last_error = e
+                    self._retry_time = time.time() + self.retry_delay
+                    self._cond.notify_all()
+                continue
+
+            with self._cond:
+                del self._entries[:len(entries)]
+                self._oldest_time = time.time() if self._entries else None
+                self._retry_time = None
+                self._rewrite_journal()
+                self._cond.notify_all()
+
+    def _read_journal(self) -> list:
+        entries = []
+        try:
+            with open(self.journal_file) as fh:
+                for line in fh:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # A partially written last line, from a crash in the middle of set()
+                        logger.warning('Ignoring corrupt line in {}'.format(self.journal_file))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _rewrite_journal(self) -> None:
+        """
+        Replaces the journal with just the unsent writes. Must be called with self._cond held.
+        """
+        if self._journal_fh is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.journal_file))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            for entry in self._entries:
+                fh.write(json.dumps(entry) + '\n')
+        self._journal_fh.close()
+        os.replace(tmp_path, self.journal_file)
+        self._journal_fh = open(self.journal_file, 'a')
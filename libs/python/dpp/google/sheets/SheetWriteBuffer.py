@@ -1,24 +1,139 @@
 #!/bin/env python3
 
+import json
+
 from .CellRange import CellRange
 
 class SheetWriteBuffer(object):
     """
     This is a buffer used to store multiple writes to a spreadsheet. To use it, instantiate it
-    and start making calls to set() to set the value of individual cells (see below). Then when
-    you're ready to actually update the spreadsheet, pass this object to SheetService.writeBuffer.
+    and start making calls to set() or set_range() (see below). Then when you're ready to actually
+    update the spreadsheet, pass this object to SheetService.update_cells().
+
+    Cells are sent as a few rectangular blocks rather than one by one: contiguous cells in a row are
+    merged, and then identical spans in consecutive rows are merged, so e.g. setting the status and
+    notes columns of 100 consecutive rows results in a single 2x100 block.
     """
     def __init__(self):
-        self.cells = {}
+        self.cells = {}     # {sheet: {(row, col_idx): value}}
 
     def set(self, cell : CellRange, value):
         """
         @param cell -  cell reference, must refer to a single cell.
-        @param value - mixed - value to place into the cell
+        @param value - mixed - value to place into the cell. None clears the cell.
         """
         if cell.width() != 1 or cell.height() != 1:
-            raise Exception("Invalid cell range. Width must be 1x1, but this cell range is {} wide and {} high.".format(cell_range.width(), cell_range.height()))
-        self.cells[str(cell)] = value
+            raise Exception("Invalid cell range. Width must be 1x1, but this cell range is {} wide and {} high.".format(cell.width(), cell.height()))
+        self.cells.setdefault(cell.sheet, {})[(cell.top_left_row, cell.top_left_col_idx())] = value
+
+    def set_range(self, cell_range : CellRange, values : list):
+        """
+        @param cell_range - the block of cells to set
+        @param values - list of rows (lists) of values, which must be exactly the size of cell_range.
+                        None clears the cell.
+        """
+        if len(values) != cell_range.height() or any(len(row) != cell_range.width() for row in values):
+            raise Exception("Invalid values for cell range {}. Expected {} rows of {} values.".format(cell_range, cell_range.height(), cell_range.width()))
+        sheet_cells = self.cells.setdefault(cell_range.sheet, {})
+        first_col_idx = cell_range.top_left_col_idx()
+        for row_offset, row in enumerate(values):
+            for col_offset, value in enumerate(row):
+                sheet_cells[(cell_range.top_left_row + row_offset, first_col_idx + col_offset)] = value
 
     def num_pending_writes(self):
-        return len(self.cells)
+        return sum(len(sheet_cells) for sheet_cells in self.cells.values())
+
+    def clear(self):
+        self.cells = {}
+
+    def get_blocks(self) -> list:
+        """
+        @return [(CellRange, rows)] - the pending writes, merged into rectangular blocks
+        """
+        blocks = []
+        for sheet, sheet_cells in self.cells.items():
+            # Merge contiguous cells within each row into spans: {row: [(first_col_idx, last_col_idx)]}
+            spans_by_row = {}
+            for row, col_idx in sorted(sheet_cells):
+                spans = spans_by_row.setdefault(row, [])
+                if spans and spans[-1][1] == col_idx - 1:
+                    spans[-1] = (spans[-1][0], col_idx)
+                else:
+                    spans.append((col_idx, col_idx))
+
+            # Merge identical spans in consecutive rows: open[(first_col_idx, last_col_idx)] = [first_row, last_row]
+            rects = []
+            open_rects = {}
+            for row in sorted(spans_by_row):
+                for span in spans_by_row[row]:
+                    rect = open_rects.get(span)
+                    if rect is not None and rect[1] == row - 1:
+                        rect[1] = row
+                    else:
+                        rect = [row, row]
+                        open_rects[span] = rect
+                        rects.append((span, rect))
+
+            for (first_col_idx, last_col_idx), (first_row, last_row) in rects:
+                cell_range = CellRange.from_indexes(sheet, first_col_idx, first_row, last_col_idx, last_row)
+                rows = [
+                    [_to_api_value(sheet_cells[(row, col_idx)]) for col_idx in range(first_col_idx, last_col_idx + 1)]
+                    for row in range(first_row, last_row + 1)
+                ]
+                blocks.append((cell_range, rows))
+        return blocks
+
+    def get_batches(self, max_bytes : int) -> list:
+        """
+        Splits the pending writes into groups that each fit into a single batchUpdate request. Blocks that
+        are too large on their own are split by rows.
+
+        @param max_bytes - approximate upper limit on the size of the 'data' of each request
+        @return [[{'range': str, 'values': rows}]] - the 'data' of each request
+        """
+        batches = []
+        batch = []
+        batch_size = 0
+        for cell_range, rows in self.get_blocks():
+            for entry, entry_size in _split_block(cell_range, rows, max_bytes):
+                if batch and batch_size + entry_size > max_bytes:
+                    batches.append(batch)
+                    batch = []
+                    batch_size = 0
+                batch.append(entry)
+                batch_size += entry_size
+        if batch:
+            batches.append(batch)
+        return batches
+
+
+def _to_api_value(value):
+    if value is None:
+        # In a RAW update, an empty string clears the cell
+        return ''
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _json_size(value) -> int:
+    return len(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+
+def _split_block(cell_range : CellRange, rows : list, max_bytes : int):
+    """
+    Generator of ({'range', 'values'}, approximate size in bytes), splitting the block into runs of rows
+    so that each is at most max_bytes (unless a single row is larger than that).
+    """
+    row_sizes = [_json_size(row) + 1 for row in rows]
+    start = 0
+    while start < len(rows):
+        end = start + 1
+        size = row_sizes[start]
+        while end < len(rows) and size + row_sizes[end] <= max_bytes:
+            size += row_sizes[end]
+            end += 1
+        part = cell_range.window(start_row=cell_range.top_left_row + start, max_rows=end - start)
+        # Allow for the range string and the JSON keys
+        yield {'range': str(part), 'values': rows[start:end]}, size + len(str(part)) + 32
+        start = end
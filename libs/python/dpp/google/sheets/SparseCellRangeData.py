@@ -0,0 +1,89 @@
+#!/bin/env python3
+
+from .CellRange import CellRange
+from .CellRangeData import (
+    resolve_col_idx,
+    resolve_column_names,
+)
+import logging
+logger = logging.getLogger(__name__)
+
+class SparseCellRangeData(object):
+    """
+    Alternative to CellRangeData that keeps the rows exactly as the API returned them, i.e. trailing empty
+    cells (and trailing empty rows) are simply absent. Nothing is copied when it's created, so it's much
+    cheaper for large ranges, especially those that are mostly empty. It has the same get_cell() interface
+    as CellRangeData, plus column-oriented access:
+
+        cells = service.read_cells('Form Responses 1!B2:I', sparse=True)
+        emails = cells.column('B')
+        for row in cells.iter_rows(names={'B': 'email', 'I': 'status'}):
+            print(row['email'], row['status'])
+    """
+    def __init__(self, cell_range : CellRange, rows : list):
+        """
+        @param cell_range - the range that was read. If it's open-ended, it's sized to the rows given.
+        @param rows - the 'values' from the API response; each row may be shorter than the range's width
+        """
+        if cell_range.is_open_ended():
+            cell_range = cell_range.with_height(len(rows))
+        if len(rows) > cell_range.height():
+            raise Exception("Error: Number of rows expected {}, but got {}".format(cell_range.height(), len(rows)))
+        width = cell_range.width()
+        for row in rows:
+            if len(row) > width:
+                raise Exception("Error parsing read result: A row has more values in it ({}) than expected ({})".format(len(row), width))
+
+        self.cell_range = cell_range
+        self.rows = rows
+
+    @staticmethod
+    def from_read_result(cell_range : CellRange, result_rows : list):
+        return SparseCellRangeData(cell_range=cell_range, rows=result_rows)
+
+    def width(self):
+        return self.cell_range.width()
+
+    def height(self):
+        return self.cell_range.height()
+
+    def get_relative_cell(self, row_idx : int, col_idx : int) -> CellRange:
+        return self.cell_range.get_relative_cell(row_idx=row_idx, col_idx=col_idx)
+
+    def get_cell(self, row_idx : int, col_idx : int):
+        """
+        Note: for reading many cells, column() and iter_rows() are much faster than calling this per cell.
+        """
+        rows = self.rows
+        if row_idx < len(rows):
+            row = rows[row_idx]
+            if col_idx < len(row):
+                return row[col_idx]
+        if row_idx >= self.height() or col_idx >= self.width():
+            raise IndexError("Cell ({}, {}) is outside of {}".format(row_idx, col_idx, self.cell_range))
+        return None
+
+    def column(self, col) -> list:
+        """
+        @param col - a column index relative to the range (int), or a sheet column name (str), e.g. 'B'
+        @return list - the column's values, one per row of the range (None for empty cells)
+        """
+        col_idx = resolve_col_idx(self.cell_range, col)
+        values = [row[col_idx] if col_idx < len(row) else None for row in self.rows]
+        values.extend([None] * (self.height() - len(self.rows)))
+        return values
+
+    def iter_rows(self, names : dict = None):
+        """
+        Generator of one dict per row of the range.
+
+        @param names - {column: name} of the columns to include, where column is as for column(). By default
+                       every column is included, named by its sheet column name ('B', 'C', ...).
+        """
+        columns = resolve_column_names(self.cell_range, names)
+
+        for row in self.rows:
+            row_len = len(row)
+            yield {name: (row[col_idx] if col_idx < row_len else None) for col_idx, name in columns}
+        for _ in range(len(self.rows), self.height()):
+            yield {name: None for _, name in columns}
@@ -4,10 +4,14 @@ logging.getLogger(__name__).addHandler(logging.NullHandler())
 from .CellRange import CellRange
 from .CellRangeData import CellRangeData
 from .SheetService import SheetService
+from .SheetWriteBehind import SheetWriteBehind
+from .SparseCellRangeData import SparseCellRangeData
 from .SheetWriteBuffer import SheetWriteBuffer
 __all__ = [
     'CellRange',
     'CellRangeData',
     'SheetService',
+    'SheetWriteBehind',
+    'SparseCellRangeData',
     'SheetWriteBuffer',
 ]
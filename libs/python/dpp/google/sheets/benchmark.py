@@ -0,0 +1,109 @@
+#!/bin/env python3
+"""
+Compares CellRangeData (dense) with SparseCellRangeData on a synthetic read result, e.g.
+
+    cd libs/python && python3 -m dpp.google.sheets.benchmark --rows 10000 --cols 10 --fill 0.3
+
+No API access is needed; the read result is generated locally in the shape the Sheets API returns it
+(rows are truncated after their last non-empty cell, and trailing empty rows are omitted).
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from .CellRange import (
+    CellRange,
+    colidx_to_colname,
+)
+from .CellRangeData import CellRangeData
+from .SparseCellRangeData import SparseCellRangeData
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Benchmarks dense vs sparse CellRangeData')
+    parser.add_argument('--rows', type=int, default=10000, help="Rows in the range (default: 10000)")
+    parser.add_argument('--cols', type=int, default=10, help="Columns in the range (default: 10)")
+    parser.add_argument('--fill', type=float, default=0.3,
+        help="Fraction of cells that have a value (default: 0.3)")
+    parser.add_argument('--repeat', type=int, default=5, help="Times to repeat each measurement (default: 5)")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser
+
+
+def make_read_result(num_rows : int, num_cols : int, fill : float, seed : int) -> list:
+    rand = random.Random(seed)
+    rows = []
+    for row_idx in range(0, num_rows):
+        row = [
+            'r{}c{}'.format(row_idx, col_idx) if rand.random() < fill else ''
+            for col_idx in range(0, num_cols)
+        ]
+        while row and row[-1] == '':
+            row.pop()
+        rows.append(row)
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def best_time(func, repeat : int) -> float:
+    best = None
+    for _ in range(0, repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+
+def main():
+    args = get_parser().parse_args()
+    cell_range = CellRange(
+        sheet='Sheet 1',
+        top_left_col='A',
+        top_left_row=1,
+        bottom_right_col=colidx_to_colname(args.cols - 1),
+        bottom_right_row=args.rows,
+    )
+    result_rows = make_read_result(args.rows, args.cols, args.fill, args.seed)
+    print("Range {}: {} cells, {:.0%} filled".format(cell_range, args.rows * args.cols, args.fill))
+
+    middle_col = colidx_to_colname(args.cols // 2)
+    names = {'A': 'first', middle_col: 'middle'}
+    print("{:<8} {:>12} {:>12} {:>12} {:>12} {:>12}".format(
+        'backend', 'build (ms)', 'memory (KB)', 'get_cell', 'column (ms)', 'iter (ms)'))
+    for label, data_class in [('dense', CellRangeData), ('sparse', SparseCellRangeData)]:
+        build = lambda: data_class.from_read_result(cell_range=cell_range, result_rows=result_rows)
+        data = build()
+
+        def get_all_cells():
+            for row_idx in range(0, data.height()):
+                for col_idx in range(0, data.width()):
+                    data.get_cell(row_idx, col_idx)
+
+        print("{:<8} {:>12.2f} {:>12.0f} {:>12.2f} {:>12.2f} {:>12.2f}".format(
+            label,
+            best_time(build, args.repeat) * 1000,
+            peak_memory(build) / 1024,
+            best_time(get_all_cells, args.repeat) * 1000,
+            best_time(lambda: data.column(middle_col), args.repeat) * 1000,
+            best_time(lambda: list(data.iter_rows(names=names)), args.repeat) * 1000,
+        ))
+    print("(get_cell: ms to read every cell individually)")
+
+
+if __name__ == '__main__':
+    main()
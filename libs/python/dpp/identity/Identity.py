@@ -0,0 +1,46 @@
+#!/bin/env python3
+
+
+class Identity(object):
+    """
+    A person, as seen by all the sources ingested into an IdentityIndex. ldap_record is None when none of
+    the person's accounts could be matched to an LDAP user; the accounts are then grouped by the key they
+    were found with (e.g. a Slack user and a GitHub user with the same email).
+    """
+    def __init__(self, ldap_record=None):
+        """
+        @param ldap_record: dpp.ldap.UserRecord.UserRecord
+        """
+        self.ldap_record = ldap_record
+        self.slack_users = []           # Slack member dicts, as returned by users.list
+        self.iam_users = []             # [(AWS account ID, IAM user dict, as returned by list_users)]
+        self.github_users = []          # GitHub user dicts, with at least 'login'
+
+    @property
+    def uid(self) -> str:
+        return self.ldap_record.uid if self.ldap_record is not None else None
+
+    @property
+    def is_known(self) -> bool:
+        """
+        @return bool - True if the person has an LDAP record, current or deleted
+        """
+        return self.ldap_record is not None
+
+    @property
+    def is_employed(self) -> bool:
+        return self.ldap_record is not None and self.ldap_record.is_employed
+
+    def __str__(self):
+        if self.ldap_record is not None:
+            ret = str(self.ldap_record)
+            if not self.ldap_record.is_employed:
+                ret += ' (left)'
+        else:
+            ret = '[unknown]'
+        return '{} slack={} iam={} github={}'.format(
+            ret,
+            len(self.slack_users),
+            len(self.iam_users),
+            len(self.github_users),
+        )
@@ -0,0 +1,236 @@
+#!/bin/env python3
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .Identity import Identity
+from .normalize import (
+    normalize_email,
+    normalize_github_login,
+    normalize_uid,
+)
+
+
+class IdentityIndex(object):
+    """
+    Matches people's accounts across LDAP, Slack, AWS IAM and GitHub.
+
+    Records are added per source with the add_*() methods, then joined in a single pass (join() runs on
+    the first query after records were added) through dict indexes on normalized email, uid and GitHub
+    login, so the cost is linear in the number of records.
+
+    LDAP records are the anchors: each one becomes an Identity, indexed under its uid, all its email
+    aliases and its GitHub handle. The other sources are matched against those keys:
+      - Slack users by profile email
+      - IAM users by user name, which is the owner's Kerberos ID (or an email, if it contains '@')
+      - GitHub users by login, or email if the login is unknown
+    Accounts that match no LDAP record are grouped into Identities without one.
+
+        index = IdentityIndex(email_aliases={'jsmith@coreos.com': 'jsmith@redhat.com'})
+        index.add_ldap_records(user_searcher.iter_users())     # Includes people who left
+        index.add_iam_users(account['Id'], iam_ops.get_IAM_accounts())
+        for account_id, iam_user, identity in index.get_orphaned_iam_users():
+            ...
+    """
+    def __init__(self, email_aliases : dict = None):
+        """
+        @param email_aliases:   {email: email it should be treated as}, for addresses LDAP doesn't know
+                                about, e.g. the pre-acquisition @coreos.com addresses in email_map.txt
+        """
+        self.email_aliases = {}
+        self._ldap_records = []
+        self._slack_users = []
+        self._iam_users = []            # [(account ID, IAM user dict)]
+        self._github_users = []
+
+        self._identities = None
+        self.by_email = {}              # {normalized email: Identity}
+        self.by_uid = {}                # {normalized uid: Identity}
+        self.by_github = {}             # {normalized GitHub login: Identity}
+
+        if email_aliases:
+            self.add_email_aliases(email_aliases)
+
+    def add_email_aliases(self, email_aliases : dict) -> None:
+        for alias, email in email_aliases.items():
+            alias = normalize_email(alias)
+            email = normalize_email(email)
+            if alias is not None and email is not None:
+                self.email_aliases[alias] = email
+        self._identities = None
+
+    def add_ldap_records(self, records) -> None:
+        """
+        @param records: iterable of dpp.ldap.UserRecord.UserRecord; deleted users (is_employed False)
+                        are what makes "left the company" queries possible
+        """
+        self._ldap_records.extend(records)
+        self._identities = None
+
+    def add_slack_users(self, users) -> None:
+        """
+        @param users:   iterable of Slack member dicts, e.g. from dpp.slack.iter_users()
+        """
+        self._slack_users.extend(users)
+        self._identities = None
+
+    def add_iam_users(self, account_id : str, users) -> None:
+        """
+        @param users:   iterable of IAM user dicts, e.g. from IamOperations.get_IAM_accounts()
+        """
+        for user in users:
+            # get_IAM_accounts() returns a placeholder such as '[Permission Denied]' instead of failing
+            if user['UserName'].startswith('['):
+                continue
+            self._iam_users.append((account_id, user))
+        self._identities = None
+
+    def add_github_users(self, users) -> None:
+        """
+        @param users:   iterable of GitHub user dicts with a 'login' (and optionally 'email') key, or logins
+        """
+        self._github_users.extend(
+            {'login': user} if isinstance(user, str) else user
+            for user in users
+        )
+        self._identities = None
+
+    def _email_key(self, email : str) -> str:
+        email = normalize_email(email)
+        return self.email_aliases.get(email, email)
+
+    def join(self) -> None:
+        """
+        (Re)builds the indexes and Identities from all the records added so far.
+        """
+        self.by_email = {}
+        self.by_uid = {}
+        self.by_github = {}
+        identities = []
+
+        # Current employees first, so that a rehired person's keys point at their current record rather
+        # than the deleted one.
+        for employed in (True, False):
+            for record in self._ldap_records:
+                if record.is_employed != employed:
+                    continue
+                uid = normalize_uid(record.uid)
+                if uid in self.by_uid:
+                    continue
+                identity = Identity(ldap_record=record)
+                identities.append(identity)
+                self._register(identity, [
+                    (self.by_uid, uid),
+                    (self.by_github, normalize_github_login(record.github)),
+                ] + [
+                    (self.by_email, self._email_key(email)) for email in record.emails
+                ])
+
+        def find_or_create(keys : list) -> Identity:
+            for index, key in keys:
+                if key is not None and key in index:
+                    identity = index[key]
+                    break
+            else:
+                identity = Identity()
+                identities.append(identity)
+            # Also index the keys that didn't match, so that later records can join through them
+            self._register(identity, keys)
+            return identity
+
+        for user in self._github_users:
+            find_or_create([
+                (self.by_github, normalize_github_login(user.get('login'))),
+                (self.by_email, self._email_key(user.get('email'))),
+            ]).github_users.append(user)
+
+        for user in self._slack_users:
+            find_or_create([
+                (self.by_email, self._email_key(user.get('profile', {}).get('email'))),
+            ]).slack_users.append(user)
+
+        for account_id, user in self._iam_users:
+            name = user['UserName']
+            if '@' in name:
+                keys = [(self.by_email, self._email_key(name))]
+            else:
+                keys = [(self.by_uid, normalize_uid(name))]
+            find_or_create(keys).iam_users.append((account_id, user))
+
+        self._identities = identities
+        logger.debug('Joined {} LDAP, {} Slack, {} IAM and {} GitHub records into {} identities'.format(
+            len(self._ldap_records),
+            len(self._slack_users),
+            len(self._iam_users),
+            len(self._github_users),
+            len(identities),
+        ))
+
+    @staticmethod
+    def _register(identity : Identity, keys : list) -> None:
+        for index, key in keys:
+            if key is not None:
+                index.setdefault(key, identity)
+
+    @property
+    def identities(self) -> list:
+        if self._identities is None:
+            self.join()
+        return self._identities
+
+    def find_by_email(self, email : str) -> Identity:
+        """
+        @return Identity | None
+        """
+        if self._identities is None:
+            self.join()
+        return self.by_email.get(self._email_key(email))
+
+    def find_by_uid(self, uid : str) -> Identity:
+        """
+        @return Identity | None
+        """
+        if self._identities is None:
+            self.join()
+        return self.by_uid.get(normalize_uid(uid))
+
+    def find_by_github(self, login : str) -> Identity:
+        """
+        @return Identity | None
+        """
+        if self._identities is None:
+            self.join()
+        return self.by_github.get(normalize_github_login(login))
+
+    def get_orphaned_iam_users(self) -> list:
+        """
+        @return [(account ID, IAM user dict, Identity)] for the IAM users whose owner left the company, or
+                couldn't be identified at all (identity.is_known is False)
+        """
+        return [
+            (account_id, user, identity)
+            for identity in self.identities if not identity.is_employed
+            for account_id, user in identity.iam_users
+        ]
+
+    def get_orphaned_slack_users(self) -> list:
+        """
+        @return [(Slack member dict, Identity)] for the Slack users whose owner left the company, or
+                couldn't be identified at all
+        """
+        return [
+            (user, identity)
+            for identity in self.identities if not identity.is_employed
+            for user in identity.slack_users
+        ]
+
+    def get_orphaned_github_users(self) -> list:
+        """
+        @return [(GitHub user dict, Identity)] for the GitHub users whose owner left the company, or
+                couldn't be identified at all
+        """
+        return [
+            (user, identity)
+            for identity in self.identities if not identity.is_employed
+            for user in identity.github_users
+        ]
@@ -0,0 +1,18 @@
+import logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+from .Identity import Identity
+from .IdentityIndex import IdentityIndex
+from .normalize import (
+    normalize_email,
+    normalize_github_login,
+    normalize_uid,
+)
+__all__ = [
+    'Identity',
+    'IdentityIndex',
+
+    'normalize_email',
+    'normalize_github_login',
+    'normalize_uid',
+]
@@ -0,0 +1,46 @@
+#!/bin/env python3
+
+"""
+Every source spells the same identifier a little differently (case, whitespace, "+tag" addresses, GitHub
+profile URLs vs logins). All index keys go through these functions so that lookups are plain dict hits.
+"""
+
+import re
+
+_GITHUB_URL_PREFIX = re.compile(r'^(https?://)?(www\.)?github\.com/', re.IGNORECASE)
+
+
+def normalize_email(email : str) -> str:
+    """
+    @return str - the address lower-cased, without a "mailto:" prefix or a "+tag" in the local part,
+            or None if it isn't an address
+    """
+    if not email:
+        return None
+    email = email.strip().lower()
+    if email.startswith('mailto:'):
+        email = email[len('mailto:'):]
+    local, sep, domain = email.partition('@')
+    if not sep or not local or not domain:
+        return None
+    return local.split('+', 1)[0] + '@' + domain
+
+
+def normalize_uid(uid : str) -> str:
+    """
+    @return str - the Kerberos ID lower-cased, or None
+    """
+    if not uid:
+        return None
+    return uid.strip().lower() or None
+
+
+def normalize_github_login(login : str) -> str:
+    """
+    @param login:   a login, "@login", or a profile URL such as https://github.com/login/
+    @return str - the login lower-cased (GitHub logins are case-insensitive), or None
+    """
+    if not login:
+        return None
+    login = _GITHUB_URL_PREFIX.sub('', login.strip()).strip('/').lstrip('@')
+    return login.split('/', 1)[0].lower() or None
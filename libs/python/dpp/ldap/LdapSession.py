@@ -10,6 +10,9 @@ import logging
 logger = logging.getLogger(__name__)
 from pprint import pprint
 
+# OID of the LDAP simple paged results control (RFC 2696)
+PAGED_RESULTS_CONTROL = '1.2.840.113556.1.4.319'
+
 class ConnectionFailure(Exception):
     pass
 
@@ -38,3 +41,25 @@ class LdapSession(object):
         if not found:
             return None
         return [entry for entry in self.conn.entries]
+
+    def paged_search(self, search_filter, search_base, return_attributes=None, page_size=500):
+        """
+        Generator that yields the matching entries a page at a time, for searches that return too many
+        entries for a single response (the server caps the size of a single search).
+        """
+        if return_attributes is None:
+            return_attributes = ldap3.ALL_ATTRIBUTES
+
+        cookie = None
+        while True:
+            self.conn.search(
+                search_base=search_base,
+                search_filter=search_filter,
+                attributes=return_attributes,
+                paged_size=page_size,
+                paged_cookie=cookie,
+            )
+            yield from self.conn.entries
+            cookie = self.conn.result.get('controls', {}).get(PAGED_RESULTS_CONTROL, {}).get('value', {}).get('cookie')
+            if not cookie:
+                return
@@ -63,6 +63,7 @@ class UserRecord(object):
             'cn',
             'displayName',
             'sn',
+            'uid',
             'uuid',
             'rhatUUID',
             'rhatRnDComponent',
@@ -6,6 +6,16 @@ from pprint import pprint
 from .LdapSession import LdapSession
 from .UserRecord import UserRecord
 
+DELETED_USERS_OU = 'ou=deletedusers'
+
+
+def is_deleted_entry(entry) -> bool:
+    """
+    @return bool - True if the LDAP entry is stored under ou=DeletedUsers, i.e. the person left the company.
+            The default search base contains ou=DeletedUsers, so a search can find both kinds of entry.
+    """
+    return DELETED_USERS_OU in entry.entry_dn.lower().split(',')
+
 
 class UserSearcher(object):
     def __init__(self, session=None):
@@ -19,7 +29,7 @@ class UserSearcher(object):
     def _get_search_base(self, search_deleted_users=False):
         domain = ['dc=redhat', 'dc=com']
         if search_deleted_users:
-            domain.append('ou=DeletedUsers')
+            domain.insert(0, 'ou=DeletedUsers')
         return ','.join(domain)
 
     def find_by_uid(self, uid, search_deleted_users=False):
@@ -32,7 +42,7 @@ class UserSearcher(object):
         )
         if response is None:
             return None
-        return UserRecord.from_ldap_entry(response[0])
+        return UserRecord.from_ldap_entry(response[0], is_employed=not is_deleted_entry(response[0]))
 
 
     def find_by_email(self, email, search_deleted_users=False):
@@ -53,5 +63,19 @@ class UserSearcher(object):
                 search_base=self._get_search_base(search_deleted_users),
             )
             if response is not None:
-                return UserRecord.from_ldap_entry(response[0])
+                return UserRecord.from_ldap_entry(response[0], is_employed=not is_deleted_entry(response[0]))
         return None
+
+    def iter_users(self, search_deleted_users=False, search_filter='(uid=*)'):
+        """
+        Generator that yields a UserRecord for every user matching the filter (by default, everyone),
+        fetching only the attributes UserRecord uses, a page at a time. The default search base includes
+        ou=DeletedUsers, so people who left are included too, with is_employed False.
+        """
+        entries = self.session.paged_search(
+            search_filter=search_filter,
+            search_base=self._get_search_base(search_deleted_users),
+            return_attributes=UserRecord.desired_attributes(),
+        )
+        for entry in entries:
+            yield UserRecord.from_ldap_entry(entry, is_employed=not is_deleted_entry(entry))
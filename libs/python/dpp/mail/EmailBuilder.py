@@ -1,4 +1,5 @@
 #!/usr/bin/python3
+import base64
 import os
 
 from email.mime.audio import MIMEAudio
@@ -8,6 +9,10 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import mimetypes
 
+# Bytes of a file read and encoded at a time. base64.encodebytes() encodes 57 bytes per (76 character) line,
+# so a multiple of 57 means that chunks join up without any short lines.
+ATTACHMENT_CHUNK_SIZE = 57 * 1024
+
 
 class EmailBuilder(object):
     """
@@ -52,6 +57,15 @@ class EmailBuilder(object):
     def add_html_message(self, body : str):
         self.add_message(body=body, subtype='html')
 
+    def add_part(self, part):
+        """
+        Attaches a MIME part that has already been built, e.g. one that's the same in many messages and so is
+        built once and shared between them. A shared part must not be modified once it's been added.
+
+        @param part:    email.mime.base.MIMEBase
+        """
+        self.message.attach(part)
+
     def add_attachment_from_var(self,
             contents,
             filename : str,
@@ -62,15 +76,29 @@ class EmailBuilder(object):
         )
 
     def add_attachment_from_file(self, file_dir : str, filename : str):
+        """
+        Attaches the file, base64-encoded. The file is read and encoded a chunk at a time, so only the
+        encoded copy is held in memory.
+        """
         path = os.path.join(file_dir, filename)
         content_type, encoding = mimetypes.guess_type(path)
-      
+
         if content_type is None or encoding is not None:
             content_type = 'application/octet-stream'
 
-        self.message.attach(
-            _encapsulate_contents(contents=fp.read(), content_type=content_type, filename=filename)
-        )
+        main_type, sub_type = content_type.split('/', 1)
+        msg = MIMEBase(main_type, sub_type)
+        encoded_chunks = []
+        with open(path, 'rb') as fh:
+            while True:
+                chunk = fh.read(ATTACHMENT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                encoded_chunks.append(base64.encodebytes(chunk).decode('ascii'))
+        msg.set_payload(''.join(encoded_chunks))
+        msg['Content-Transfer-Encoding'] = 'base64'
+        msg.add_header('Content-Disposition', 'attachment', filename=filename)
+        self.message.attach(msg)
 
 
 def _encapsulate_contents(contents, content_type, filename):
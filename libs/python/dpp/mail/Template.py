@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+import string
+
+
+class Template(object):
+    """
+    A str.format() style template that is parsed once, when it's created, rather than every time it's
+    rendered. Fields must be named, e.g. "Hello {name}"; format specs and conversions ("{count:>5}",
+    "{name!r}") are supported, but attribute and index lookups ("{user.name}", "{keys[0]}") are not.
+
+        GREETING = Template("Hello {name}, welcome to {alias}.")
+        GREETING.render(name='Bob', alias='openshift-dev')
+    """
+    def __init__(self, text : str):
+        self.text = text
+        self.fields = set()     # Names of the fields that render() needs values for
+        self._pieces = []       # [(literal text, field name or None, conversion, format spec)]
+
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(text):
+            if field_name is not None:
+                if not field_name.isidentifier():
+                    raise Exception("Unsupported template field '{{{}}}': fields must be plain names".format(field_name))
+                if '{' in format_spec:
+                    raise Exception("Unsupported template field '{{{}}}': nested format specs aren't supported".format(field_name))
+                self.fields.add(field_name)
+            self._pieces.append((literal, field_name, conversion, format_spec))
+
+    def render(self, **values) -> str:
+        """
+        @param values:  a value for each of the template's fields. Extra values are ignored.
+        @return str
+        """
+        missing = self.fields.difference(values)
+        if missing:
+            raise Exception("Missing values for template fields: {}".format(', '.join(sorted(missing))))
+
+        parts = []
+        for literal, field_name, conversion, format_spec in self._pieces:
+            parts.append(literal)
+            if field_name is None:
+                continue
+            value = values[field_name]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 'a':
+                value = ascii(value)
+            elif conversion == 's':
+                value = str(value)
+            parts.append(format(value, format_spec))
+        return ''.join(parts)
@@ -1,6 +1,8 @@
 from .EmailBuilder import (
     EmailBuilder,
 )
+from .Template import Template
 __all__ = [
     'EmailBuilder',
+    'Template',
 ]
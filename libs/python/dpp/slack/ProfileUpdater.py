@@ -0,0 +1,138 @@
+#!/bin/env python3
+
+import concurrent.futures
+import json
+import os
+import threading
+import logging
+logger = logging.getLogger(__name__)
+
+from .SlackApi import SlackApi
+
+
+class ProfileUpdater(object):
+    """
+    Applies profile changes to many users with users.profile.set, several at a time, paced to stay within
+    the method's rate limit (tier 3, ~50 calls per minute; see SlackApi).
+
+    If checkpoint_file is given, each successful update is recorded in it, and users whose change is
+    already recorded there are skipped, so an interrupted run can simply be repeated.
+
+        updater = ProfileUpdater(api, checkpoint_file='email_migration.checkpoint')
+        changes = {'U012345': {'email': 'jsmith@redhat.com'}}
+        print(updater.diff_report(changes, current_profiles))
+        result = updater.run(changes)
+    """
+    def __init__(self, api : SlackApi, checkpoint_file : str = None, max_workers : int = 4):
+        """
+        @param max_workers: maximum number of updates in flight at once
+        """
+        self.api = api
+        self.checkpoint_file = checkpoint_file
+        self.max_workers = max_workers
+        self._checkpoint_lock = threading.Lock()
+
+    def diff(self, changes : dict, current_profiles : dict = None) -> list:
+        """
+        @param changes:             {user ID: {profile field: new value}}
+        @param current_profiles:    {user ID: profile dict}, e.g. from iter_users(). Profiles that aren't
+                                    given are fetched with users.profile.get.
+        @return [(user ID, field, current value, new value)] - only the fields that would change
+        """
+        current_profiles = dict(current_profiles or {})
+        missing = [user_id for user_id in changes if user_id not in current_profiles]
+        current_profiles.update(self._fetch_profiles(missing))
+
+        ret = []
+        for user_id, profile_changes in changes.items():
+            profile = current_profiles.get(user_id, {})
+            for field, new_value in sorted(profile_changes.items()):
+                if profile.get(field) != new_value:
+                    ret.append((user_id, field, profile.get(field), new_value))
+        return ret
+
+    def diff_report(self, changes : dict, current_profiles : dict = None) -> str:
+        """
+        @return str - a line per field that would change, for a dry run
+        """
+        completed = self._read_checkpoint()
+        lines = []
+        for user_id, field, old_value, new_value in self.diff(changes, current_profiles):
+            lines.append('{:13} {:20} {!r:40} -> {!r}{}'.format(
+                user_id,
+                field,
+                old_value,
+                new_value,
+                ' (already done)' if completed.get(user_id) == changes[user_id] else '',
+            ))
+        return '\n'.join(lines)
+
+    def run(self, changes : dict) -> dict:
+        """
+        @param changes:     {user ID: {profile field: new value}}
+        @return dict - {'updated': [user ID], 'skipped': [user ID], 'failed': {user ID: exception}}
+        """
+        completed = self._read_checkpoint()
+        ret = {'updated': [], 'skipped': [], 'failed': {}}
+        pending = {}
+        for user_id, profile_changes in changes.items():
+            if completed.get(user_id) == profile_changes:
+                ret['skipped'].append(user_id)
+            else:
+                pending[user_id] = profile_changes
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._update, user_id, profile_changes): user_id
+                for user_id, profile_changes in pending.items()
+            }
+            for future in concurrent.futures.as_completed(futures):
+                user_id = futures[future]
+                try:
+                    future.result()
+                    ret['updated'].append(user_id)
+                except Exception as e:
+                    logger.warning('Failed to update the profile of {}: {}'.format(user_id, e))
+                    ret['failed'][user_id] = e
+
+        logger.info('Profiles updated: {}, already up to date: {}, failed: {}'.format(
+            len(ret['updated']), len(ret['skipped']), len(ret['failed'])))
+        return ret
+
+    def _update(self, user_id : str, profile_changes : dict) -> None:
+        self.api.call('users.profile.set', user=user_id, profile=profile_changes)
+        self._record(user_id, profile_changes)
+
+    def _fetch_profiles(self, user_ids : list) -> dict:
+        if not user_ids:
+            return {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            responses = executor.map(lambda user_id: self.api.call('users.profile.get', user=user_id), user_ids)
+            return {user_id: response['profile'] for user_id, response in zip(user_ids, responses)}
+
+    def _read_checkpoint(self) -> dict:
+        """
+        @return {user ID: the profile changes that were applied}
+        """
+        completed = {}
+        if self.checkpoint_file is None or not os.path.exists(self.checkpoint_file):
+            return completed
+        with open(self.checkpoint_file) as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A partially written last line, from a crash
+                    continue
+                completed[entry['user']] = entry['profile']
+        return completed
+
+    def _record(self, user_id : str, profile_changes : dict) -> None:
+        if self.checkpoint_file is None:
+            return
+        with self._checkpoint_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint_file)), exist_ok=True)
+            with open(self.checkpoint_file, 'a') as fh:
+                fh.write(json.dumps({'user': user_id, 'profile': profile_changes}) + '\n')
+                fh.flush()
+                os.fsync(fh.fileno())
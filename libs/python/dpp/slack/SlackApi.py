@@ -0,0 +1,136 @@
+#!/bin/env python3
+
+import functools
+import json
+import os
+import threading
+import time
+import requests
+import logging
+logger = logging.getLogger(__name__)
+
+from .ratelimit import (
+    TokenBucket,
+    get_method_rate,
+)
+
+SLACK_API_URL = 'https://slack.com/api/'
+
+
+class SlackApiError(Exception):
+    """
+    Slack returned "ok": false. self.error is Slack's error code, e.g. 'user_not_found'.
+    """
+    def __init__(self, method : str, error : str, response : dict = None):
+        super().__init__("Slack API call {} failed: {}".format(method, error))
+        self.method = method
+        self.error = error
+        self.response = response
+
+
+@functools.lru_cache()
+def get_api_token():
+    if 'SLACK_API_TOKEN' in os.environ:
+        return os.environ['SLACK_API_TOKEN']
+    if 'HOME' in os.environ:
+        path = os.path.join(os.environ['HOME'], '.secrets', 'slack_token')
+        if os.path.exists(path):
+            with open(path, 'r') as fh:
+                return fh.read().strip()
+
+    raise Exception('Could not find Slack API token in envvar SLACK_API_TOKEN or file ~/.secrets/slack_token')
+
+
+class SlackApi(object):
+    """
+    Minimal Slack Web API client. Rate-limited calls (HTTP 429) are retried after the delay given in
+    the Retry-After header.
+
+    Unless rate_limit is False, calls are also paced to stay within each method's rate limit tier (see
+    dpp.slack.ratelimit), across all the threads using this object, so that 429s are rare to begin with.
+
+        api = SlackApi()
+        api.call('users.info', user='U012345')
+    """
+    def __init__(self,
+            token : str = None,
+            max_retries : int = 5,
+            session : requests.Session = None,
+            rate_limit : bool = True,
+        ):
+        """
+        @param token:       API token (default: see get_api_token())
+        @param max_retries: how many times a rate-limited call is retried before giving up
+        @param session:     requests.Session to use (default: a new one), which keeps connections open
+                            between calls
+        @param rate_limit:  pace calls according to each method's rate limit tier
+        """
+        self.token = token if token is not None else get_api_token()
+        self.max_retries = max_retries
+        self.session = session if session is not None else requests.Session()
+        self.rate_limit = rate_limit
+        self._buckets = {}          # {method: TokenBucket}
+        self._buckets_lock = threading.Lock()
+
+    def get_bucket(self, method : str) -> TokenBucket:
+        with self._buckets_lock:
+            bucket = self._buckets.get(method)
+            if bucket is None:
+                bucket = TokenBucket(get_method_rate(method))
+                self._buckets[method] = bucket
+            return bucket
+
+    def call(self, method : str, **params) -> dict:
+        """
+        @param method:  API method, e.g. 'users.list'
+        @param params:  the method's arguments. Dicts and lists (e.g. 'profile') are sent as JSON.
+        @return dict - the decoded response
+        @raise SlackApiError if Slack returns "ok": false
+        """
+        data = {
+            key: json.dumps(value) if isinstance(value, (dict, list)) else value
+            for key, value in params.items()
+            if value is not None
+        }
+        bucket = self.get_bucket(method) if self.rate_limit else None
+        for attempt in range(0, self.max_retries + 1):
+            if bucket is not None:
+                bucket.acquire()
+            response = self.session.post(
+                SLACK_API_URL + method,
+                data=data,
+                headers={'Authorization': 'Bearer {}'.format(self.token)},
+            )
+            if response.status_code == 429 and attempt < self.max_retries:
+                retry_after = int(response.headers.get('Retry-After', 1))
+                logger.debug('{} was rate limited, retrying in {}s'.format(method, retry_after))
+                if bucket is not None:
+                    # Hold back the other threads too
+                    bucket.pause(retry_after)
+                else:
+                    time.sleep(retry_after)
+                continue
+            if response.status_code != 200:
+                raise Exception("Slack API call {} failed with HTTP {}".format(method, response.status_code))
+            break
+
+        ret = response.json()
+        if not ret.get('ok'):
+            raise SlackApiError(method, ret.get('error', 'unknown_error'), ret)
+        return ret
+
+    def paginate(self, method : str, key : str, limit : int = 200, **params):
+        """
+        Generator that yields the items of a cursor-paginated method one at a time, fetching a page only
+        when the previous one has been consumed.
+
+        @param key:     the response key that holds each page's items, e.g. 'members' for users.list
+        @param limit:   maximum number of items per page (Slack recommends no more than 200)
+        """
+        cursor = None
+        while True:
+            response = self.call(method, limit=limit, cursor=cursor, **params)
+            yield from response.get(key, [])
+            cursor = response.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                return
@@ -0,0 +1,32 @@
+import logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+from .SlackApi import (
+    SlackApi,
+    SlackApiError,
+    get_api_token,
+)
+from .ProfileUpdater import ProfileUpdater
+from .ratelimit import (
+    TokenBucket,
+    get_method_rate,
+)
+from .users import (
+    iter_users,
+    get_email,
+    get_user_name,
+)
+__all__ = [
+    'SlackApi',
+    'SlackApiError',
+    'get_api_token',
+
+    'ProfileUpdater',
+
+    'TokenBucket',
+    'get_method_rate',
+
+    'iter_users',
+    'get_email',
+    'get_user_name',
+]
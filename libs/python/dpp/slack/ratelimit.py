@@ -0,0 +1,74 @@
+#!/bin/env python3
+
+"""
+Slack rate limits each Web API method per workspace, according to the method's "tier":
+https://api.slack.com/docs/rate-limits
+"""
+
+import threading
+import time
+
+# Calls per minute allowed by each tier
+TIER_RATES = {
+    1: 1,
+    2: 20,
+    3: 50,
+    4: 100,
+}
+
+# Tiers of the methods used by dpp.slack. Methods that aren't listed are assumed to be tier 3.
+METHOD_TIERS = {
+    'users.list': 2,
+    'users.info': 4,
+    'users.lookupByEmail': 3,
+    'users.profile.get': 4,
+    'users.profile.set': 3,
+}
+DEFAULT_TIER = 3
+
+
+def get_method_rate(method : str) -> int:
+    """
+    @return int - calls per minute allowed for the method
+    """
+    return TIER_RATES[METHOD_TIERS.get(method, DEFAULT_TIER)]
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket: acquire() blocks until a call is allowed. Tokens are added at `rate` per
+    minute, up to `burst`. Slack allows short bursts above the per-minute rate, but the tokens still run
+    out after `burst` calls in a row.
+    """
+    def __init__(self, rate : float, burst : int = None):
+        """
+        @param rate:    tokens per minute
+        @param burst:   maximum number of tokens that can accumulate (default: a tenth of a minute's worth,
+                        but at least 1)
+        """
+        self.rate = rate / 60.0             # Tokens per second
+        self.burst = burst if burst is not None else max(1, int(rate / 10))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds : float) -> None:
+        """
+        Stops handing out tokens for the given time, e.g. after Slack returned a Retry-After header.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
@@ -0,0 +1,49 @@
+#!/bin/env python3
+
+from .SlackApi import SlackApi
+
+# Slackbot isn't flagged as a bot (is_bot is False), so it's identified by its ID
+SLACKBOT_USER_ID = 'USLACKBOT'
+
+
+def iter_users(
+        api : SlackApi,
+        include_deleted : bool = False,
+        include_bots : bool = False,
+        email_domain : str = None,
+        limit : int = 200,
+    ):
+    """
+    Generator that yields the workspace's members (as returned by users.list) one at a time, a page at
+    a time, filtering them as they arrive.
+
+    @param include_deleted: include deactivated users
+    @param include_bots:    include bots and Slackbot
+    @param email_domain:    if given, only include users whose profile email is in this domain, e.g. 'redhat.com'
+    @param limit:           page size
+    """
+    email_suffix = None if email_domain is None else '@' + email_domain.lower()
+    for user in api.paginate('users.list', key='members', limit=limit):
+        if not include_deleted and user.get('deleted'):
+            continue
+        if not include_bots and (user.get('is_bot') or user.get('id') == SLACKBOT_USER_ID):
+            continue
+        if email_suffix is not None and not get_email(user).endswith(email_suffix):
+            continue
+        yield user
+
+
+def get_email(user : dict) -> str:
+    """
+    @return str - the user's profile email, lower-cased, or '' if it isn't visible to the token
+    """
+    return user.get('profile', {}).get('email', '').lower()
+
+
+def get_user_name(user : dict) -> str:
+    p = user['profile']
+    if p.get('real_name_normalized'):
+        return p['real_name_normalized']
+    if p.get('display_name_normalized'):
+        return p['display_name_normalized']
+    return "{0} {1}".format(p.get('first_name', ''), p.get('last_name', '')).strip()
@@ -0,0 +1,177 @@
+#!/bin/env python3
+
+"""
+A compact, columnar on-disk snapshot of a list of records (dicts), e.g. the result of an API listing.
+
+File layout:
+    8 bytes     magic + format version (FORMAT_MAGIC)
+    4 bytes     little-endian length of the header
+    header      JSON: schema version, fetch time, row count, and the offset/length of each column
+    columns     one zlib-compressed JSON array per column, back to back
+
+The file is memory-mapped when read, and only the requested columns are decompressed and decoded, so
+reading 2 fields out of 20 costs roughly 2/20ths of a full load.
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+import zlib
+
+FORMAT_MAGIC = b'DPPSNAP\x01'
+_HEADER_LEN = struct.Struct('<I')
+
+
+class SnapshotFormatError(Exception):
+    pass
+
+
+class Snapshot(object):
+    """
+    Read access to a snapshot file. Use Snapshot.open() to read, and Snapshot.write() to create one.
+    """
+    def __init__(self, path : str, header : dict, buf, data_offset : int):
+        self.path = path
+        self.schema_version = header['schema_version']
+        self.fetched_at = header['fetched_at']             # Epoch time the records were fetched
+        self.num_rows = header['num_rows']
+        self._columns = {col['name']: col for col in header['columns']}
+        self._column_order = [col['name'] for col in header['columns']]
+        self._buf = buf
+        self._data_offset = data_offset
+
+    @staticmethod
+    def write(path : str, records : list, schema_version : int, fetched_at : float = None) -> None:
+        """
+        @param records:         list of dicts whose values are JSON-serializable. A key missing from some
+                                records is read back as None for those records.
+        @param schema_version:  caller-defined version of the record layout; see load_or_refresh()
+        @param fetched_at:      epoch time the records were fetched (default: now)
+        """
+        column_order = []
+        seen = set()
+        for record in records:
+            for key in record:
+                if key not in seen:
+                    seen.add(key)
+                    column_order.append(key)
+
+        blobs = []
+        columns = []
+        offset = 0
+        for name in column_order:
+            blob = zlib.compress(
+                json.dumps([record.get(name) for record in records], separators=(',', ':')).encode('utf-8'),
+            )
+            columns.append({'name': name, 'offset': offset, 'length': len(blob)})
+            blobs.append(blob)
+            offset += len(blob)
+
+        header = json.dumps({
+            'schema_version': schema_version,
+            'fetched_at': fetched_at if fetched_at is not None else time.time(),
+            'num_rows': len(records),
+            'columns': columns,
+        }).encode('utf-8')
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(FORMAT_MAGIC)
+            fh.write(_HEADER_LEN.pack(len(header)))
+            fh.write(header)
+            for blob in blobs:
+                fh.write(blob)
+        # Atomic, so that readers never see a partially written snapshot
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def open(path : str):
+        """
+        @raise OSError if the file can't be read, SnapshotFormatError if it isn't a snapshot
+        """
+        with open(path, 'rb') as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size < len(FORMAT_MAGIC) + _HEADER_LEN.size:
+                raise SnapshotFormatError('{} is too short to be a snapshot'.format(path))
+            # The mapping stays valid after the file is closed
+            buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if buf[:len(FORMAT_MAGIC)] != FORMAT_MAGIC:
+            raise SnapshotFormatError('{} is not a snapshot (or is an unsupported format version)'.format(path))
+        pos = len(FORMAT_MAGIC)
+        header_len, = _HEADER_LEN.unpack_from(buf, pos)
+        pos += _HEADER_LEN.size
+        try:
+            header = json.loads(buf[pos:pos + header_len].decode('utf-8'))
+        except ValueError as e:
+            raise SnapshotFormatError('{} has a corrupt header'.format(path)) from e
+        return Snapshot(path=path, header=header, buf=buf, data_offset=pos + header_len)
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def column_names(self) -> list:
+        return list(self._column_order)
+
+    def column(self, name : str) -> list:
+        """
+        @return list - the values of one column, in row order
+        """
+        if name not in self._columns:
+            raise KeyError("Snapshot {} has no column '{}'".format(self.path, name))
+        col = self._columns[name]
+        start = self._data_offset + col['offset']
+        # zlib reads straight out of the mapping via the memoryview; nothing else is copied.
+        with memoryview(self._buf)[start:start + col['length']] as view:
+            return json.loads(zlib.decompress(view).decode('utf-8'))
+
+    def records(self, columns : list = None) -> list:
+        """
+        @param columns: names of the columns to load (default: all). Other fields are absent from the result,
+                        and requested columns that the snapshot doesn't have are None.
+        @return list of dicts
+        """
+        if columns is None:
+            columns = self._column_order
+        values = [
+            self.column(name) if name in self._columns else [None] * self.num_rows
+            for name in columns
+        ]
+        return [dict(zip(columns, row)) for row in zip(*values)] if columns else [{} for _ in range(self.num_rows)]
+
+    def close(self) -> None:
+        self._buf.close()
+
+
+def load_or_refresh(path : str, fetch, max_age : float, schema_version : int, columns : list = None) -> list:
+    """
+    Returns the records in the snapshot at path, or calls fetch() and saves a new snapshot if it is
+    missing, unreadable, older than max_age, or was written with a different schema_version.
+
+    @param fetch:       callable returning a list of dicts
+    @param max_age:     seconds
+    @param columns:     see Snapshot.records()
+    @return list of dicts
+    """
+    try:
+        snapshot = Snapshot.open(path)
+    except (OSError, SnapshotFormatError):
+        snapshot = None
+
+    if snapshot is not None:
+        try:
+            if snapshot.schema_version == schema_version and snapshot.age() < max_age:
+                return snapshot.records(columns=columns)
+        finally:
+            snapshot.close()
+
+    records = fetch()
+    Snapshot.write(path, records, schema_version=schema_version)
+    if columns is None:
+        return records
+    return [{name: record.get(name) for name in columns} for record in records]
@@ -0,0 +1,13 @@
+import logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+from .Snapshot import (
+    Snapshot,
+    SnapshotFormatError,
+    load_or_refresh,
+)
+__all__ = [
+    'Snapshot',
+    'SnapshotFormatError',
+    'load_or_refresh',
+]
@@ -0,0 +1,27 @@
+#!/bin/env python3
+
+import os
+import sys
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+pytest.importorskip('googleapiclient')
+from dpp.google import CellRange
+
+
+@pytest.mark.parametrize('sheet, expected', [
+    ('Sheet1', "Sheet1!B2:C"),
+    ('Form Responses 1', "'Form Responses 1'!B2:C"),
+    ("It's", "'It''s'!B2:C"),
+    ('Sales!2024', "'Sales!2024'!B2:C"),
+    ('A1', "'A1'!B2:C"),
+])
+def test_str_round_trip(sheet, expected):
+    cell_range = CellRange(sheet, 'B', 2, 'C', None)
+    assert str(cell_range) == expected
+    assert CellRange.from_string(str(cell_range)) == cell_range
+
+
+def test_str_without_sheet():
+    assert str(CellRange(None, 'A', 1)) == 'A1'
+    assert str(CellRange(None, 'A', 1, 'B', 3)) == 'A1:B3'
@@ -0,0 +1,208 @@
+#!/bin/env python3
+
+import concurrent.futures
+import os
+import subprocess
+import sys
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import dpp.git
+from dpp.git import CloneResult
+
+
+def git(*args, cwd=None) -> str:
+    proc = subprocess.run(
+        ['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com'] + list(args),
+        cwd=cwd,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    return proc.stdout.decode('utf-8').strip()
+
+
+class Upstream(object):
+    """
+    A bare repo, plus a working clone of it to make commits from.
+    """
+    def __init__(self, tmp_path):
+        self.bare = str(tmp_path / 'upstream.git')
+        self.work = str(tmp_path / 'upstream-work')
+        git('init', '--quiet', '--bare', '-b', 'main', self.bare)
+        git('clone', '--quiet', self.bare, self.work)
+        git('checkout', '--quiet', '-b', 'main', cwd=self.work)
+        # file:// rather than a plain path, so that --depth is honoured
+        self.url = 'file://' + self.bare
+
+    def commit(self, name : str) -> str:
+        with open(os.path.join(self.work, name), 'w') as fh:
+            fh.write(name + '\n')
+        git('add', name, cwd=self.work)
+        git('commit', '--quiet', '-m', name, cwd=self.work)
+        git('push', '--quiet', 'origin', 'main', cwd=self.work)
+        return git('rev-parse', 'HEAD', cwd=self.work)
+
+    def push_branch(self, name : str) -> None:
+        git('push', '--quiet', 'origin', 'main:' + name, cwd=self.work)
+
+    def delete_branch(self, name : str) -> None:
+        git('push', '--quiet', 'origin', '--delete', name, cwd=self.work)
+
+
+def test_first_clone(tmp_path):
+    upstream = Upstream(tmp_path)
+    head = upstream.commit('a')
+    path = str(tmp_path / 'checkout')
+
+    result = dpp.git.CloneEngine().sync(upstream.url, path)
+
+    assert result.action == CloneResult.CLONED, result.error
+    assert git('rev-parse', 'HEAD', cwd=path) == head
+
+
+def test_fast_forward_update(tmp_path):
+    upstream = Upstream(tmp_path)
+    upstream.commit('a')
+    path = str(tmp_path / 'checkout')
+    engine = dpp.git.CloneEngine()
+    engine.sync(upstream.url, path)
+    head = upstream.commit('b')
+
+    result = engine.sync(upstream.url, path)
+
+    assert result.action == CloneResult.UPDATED, result.error
+    assert git('rev-parse', 'HEAD', cwd=path) == head
+    assert os.path.exists(os.path.join(path, 'b'))
+
+
+def test_shallow_update(tmp_path):
+    upstream = Upstream(tmp_path)
+    upstream.commit('a')
+    upstream.commit('b')
+    path = str(tmp_path / 'checkout')
+    engine = dpp.git.CloneEngine(depth=1)
+    engine.sync(upstream.url, path)
+    assert git('rev-list', '--count', 'HEAD', cwd=path) == '1'
+    head = upstream.commit('c')
+
+    result = engine.sync(upstream.url, path)
+
+    assert result.action == CloneResult.UPDATED, result.error
+    assert git('rev-parse', 'HEAD', cwd=path) == head
+    assert git('status', '--porcelain', cwd=path) == ''
+
+
+def test_timeout_is_reported(tmp_path):
+    slow_git = tmp_path / 'slow-git'
+    slow_git.write_text('#!/bin/sh\nsleep 10\n')
+    slow_git.chmod(0o755)
+    path = str(tmp_path / 'checkout')
+    engine = dpp.git.CloneEngine(timeout=0.5, git_binary=str(slow_git))
+
+    summary = engine.sync_all([('file:///nonexistent.git', path)])
+
+    assert [result.action for result in summary.results] == [CloneResult.TIMED_OUT]
+    assert summary.count(CloneResult.TIMED_OUT) == 1
+    assert not os.path.exists(path)
+
+
+def test_shared_store_concurrent_sync(tmp_path):
+    jobs = []
+    for idx in range(8):
+        upstream = Upstream(tmp_path / 'upstream{}'.format(idx))
+        upstream.commit('a')
+        jobs.append((upstream.url, str(tmp_path / 'checkouts' / str(idx))))
+    store = dpp.git.SharedObjectStore(str(tmp_path / 'store.git'))
+    engine = dpp.git.CloneEngine(max_workers=8, shared_store=store)
+
+    for action in (CloneResult.CLONED, CloneResult.UPDATED):
+        summary = engine.sync_all(jobs)
+        assert [result.error for result in summary.failures()] == []
+        assert summary.count(action) == len(jobs)
+    for _, path in jobs:
+        assert store.is_borrower(path)
+
+
+def test_failed_clone_keeps_existing_directory(tmp_path):
+    path = tmp_path / 'checkout'
+    path.mkdir()
+    (path / 'notes.txt').write_text('not a checkout\n')
+
+    result = dpp.git.CloneEngine().sync('file://' + str(tmp_path / 'missing.git'), str(path))
+
+    assert result.action == CloneResult.FAILED
+    assert (path / 'notes.txt').read_text() == 'not a checkout\n'
+
+
+def test_failed_clone_removes_created_directory(tmp_path):
+    path = tmp_path / 'checkout'
+
+    result = dpp.git.CloneEngine().sync('file://' + str(tmp_path / 'missing.git'), str(path))
+
+    assert result.action == CloneResult.FAILED
+    assert not path.exists()
+
+
+def test_missing_git_binary_is_reported(tmp_path):
+    upstream = Upstream(tmp_path)
+    upstream.commit('a')
+    engine = dpp.git.CloneEngine(git_binary=str(tmp_path / 'no-such-git'))
+
+    summary = engine.sync_all([(upstream.url, str(tmp_path / 'checkout'))])
+
+    assert [result.action for result in summary.results] == [CloneResult.FAILED]
+
+
+def store_refs(store) -> list:
+    return git('for-each-ref', '--format=%(refname)', 'refs/mirrors/', cwd=store.path).split('\n')
+
+
+def test_concurrent_store_fetches(tmp_path):
+    upstreams = []
+    for idx in range(16):
+        upstream = Upstream(tmp_path / 'upstream{}'.format(idx))
+        upstream.commit('a')
+        for branch in ('x', 'y', 'z'):
+            upstream.push_branch(branch)
+        upstreams.append(upstream)
+    store = dpp.git.SharedObjectStore(str(tmp_path / 'store.git'))
+    store.init()
+
+    def fetch_all():
+        with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(lambda upstream: store.fetch(upstream.url), upstreams))
+
+    fetch_all()
+    assert len(store_refs(store)) == 16 * 4
+    # With packed refs and branches deleted upstream, fetches that pruned would all rewrite packed-refs
+    git('pack-refs', '--all', cwd=store.path)
+    for upstream in upstreams:
+        upstream.delete_branch('x')
+        upstream.commit('b')
+    fetch_all()
+    assert len(store_refs(store)) == 16 * 4
+
+
+def test_gc_prunes_stale_mirror_refs(tmp_path):
+    jobs = []
+    upstreams = []
+    for idx in range(2):
+        upstream = Upstream(tmp_path / 'upstream{}'.format(idx))
+        upstream.commit('a')
+        upstream.push_branch('x')
+        upstreams.append(upstream)
+        jobs.append((upstream.url, str(tmp_path / 'checkouts' / str(idx))))
+    store = dpp.git.SharedObjectStore(str(tmp_path / 'store.git'))
+    dpp.git.CloneEngine(shared_store=store).sync_all(jobs)
+    upstreams[0].delete_branch('x')
+
+    store.gc([jobs[0][1]])
+
+    ns = 'refs/mirrors/' + store.namespace(upstreams[0].url)
+    assert store_refs(store) == [ns + '/heads/main']
+
+
+def test_shallow_clones_cannot_use_store(tmp_path):
+    with pytest.raises(Exception):
+        dpp.git.CloneEngine(depth=1, shared_store=dpp.git.SharedObjectStore(str(tmp_path / 'store.git')))
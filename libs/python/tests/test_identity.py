@@ -0,0 +1,76 @@
+#!/bin/env python3
+
+import os
+import sys
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+pytest.importorskip('ldap3')
+import dpp.identity
+import dpp.ldap
+
+
+class FakeEntry(object):
+    """
+    Stands in for an ldap3 Entry: the DN and the attributes UserRecord.from_ldap_entry() reads.
+    """
+    def __init__(self, dn, uid, email):
+        self.entry_dn = dn
+        self.entry_attributes_as_dict = {
+            'cn': [uid.title()],
+            'displayName': [uid.title()],
+            'sn': [uid.title()],
+            'uid': [uid],
+            'rhatUUID': [uid + '-uuid'],
+            'mail': [email],
+        }
+
+
+class FakeLdapSession(object):
+    """
+    Like the real directory, a search from dc=redhat,dc=com also returns the entries under ou=DeletedUsers.
+    """
+    def __init__(self, entries):
+        self.entries = entries
+
+    def paged_search(self, search_filter, search_base, return_attributes=None, page_size=500):
+        return [entry for entry in self.entries if entry.entry_dn.lower().endswith(search_base.lower())]
+
+
+def get_index():
+    user_searcher = dpp.ldap.UserSearcher(session=FakeLdapSession([
+        FakeEntry('uid=current,ou=users,dc=redhat,dc=com', 'current', 'current@redhat.com'),
+        FakeEntry('uid=left,ou=DeletedUsers,dc=redhat,dc=com', 'left', 'left@redhat.com'),
+    ]))
+    index = dpp.identity.IdentityIndex()
+    index.add_ldap_records(user_searcher.iter_users())
+    index.add_iam_users('123456789012', [
+        {'UserName': 'current'},
+        {'UserName': 'left'},
+        {'UserName': 'nobody'},
+    ])
+    index.add_slack_users([
+        {'id': 'U1', 'profile': {'email': 'Current@redhat.com'}},
+        {'id': 'U2', 'profile': {'email': 'left+slack@redhat.com'}},
+    ])
+    return index
+
+
+def test_deleted_users_are_not_employed():
+    index = get_index()
+    assert index.find_by_uid('current').is_employed
+    left = index.find_by_uid('left')
+    assert left.is_known
+    assert not left.is_employed
+
+
+def test_orphaned_iam_users_include_people_who_left():
+    orphans = {user['UserName']: identity for _, user, identity in get_index().get_orphaned_iam_users()}
+    assert sorted(orphans) == ['left', 'nobody']
+    assert orphans['left'].is_known
+    assert not orphans['nobody'].is_known
+
+
+def test_orphaned_slack_users_include_people_who_left():
+    orphans = [user['id'] for user, _ in get_index().get_orphaned_slack_users()]
+    assert orphans == ['U2']
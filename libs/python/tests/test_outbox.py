@@ -0,0 +1,54 @@
+#!/bin/env python3
+
+import email.mime.text
+import os
+import sys
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+pytest.importorskip('googleapiclient')
+import dpp.google
+from dpp.google.gmail.send import get_idempotency_key
+
+
+def make_message(to : str, text : str):
+    mime_message = email.mime.text.MIMEText(text)
+    mime_message['to'] = to
+    mime_message['subject'] = 'Your credentials'
+    return mime_message
+
+
+def test_round_trip(tmp_path):
+    outbox = dpp.google.Outbox(str(tmp_path / 'outbox'))
+    keys = [outbox.add(make_message('{}@example.com'.format(name), 'Hello ' + name)) for name in ('a', 'b')]
+
+    pending = outbox.pending()
+    assert sorted(key for key, _ in pending) == sorted(keys)
+    for key, mime_message in pending:
+        # The header was folded when the message was written to disk
+        assert get_idempotency_key(mime_message) == key
+
+    gmail = dpp.google.FakeGmailService()
+    sender = dpp.google.EmailSender(service=gmail, sent_log_file=str(tmp_path / 'sent.log'))
+    results = outbox.deliver(sender)
+    assert [result.ok() for result in results] == [True, True]
+    assert sorted(result.idempotency_key for result in results) == sorted(keys)
+    assert len(gmail.sent) == 2
+    assert outbox.pending() == []
+    for key in keys:
+        assert os.path.exists(os.path.join(outbox.sent_dir, '{}.json'.format(key)))
+
+
+def test_redelivery_is_not_sent_twice(tmp_path):
+    gmail = dpp.google.FakeGmailService()
+    sender = dpp.google.EmailSender(service=gmail, sent_log_file=str(tmp_path / 'sent.log'))
+    mime_message = make_message('a@example.com', 'Hello')
+    sender.send(mime_message)
+
+    # E.g. the process died after sending, but before the outbox recorded it
+    outbox = dpp.google.Outbox(str(tmp_path / 'outbox'))
+    outbox.add(mime_message)
+    results = outbox.deliver(sender)
+    assert [result.already_sent for result in results] == [True]
+    assert len(gmail.sent) == 1
+    assert outbox.pending() == []
@@ -1,10 +1,17 @@
 #!/bin/env python3
 
+import argparse
 import os
-from pprint import pprint
 import sys
-from slackclient import SlackClient
-import pickle
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'libs', 'python'))
+import dpp.slack
+import dpp.snapshot
+
+# Bump this if the fields stored for each user (or the filtering) change, so that older snapshots are re-fetched.
+SNAPSHOT_SCHEMA_VERSION = 2
+EMAIL_DOMAIN = 'coreos.com'
+SNAPSHOT_MAX_AGE = 24 * 3600        # Seconds
+CHECKPOINT_FILE = 'email_migration.checkpoint'
 
 def get_email_map():
     with open('email_map.txt', 'r') as fh:
@@ -16,56 +23,60 @@ def get_email_map():
     return ret
 
 
-def get_slack_client():
-    with open(os.path.join(os.environ['HOME'], '.secrets/slack_token'), 'r') as fh:
-        token = fh.read().strip()
-    return SlackClient(token)
+def get_active_users(api):
+    """
+    @return list of active (not deleted, not bot) Slack member dicts with an @EMAIL_DOMAIN email address,
+            with only the fields used by this script
+    """
+    return dpp.snapshot.load_or_refresh(
+        'userlist.snapshot',
+        fetch=lambda: [
+            {'id': user['id'], 'profile': user['profile']}
+            for user in dpp.slack.iter_users(api, email_domain=EMAIL_DOMAIN)
+        ],
+        max_age=SNAPSHOT_MAX_AGE,
+        schema_version=SNAPSHOT_SCHEMA_VERSION,
+        columns=['id', 'profile'],
+    )
+
 
+def get_parser():
+    parser = argparse.ArgumentParser(description='Migrate the Slack profile emails of @{} users according to email_map.txt. '
+        'Without --apply, only shows what would change.'.format(EMAIL_DOMAIN))
+    parser.add_argument('--apply', action='store_true',
+        help='Update the profiles. Progress is saved in {}, so an interrupted run can be repeated.'.format(CHECKPOINT_FILE))
+    parser.add_argument('--max-workers', type=int, default=4,
+        help='Maximum number of profile updates in flight at once')
+    return parser
 
-def get_all_users(slackclient):
-    PICKLE_FILE = 'userlist.pickle'
-    if os.path.isfile(PICKLE_FILE):
-        with open(PICKLE_FILE, 'rb') as fh:
-            return pickle.load(fh)
-    
-    user_list = sc.api_call("users.list")
-    with open(PICKLE_FILE, 'wb') as fh:
-        pickle.dump(user_list, fh)
-    return user_list
 
+def main():
+    args = get_parser().parse_args()
+    api = dpp.slack.SlackApi()
+    active_users = sorted(get_active_users(api), key=lambda rec:str.lower(dpp.slack.get_user_name(rec)))
 
-def get_user_name(u):
-    p = u['profile']
-    if 'real_name_normalized' in p and len(p['real_name_normalized']) > 0:
-        return p['real_name_normalized']
-    if 'display_name_normalized' in p and len(p['display_name_normalized']) > 0:
-        return p['display_name_normalized']
-    return "{0} {1}".format(p['first_name'], p['last_name']).strip()
+    email_map = get_email_map()
+    changes = {}
+    for user in active_users:
+        p = user['profile']
+        new_email = email_map[p['email']]
+        print('{0:13} {1:30} {2:30} {3:30} {4:30}'.format(user['id'], p['real_name_normalized'], p['display_name_normalized'], p['email'], new_email))
+        changes[user['id']] = {'email': new_email}
 
+    updater = dpp.slack.ProfileUpdater(api, checkpoint_file=CHECKPOINT_FILE, max_workers=args.max_workers)
+    if not args.apply:
+        print()
+        print(updater.diff_report(changes, {user['id']: user['profile'] for user in active_users}))
+        return
 
-sc = get_slack_client()
-users = get_all_users(sc)
-users = sorted(users['members'], key=lambda rec:str.lower(get_user_name(rec)))
-active_users = [
-    user
-    for user in users
-    if user['deleted'] is False and
-        user['is_bot'] is False and
-        'email' in user['profile'] and
-        user['profile']['email'].lower().endswith('@coreos.com')
-]
+    result = updater.run(changes)
+    print('Updated: {}, already done: {}, failed: {}'.format(
+        len(result['updated']), len(result['skipped']), len(result['failed'])))
+    for user_id, error in sorted(result['failed'].items()):
+        print('{0:13} {1}'.format(user_id, error))
+    if result['failed']:
+        sys.exit(1)
 
-def update_user(slackclient, user_id, email):
-    print("Updating {} to {}".format(user_id, email))
-    response = slackclient.api_call(
-        'users.profile.set',
-        user=user_id,
-        profile={ 'email': email },
-    )
 
-email_map = get_email_map()
-for user in active_users:
-    p = user['profile']
-    new_email = email_map[p['email']]
-    print('{0:13} {1:30} {2:30} {3:30} {4:30}'.format(user['id'], p['real_name_normalized'], p['display_name_normalized'], p['email'], new_email))
-    # update_user(sc, user['id'], new_email)
+if __name__ == '__main__':
+    main()